@@ -0,0 +1,210 @@
+"""
+Batch processing: many programs at once, fanned out across processes.
+
+Inputs can be files, directories, glob patterns, or a JSON/CSV manifest that
+gives each file its own thresholds, feedrates and taper (a cone, or a profile
+table - see TAPER_PROFILES.md).
+"""
+
+import csv
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from gcode_columnar import create_engine
+from gcode_engine import compressor_for, parse_taper_profile, parse_tiers, taper_error
+
+
+PROGRAM_EXTENSIONS = ('.tap', '.gcode', '.nc', '.ngc')
+
+# Settings a job can carry, in GCodeEngine argument order, with the CLI defaults
+SETTING_DEFAULTS = {
+    'threshold1': 1.5,
+    'feedrate1': 100,
+    'threshold2': 0.5,
+    'feedrate2': 50,
+    'default_feedrate': 380,
+    'large_diameter': None,
+    'small_diameter': None,
+    'length': None,
+    'tiers': None,  # [(threshold, feedrate), ...] - replaces the two-tier settings when set
+    'decimate': None,  # Collinear-move merge tolerance
+    'taper_profile': None,  # [(x, diameter), ...] - a taper profile table, instead of the cone above
+    'taper_offset': None,  # Machine X of the profile's X 0
+    'taper_reverse': None,  # Run the profile towards -X
+    'fixed_point': None,  # Integer 0.0001-unit numbers (gcode_fixed.py)
+}
+
+
+def split_compression(name):
+    """Split 'part.tap.gz' into ('part.tap', '.gz'); uncompressed names get ''."""
+    if compressor_for(name) is not None:
+        return os.path.splitext(name)
+    return name, ''
+
+
+def is_program_output(path):
+    """True for our own <name>_modified<ext> output files (compressed or not)."""
+    name, compression = split_compression(os.path.basename(path))
+    return os.path.splitext(name)[0].endswith('_modified')
+
+
+def expand_inputs(patterns):
+    """Turn files, directories and glob patterns into a sorted list of program files.
+
+    Directories are scanned (not recursively) for G-code extensions, also
+    compressed (.tap.gz etc.), skipping our own _modified outputs. Files and
+    globs are taken as given.
+    """
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for name in sorted(os.listdir(pattern)):
+                path = os.path.join(pattern, name)
+                if (os.path.isfile(path) and split_compression(name)[0].lower().endswith(PROGRAM_EXTENSIONS)
+                        and not is_program_output(path)):
+                    files.append(path)
+        elif os.path.isfile(pattern):
+            files.append(pattern)
+        else:
+            matches = sorted(path for path in glob.glob(pattern) if os.path.isfile(path))
+            if not matches:
+                raise ValueError(f"No files match '{pattern}'")
+            files.extend(matches)
+    return files
+
+
+def clean_settings(raw, defaults, base_dir=None):
+    """Merge one job's raw settings over the defaults, converting numbers to float.
+
+    A taper profile given as a CSV file name is read, relative to base_dir.
+    """
+    settings = dict(defaults)
+    for key in SETTING_DEFAULTS:
+        value = raw.get(key)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            continue
+        if key == 'taper_profile':
+            # A CSV file, "0:1.0,6:1.25" pairs, or a JSON list of [x, diameter] pairs
+            if isinstance(value, str):
+                settings[key] = parse_taper_profile(value.strip(), base_dir)
+                continue
+            try:
+                settings[key] = [(float(x), float(diameter)) for x, diameter in value]
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid taper_profile value '{value}'")
+            continue
+        if key in ('taper_reverse', 'fixed_point'):
+            settings[key] = str(value).strip().lower() in ('1', '1.0', 'true', 'yes', 'y')
+            continue
+        if key == 'tiers':
+            # "1.5:100,0.5:50" (CSV or JSON) or a JSON list of [threshold, feedrate] pairs
+            try:
+                settings[key] = parse_tiers(value) if isinstance(value, str) else [
+                    (float(threshold), float(feedrate)) for threshold, feedrate in value]
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid tiers value '{value}'")
+            continue
+        try:
+            settings[key] = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid {key} value '{value}'")
+    return settings
+
+
+def load_manifest(path, defaults):
+    """Read a JSON or CSV manifest into a list of (input_file, settings) jobs.
+
+    JSON is either a list of job objects or {"defaults": {...}, "jobs": [...]}.
+    CSV has a header row with a "file" column plus any setting columns.
+    Relative file paths are resolved against the manifest's folder.
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    if path.lower().endswith('.json'):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            defaults = clean_settings(data.get('defaults', {}), defaults, base_dir)
+            data = data.get('jobs', [])
+        rows = data
+    else:
+        with open(path, 'r', newline='') as f:
+            rows = list(csv.DictReader(f))
+
+    jobs = []
+    for number, row in enumerate(rows, 1):
+        input_file = (row.get('file') or '').strip()
+        if not input_file:
+            raise ValueError(f"Manifest entry {number} has no 'file'")
+        jobs.append((os.path.join(base_dir, input_file), clean_settings(row, defaults, base_dir)))
+    return jobs
+
+
+def output_path_for(input_file, output_dir):
+    """<name>_modified<ext> in output_dir, compressed the same way as the input."""
+    name, compression = split_compression(os.path.basename(input_file))
+    base, ext = os.path.splitext(name)
+    return os.path.join(output_dir, f"{base}_modified{ext}{compression}")
+
+
+def run_job(input_file, output_file, settings, engine='stream', cache=None):
+    """Process one file (runs in a worker process) and return a result dict.
+
+    With a ResultCache, a hit puts the stored output in place without
+    processing, and result['cache'] says 'hit' or 'miss'.
+    """
+    result = {'input_file': input_file, 'output_file': output_file, 'error': None}
+    start = time.perf_counter()
+    try:
+        error = taper_error(settings['large_diameter'], settings['small_diameter'], settings['length'],
+                            settings.get('taper_profile'))
+        if error:
+            raise ValueError(error)
+        if cache:
+            key = cache.key(input_file, settings, output_file)
+            stats = cache.fetch(key, output_file)
+            result['cache'] = 'miss' if stats is None else 'hit'
+        if not cache or stats is None:
+            if cache and os.path.lexists(output_file):
+                os.remove(output_file)  # It may be a hard link into the cache - don't write through it
+            processor = create_engine(engine, **settings)
+            stats = processor.process_file(input_file, output_file)
+            stats.pop('modification_details')
+            if cache:
+                cache.store(key, output_file, stats)
+        result['stats'] = stats
+    except Exception as e:
+        result['error'] = str(e)
+    result['elapsed'] = time.perf_counter() - start
+    return result
+
+
+def run_batch(jobs, output_dir, workers=None, engine='stream', on_result=None, cache=None):
+    """Process (input_file, settings) jobs across a process pool.
+
+    Results come back in job order, and on_result(result) is called for each
+    one in that order. With a ResultCache, unchanged jobs are served from it
+    and it is trimmed to size afterwards. Returns (results, wall_time).
+    """
+    outputs = [output_path_for(input_file, output_dir) for input_file, settings in jobs]
+    seen = set()
+    for output_file in outputs:
+        if output_file in seen:
+            raise ValueError(f"Two inputs would both write {output_file}")
+        seen.add(output_file)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_job, input_file, output_file, settings, engine, cache)
+                   for (input_file, settings), output_file in zip(jobs, outputs)]
+        results = []
+        for future in futures:
+            result = future.result()
+            if on_result:
+                on_result(result)
+            results.append(result)
+    if cache:
+        cache.evict()
+    return results, time.perf_counter() - start
@@ -0,0 +1,568 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the GCode processing engine
+Usage: python3 gcode_benchmark.py tokenizer [file.tap ...]
+       python3 gcode_benchmark.py memory [file.tap ...]
+       python3 gcode_benchmark.py lookahead [base_lines]
+       python3 gcode_benchmark.py generate out.tap [lines] [wave options]
+       python3 gcode_benchmark.py suite [options]
+"""
+
+import sys
+import os
+import re
+import glob
+import json
+import math
+import platform
+import random
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+from gcode_columnar import ColumnBlock, create_engine
+from gcode_engine import FeedrateTable, GCodeEngine, collect_a_changes, tier_counts_sorted
+from gcode_stats import peak_rss_mb
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Wave program shape: A degrees swept per pass, points per pass, random spacing jitter
+WAVE_DEFAULTS = {'wave': 'sine', 'span': 135.0, 'points': 44, 'jitter': 0.0, 'seed': 1}
+
+# Suite cases run with taper on, so every stage has work to do
+SUITE_TAPER = {'large_diameter': 1.25, 'small_diameter': 0.85, 'length': 12.0}
+
+# Stages timed by the suite, in pipeline order
+STAGES = ('read', 'parse', 'tier', 'taper', 'write')
+
+
+class LegacyLineParser:
+    """The original per-axis regex parser, kept as the "before" reference."""
+
+    def __init__(self):
+        self.current_motion_mode = None
+
+    def extract_axis_value(self, line, axis):
+        pattern = rf'{axis}([+-]?\d+\.?\d*)'
+        match = re.search(pattern, line, re.IGNORECASE)
+        if match:
+            return float(match.group(1))
+        return None
+
+    def parse_gcode_line(self, line):
+        line = re.sub(r'\(.*?\)', '', line).strip()
+        if re.match(r'G0+(?![1-9])', line, re.IGNORECASE):
+            self.current_motion_mode = 'G0'
+            return None
+        if re.match(r'G0*1', line, re.IGNORECASE):
+            self.current_motion_mode = 'G1'
+        if self.current_motion_mode != 'G1':
+            return None
+        x = self.extract_axis_value(line, 'X')
+        y = self.extract_axis_value(line, 'Y')
+        z = self.extract_axis_value(line, 'Z')
+        a = self.extract_axis_value(line, 'A')
+        f = self.extract_axis_value(line, 'F')
+        if all(v is None for v in [x, y, z, a]):
+            return None
+        return {'X': x, 'Y': y, 'Z': z, 'A': a, 'F': f, 'original': line,
+                'explicit_g1': bool(re.match(r'G0*1', line.strip(), re.IGNORECASE))}
+
+
+def time_parser(parser, lines, repeat=5):
+    """Best-of-N lines/sec for parsing every line."""
+    best = None
+    for _ in range(repeat):
+        parser.current_motion_mode = None
+        start = time.perf_counter()
+        for line in lines:
+            parser.parse_gcode_line(line)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(lines) / best
+
+
+def bench_tokenizer(files):
+    """Compare lines/sec of the legacy regex parser and the single-scan tokenizer."""
+    print("=" * 80)
+    print("Tokenizer microbenchmark (lines/sec, best of 5)")
+    print("=" * 80)
+    for path in files:
+        with open(path, 'r') as f:
+            lines = [line.rstrip('\n') for line in f]
+
+        # Both parsers must agree before their speed means anything
+        legacy = LegacyLineParser()
+        engine = GCodeEngine()
+        for line in lines:
+            old = legacy.parse_gcode_line(line)
+            new = engine.parse_gcode_line(line)
+            if (old is None) != (new is None) or (old and any(old[k] != new[k] for k in ('X', 'Y', 'Z', 'A', 'F', 'explicit_g1'))):
+                print(f"ERROR: parsers disagree on line: {line}")
+                return 1
+
+        before = time_parser(LegacyLineParser(), lines)
+        after = time_parser(GCodeEngine(), lines)
+        print(f"{os.path.basename(path)} ({len(lines)} lines)")
+        print(f"  Before (per-axis re.search): {before:>12,.0f} lines/sec")
+        print(f"  After  (tokenizer):          {after:>12,.0f} lines/sec")
+        print(f"  Speedup: {after / before:.2f}x")
+    print("=" * 80)
+    return 0
+
+
+def write_lookahead_worst_case(path, total_lines, run_length=500):
+    """Write a program of explicit G1 A moves each followed by a long non-A run.
+
+    Every explicit G1 line has to wait run_length lines for its next A value,
+    which is the case that made the old forward scan look expensive.
+    """
+    written = 0
+    a_value = 0.0
+    with open(path, 'w') as f:
+        f.write("T1M6\nG17\nG0Z1.0000\nG1Z-0.0100F6.5\n")
+        written += 4
+        while written < total_lines:
+            a_value -= 0.25
+            f.write(f"G1X1.0000A{a_value:.4f} F380.0\n")
+            for k in range(run_length):
+                f.write(f"X{1.0 + (k % 100) * 0.01:.4f}\n")
+            written += run_length + 1
+        f.write("M30\n")
+    return written + 1
+
+
+def bench_lookahead(base_lines=25000, steps=4, max_exponent=1.25):
+    """Time the engine on growing worst-case files and check the growth is linear."""
+    print("=" * 80)
+    print("Next-A lookahead scaling (synthetic worst case)")
+    print("=" * 80)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for step in range(steps):
+            path = os.path.join(tmp, f"worst_{step}.tap")
+            lines = write_lookahead_worst_case(path, base_lines * (2 ** step))
+            engine = GCodeEngine(large_diameter=3.0, small_diameter=2.0, length=12.0)
+            best = None
+            for _ in range(3):
+                start = time.perf_counter()
+                engine.process_file(path, os.devnull)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            results.append((lines, best))
+            print(f"  {lines:>10,} lines: {best:8.3f} s  ({lines / best:>10,.0f} lines/sec)")
+
+    # Slope of log(time) against log(lines): 1.0 is linear, 2.0 is quadratic
+    exponent = (math.log(results[-1][1]) - math.log(results[0][1])) / (math.log(results[-1][0]) - math.log(results[0][0]))
+    print(f"  Growth exponent: {exponent:.2f} (limit {max_exponent})")
+    print("=" * 80)
+    if exponent > max_exponent:
+        print("ERROR: processing time is growing faster than linear!")
+        return 1
+    print("✓ Scales linearly")
+    return 0
+
+
+def legacy_records(lines):
+    """The record the processors used to keep for every line of a file."""
+    parser = LegacyLineParser()
+    records = []
+    for line in lines:
+        original_line = line.rstrip('\n')
+        records.append({
+            'original': line,
+            'parsed': parser.parse_gcode_line(original_line),
+            'has_explicit_g1': bool(re.match(r'G0*1', original_line.strip(), re.IGNORECASE))
+        })
+    return records
+
+
+def column_block(lines):
+    """The same lines as held by the NumPy engine (packed records and splice texts)."""
+    engine = GCodeEngine()
+    block = ColumnBlock()
+    for line in lines:
+        block.append(line, engine.parse_words(line.rstrip('\n')))
+    return block
+
+
+def traced_bytes(build, lines):
+    """Bytes still allocated by build(lines) while its result is alive."""
+    tracemalloc.start()
+    try:
+        result = build(lines)
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+
+def bench_memory(files):
+    """Compare the per-line footprint of the old per-line dicts and the packed records."""
+    print("=" * 80)
+    print("Per-line record memory (bytes/line, line text itself not counted)")
+    print("=" * 80)
+    for path in files:
+        with open(path, 'r') as f:
+            lines = f.readlines()
+        if not lines:
+            continue
+
+        before = traced_bytes(legacy_records, lines) / len(lines)
+        after = traced_bytes(column_block, lines) / len(lines)
+        print(f"{os.path.basename(path)} ({len(lines)} lines)")
+        print(f"  Before (per-line dicts):  {before:>8,.0f} bytes/line")
+        print(f"  After  (packed records):  {after:>8,.0f} bytes/line")
+        print(f"  Smaller by: {before / after:.1f}x")
+    print("  (The stream and mmap engines keep no per-line records, only the lines")
+    print("   waiting on an explicit G1 line's next A value.)")
+    print("=" * 80)
+    return 0
+
+def wave_profile(wave, u):
+    """Fraction of the pass's A sweep done at position u (0..1) along it.
+
+    'sine' eases in and out (tiny A steps at both ends, like the
+    DisconnectedEndWaves-Sine sample); 'cosine' starts fast and eases out.
+    """
+    if wave == 'cosine':
+        return math.sin(u * math.pi / 2)
+    return (1 - math.cos(u * math.pi)) / 2
+
+
+def write_wave_program(path, total_lines, wave='sine', span=135.0, points=44, jitter=0.0, seed=1):
+    """Write a synthetic sine/cosine wrap program shaped like the bundled samples.
+
+    Each pass plunges with a Z-only move and sweeps X across a 2" section while
+    A turns through span degrees, then the next pass comes back the other way.
+    Forward passes start with an explicit G1 A move (the look-forward case);
+    return passes start with a G1 X move and continue with modal A moves.
+    After 20 passes the tool rapids to the next section.
+
+    The A steps are set by span and points: the largest step is about
+    span * pi / (2 * points). jitter (0..1) randomizes the point spacing.
+    Returns the number of lines written (the last pass is always finished).
+    """
+    rng = random.Random(seed)
+    width = 2.0
+    with open(path, 'w') as f:
+        def emit(text):
+            f.write(text + "\n")
+            return 1
+
+        written = emit("(SYNTHETIC WRAP PROGRAM - gcode_benchmark.py)")
+        written += emit("T1M6")
+        written += emit("G17")
+        written += emit("G0Z1.0000")
+        written += emit("G0X0.0000A-45.0000S19000M3")
+        section = 0
+        while written < total_lines:
+            x_start = section * width
+            a_start = -45.0 - (section % 4) * 45.0
+            written += emit(f"G0X{x_start + width:.4f}A{a_start:.4f}")
+            written += emit("G0Z0.2000")
+
+            # Point positions along the pass, with optional jitter in their spacing
+            steps = [1.0 + jitter * (rng.random() * 2 - 1) for _ in range(points)]
+            total = sum(steps)
+            u_values = [0.0]
+            for step in steps:
+                u_values.append(u_values[-1] + step / total)
+            pass_points = [(x_start + width * (1 - u), a_start - span * wave_profile(wave, u)) for u in u_values]
+
+            for number in range(1, 21):
+                written += emit(f"G1Z{-0.0071 * number:.4f}F6.5")
+                if number % 2:
+                    x, a = pass_points[0]
+                    written += emit(f"G1X{x:.4f}A{a - 0.002:.4f} F380.0")
+                    for x, a in pass_points[1:]:
+                        written += emit(f"X{x:.4f}A{a:.4f} F380.0")
+                    written += emit(f"X{x_start:.4f}")
+                else:
+                    written += emit(f"G1X{pass_points[-1][0]:.4f}F21.0")
+                    for x, a in reversed(pass_points[:-1]):
+                        written += emit(f"X{x:.4f}A{a:.4f} F380.0")
+                    written += emit(f"X{x_start + width:.4f}")
+                if written >= total_lines:
+                    break
+            written += emit("G0Z0.2000")
+            section += 1
+        written += emit("G0Z1.0000")
+        written += emit("G0X0.0000A-45.0000")
+        written += emit("M30")
+    return written
+
+
+def parse_size(text):
+    """'10k' -> 10000, '1m' -> 1000000, '2500' -> 2500."""
+    text = text.strip().lower()
+    scale = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def wave_options(options):
+    """Pull the generator settings out of --name=value options."""
+    wave = dict(WAVE_DEFAULTS)
+    for name in list(options):
+        if name in wave:
+            value = options.pop(name)
+            wave[name] = value if name == 'wave' else type(WAVE_DEFAULTS[name])(value)
+    if wave['wave'] not in ('sine', 'cosine'):
+        raise ValueError(f"Unknown wave '{wave['wave']}' (expected 'sine' or 'cosine')")
+    if wave['points'] < 2 or not 0 <= wave['jitter'] < 1:
+        raise ValueError("--points must be at least 2 and --jitter between 0 and 1")
+    return wave
+
+
+def bench_generate(path, lines, wave):
+    """Write a wave program and show how its A steps fall into the default tiers."""
+    start = time.perf_counter()
+    written = write_wave_program(path, lines, **wave)
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {written:,} lines to {path} in {elapsed:.1f} s")
+
+    with open(path, 'r') as f:
+        changes = sorted(collect_a_changes(f))
+    if changes:
+        table = FeedrateTable([(1.5, 100), (0.5, 50)], 380)
+        counts = tier_counts_sorted(changes, table)
+        middle = changes[len(changes) // 2]
+        print(f"A steps: {len(changes):,} (median {middle:.4f}°, max {changes[-1]:.4f}°)")
+        for line in table.summary(counts):
+            print(f"  • {line}")
+    return 0
+
+
+class NullWriter:
+    """Output sink that throws everything away, to time processing without the write."""
+
+    def write(self, text):
+        pass
+
+    def writelines(self, lines):
+        pass
+
+
+def stage_passes(path, engine_name, output_file):
+    """One pass per stage, each doing the previous pass's work plus that stage.
+
+    read:  read and decode the lines
+    parse: + tokenize every line
+    tier:  + the lookahead loop, tiering and feedrate rewrites (no taper)
+    taper: + taper Z formatting
+    write: + writing the output file - the full process_file run
+    """
+    def read():
+        with open(path, 'r') as f:
+            for line in f:
+                line.rstrip('\n')
+
+    def parse():
+        parse_words = GCodeEngine().parse_words
+        with open(path, 'r') as f:
+            for line in f:
+                parse_words(line.rstrip('\n'))
+
+    def tier():
+        with open(path, 'r') as f:
+            create_engine(engine_name).process_lines(f, NullWriter())
+
+    def taper():
+        with open(path, 'r') as f:
+            create_engine(engine_name, **SUITE_TAPER).process_lines(f, NullWriter())
+
+    def write():
+        return create_engine(engine_name, **SUITE_TAPER).process_file(path, output_file)
+
+    return [read, parse, tier, taper, write]
+
+
+def run_case(path, engine_name, repeat):
+    """Time each stage of one file (best of repeat) and return a result dict."""
+    output_file = path + '.out'
+    best = [None] * len(STAGES)
+    stats = None
+    try:
+        for _ in range(repeat):
+            for index, run_pass in enumerate(stage_passes(path, engine_name, output_file)):
+                start = time.perf_counter()
+                stats = run_pass() or stats
+                elapsed = time.perf_counter() - start
+                best[index] = elapsed if best[index] is None else min(best[index], elapsed)
+    finally:
+        if os.path.exists(output_file):
+            os.remove(output_file)
+
+    # A stage costs what its pass adds on top of the previous one
+    stages = {name: max(best[k] - (best[k - 1] if k else 0.0), 0.0) for k, name in enumerate(STAGES)}
+    total = best[-1]
+    return {
+        'lines': stats['total_lines'],
+        'bytes': os.path.getsize(path),
+        'stages': stages,
+        'total_seconds': total,
+        'lines_per_sec': stats['total_lines'] / total if total > 0 else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def compare_results(results, baseline, tolerance):
+    """List regressions in lines/sec or peak RSS against a baseline results file."""
+    regressions = []
+    old_cases = {case['name']: case for case in baseline.get('cases', [])}
+    for case in results['cases']:
+        old = old_cases.get(case['name'])
+        if old is None:
+            continue
+        if old.get('lines_per_sec') and case['lines_per_sec'] < old['lines_per_sec'] * (1 - tolerance):
+            regressions.append(f"{case['name']}: {case['lines_per_sec']:,.0f} lines/sec "
+                               f"(baseline {old['lines_per_sec']:,.0f})")
+        if old.get('peak_rss_mb') and case['peak_rss_mb'] and case['peak_rss_mb'] > old['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{case['name']}: peak RSS {case['peak_rss_mb']:.1f} MB "
+                               f"(baseline {old['peak_rss_mb']:.1f} MB)")
+    return regressions
+
+
+def bench_suite(options):
+    """Generate wave programs at each size, time every stage and record the results."""
+    wave = wave_options(options)
+    sizes = [name.strip().lower() for name in options.pop('sizes', '10k,1m,10m').split(',') if name.strip()]
+    counts = [parse_size(name) for name in sizes]
+    engine_name = options.pop('engine', 'stream')
+    repeat = int(options.pop('repeat', 3))
+    output = options.pop('output', 'benchmark_results.json')
+    baseline_file = options.pop('baseline', None)
+    tolerance = float(options.pop('tolerance', 0.15))
+    data_dir = options.pop('data-dir', os.path.join(tempfile.gettempdir(), 'gcode_benchmark'))
+    for name in options:
+        raise ValueError(f"Unknown option '--{name}'")
+    os.makedirs(data_dir, exist_ok=True)
+
+    print("=" * 100)
+    print(f"Benchmark suite - {engine_name} engine, {wave['wave']} wave "
+          f"(span {wave['span']}°, {wave['points']} points, jitter {wave['jitter']})")
+    print("=" * 100)
+    header = ''.join(f"{name:>8}" for name in STAGES)
+    print(f"{'Case':<6} {'Lines':>11} {'MB':>7}{header} {'Total s':>8} {'Lines/sec':>11} {'Peak MB':>8}")
+    print("-" * 100)
+
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'engine': engine_name,
+        'generator': wave,
+        'cases': [],
+    }
+    for name, count in zip(sizes, counts):
+        # Generated files are cached between runs, keyed by size and shape
+        path = os.path.join(data_dir, f"{wave['wave']}_{count}_{wave['span']:g}_{wave['points']}_"
+                                      f"{wave['jitter']:g}_{wave['seed']}.tap")
+        if not os.path.exists(path):
+            write_wave_program(path, count, **wave)
+
+        # Each case runs in a fresh process so its peak RSS is its own
+        # (big files get a single run - they take long enough to time reliably)
+        runs = repeat if count < 1000000 else 1
+        child = subprocess.run([sys.executable, os.path.abspath(__file__), 'suite-case', path, engine_name, str(runs)],
+                               capture_output=True, text=True, cwd=HERE)
+        if child.returncode:
+            print(f"ERROR: case {name} failed:\n{child.stderr}")
+            return 1
+        case = dict(name=name, **json.loads(child.stdout))
+        results['cases'].append(case)
+
+        stage_cells = ''.join(f"{case['stages'][stage]:>8.2f}" for stage in STAGES)
+        peak = f"{case['peak_rss_mb']:>8.1f}" if case['peak_rss_mb'] is not None else f"{'n/a':>8}"
+        print(f"{name:<6} {case['lines']:>11,} {case['bytes'] / (1024 * 1024):>7.1f}{stage_cells} "
+              f"{case['total_seconds']:>8.2f} {case['lines_per_sec']:>11,.0f} {peak}")
+    print("-" * 100)
+
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if baseline_file:
+        with open(baseline_file, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, tolerance)
+        print("=" * 100)
+        if baseline.get('engine') != engine_name:
+            print(f"Note: the baseline used the {baseline.get('engine')} engine")
+        if regressions:
+            print(f"ERROR: regressions against {baseline_file} (tolerance {tolerance:.0%}):")
+            for regression in regressions:
+                print(f"  ✗ {regression}")
+            return 1
+        print(f"✓ No regressions against {baseline_file} (tolerance {tolerance:.0%})")
+    print("=" * 100)
+    return 0
+
+
+def usage():
+    print("Usage: python3 gcode_benchmark.py tokenizer [file.tap ...]")
+    print("       python3 gcode_benchmark.py memory [file.tap ...]")
+    print("       python3 gcode_benchmark.py lookahead [base_lines]")
+    print("       python3 gcode_benchmark.py generate out.tap [lines] [--wave=sine|cosine] [--span=] [--points=] [--jitter=] [--seed=]")
+    print("       python3 gcode_benchmark.py suite [--sizes=10k,1m,10m] [--engine=stream|numpy|mmap] [--repeat=3]")
+    print("                                        [--output=benchmark_results.json] [--baseline=old.json] [--tolerance=0.15]")
+    print("                                        [--data-dir=DIR] [wave options]")
+    print("  tokenizer: parser lines/sec before and after the single-scan tokenizer")
+    print("             (files default to the bundled DisconnectedEndWaves-*.tap samples)")
+    print("  memory:    bytes per line of the old per-line dict records and the NumPy engine's")
+    print("             packed records (same default files)")
+    print("  lookahead: checks the engine scales linearly on a worst-case next-A file")
+    print("             (base_lines default: 25000, doubled 3 times)")
+    print("  generate:  writes a synthetic wrap program (default 10k lines) like the bundled samples")
+    print("             --span: A degrees per pass (135), --points: moves per pass (44),")
+    print("             --jitter: 0..1 random point spacing (0); largest A step ≈ span·π/(2·points)")
+    print("  suite:     times the read/parse/tier/taper/write stages and peak memory on generated")
+    print("             programs, writes JSON results and fails on regressions against --baseline")
+
+
+def main():
+    from gcode_processor_cli import parse_options
+    args, options = parse_options(sys.argv[1:])
+    command = args[0] if args else None
+
+    if command == 'suite-case':
+        # Internal: one suite case in its own process, result as JSON on stdout
+        print(json.dumps(run_case(args[1], args[2], int(args[3]))))
+        sys.exit(0)
+
+    if command not in ('tokenizer', 'memory', 'lookahead', 'generate', 'suite'):
+        usage()
+        sys.exit(1)
+
+    try:
+        if command == 'suite':
+            sys.exit(bench_suite(options))
+        if command == 'generate':
+            if len(args) < 2:
+                usage()
+                sys.exit(1)
+            wave = wave_options(options)
+            for name in options:
+                raise ValueError(f"Unknown option '--{name}'")
+            lines = parse_size(args[2]) if len(args) > 2 else 10000
+            sys.exit(bench_generate(args[1], lines, wave))
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if command == 'lookahead':
+        base_lines = int(args[1]) if len(args) > 1 else 25000
+        sys.exit(bench_lookahead(base_lines))
+
+    files = args[1:] or sorted(glob.glob(os.path.join(HERE, 'DisconnectedEndWaves-*.tap')))
+    if command == 'memory':
+        sys.exit(bench_memory(files))
+    sys.exit(bench_tokenizer(files))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Result cache: skip programs that have already been processed with the same settings.
+
+Re-running a batch after one file changed re-parses every file. With a cache,
+each job first hashes its input bytes together with the settings that shape
+the output (tiers, default feedrate, taper, decimation), the output's
+compression and the engine's own source. A hit puts the stored output in
+place - a hard link when the cache is on the same filesystem, a copy
+otherwise - without parsing a line.
+Entries are evicted least recently used first once the cache outgrows its limit.
+
+    <cache>/ab/ab12....out    the output file's bytes
+    <cache>/ab/ab12....json   its stats, plus the size and mtime it was stored with
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import uuid
+
+import gcode_columnar
+import gcode_engine
+import gcode_fixed
+import gcode_mmap
+from gcode_engine import compressor_for
+
+
+HASH_CHUNK = 1 << 20
+DEFAULT_CACHE_SIZE = 1 << 30  # 1 GB
+
+_engine_version = None
+
+
+def default_cache_dir():
+    """%LOCALAPPDATA%\\gcode_processor\\cache on Windows, ~/.cache/gcode_processor elsewhere."""
+    if sys.platform == 'win32' and os.environ.get('LOCALAPPDATA'):
+        return os.path.join(os.environ['LOCALAPPDATA'], 'gcode_processor', 'cache')
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'gcode_processor')
+
+
+def engine_version():
+    """Hash of every engine's source, so changing how programs are processed retires old entries.
+
+    All the modules create_engine() can pick from are in it - the engines write
+    the same output, so the key doesn't name the one a job used.
+    """
+    global _engine_version
+    if _engine_version is None:
+        digest = hashlib.sha256()
+        for module in (gcode_engine, gcode_columnar, gcode_mmap, gcode_fixed):
+            with open(module.__file__, 'rb') as f:
+                digest.update(f.read())
+        _engine_version = digest.hexdigest()
+    return _engine_version
+
+
+def settings_key(settings):
+    """The settings that shape the output, with the two-tier form turned into a tiers list.
+
+    Values keep their type: a default feedrate of 380 writes F380 while 380.0
+    writes F380.0, so the two must not share an entry.
+    """
+    tiers = settings['tiers'] or [(settings['threshold1'], settings['feedrate1']),
+                                  (settings['threshold2'], settings['feedrate2'])]
+    taper = [settings['large_diameter'], settings['small_diameter'], settings['length']]
+    profile = settings.get('taper_profile')
+    return {'tiers': [list(tier) for tier in tiers],
+            'default_feedrate': settings['default_feedrate'],
+            'taper': None if None in taper else taper,
+            'taper_profile': None if profile is None else [[x, diameter] for x, diameter in profile],
+            'taper_offset': (settings.get('taper_offset') or 0.0) if profile is not None else None,
+            'taper_reverse': bool(settings.get('taper_reverse')) if profile is not None else None,
+            'decimate': settings.get('decimate'),
+            'fixed_point': bool(settings.get('fixed_point'))}
+
+
+def replace_with(source, target):
+    """Atomically make target a hard link to source, or a copy of it across filesystems."""
+    if os.path.exists(target) and os.path.samefile(source, target):
+        return  # Already linked (and rename() between two links to one file does nothing)
+    temporary = f"{target}.{uuid.uuid4().hex}.part"
+    try:
+        os.link(source, temporary)
+    except OSError:
+        shutil.copyfile(source, temporary)
+    try:
+        os.replace(temporary, target)
+    except OSError:
+        os.remove(temporary)
+        raise
+
+
+class ResultCache:
+    """An on-disk, size-bounded LRU cache of processed outputs and their stats."""
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_CACHE_SIZE):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, input_file, settings, output_file):
+        """Hex digest of the input bytes, the output-shaping settings and the output compression."""
+        compression = os.path.splitext(output_file)[1].lower() if compressor_for(output_file) else ''
+        digest = hashlib.sha256()
+        digest.update(json.dumps([engine_version(), settings_key(settings), compression]).encode('utf-8'))
+        with open(input_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def paths(self, key):
+        folder = os.path.join(self.directory, key[:2])
+        return os.path.join(folder, key + '.out'), os.path.join(folder, key + '.json')
+
+    def fetch(self, key, output_file):
+        """Put the stored output for key at output_file and return its stats, or None on a miss."""
+        data_path, meta_path = self.paths(key)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            info = os.stat(data_path)
+            if (info.st_size, info.st_mtime_ns) != (meta['size'], meta['mtime_ns']):
+                # Changed since it was stored - a hard-linked output rewritten in place
+                self.remove(key)
+                return None
+            replace_with(data_path, output_file)
+            os.utime(meta_path)  # Most recently used
+        except (OSError, ValueError, KeyError):
+            return None
+        stats = meta['stats']
+        stats['tier_counts'] = {int(tier): count for tier, count in stats['tier_counts'].items()}
+        return stats
+
+    def store(self, key, output_file, stats):
+        """Keep output_file (linked, or copied) and its stats under key. Best effort."""
+        data_path, meta_path = self.paths(key)
+        try:
+            os.makedirs(os.path.dirname(data_path), exist_ok=True)
+            replace_with(output_file, data_path)
+            info = os.stat(data_path)
+            temporary = f"{meta_path}.{uuid.uuid4().hex}.part"
+            with open(temporary, 'w', encoding='utf-8') as f:
+                json.dump({'stats': stats, 'size': info.st_size, 'mtime_ns': info.st_mtime_ns}, f)
+            os.replace(temporary, meta_path)
+        except OSError:
+            # A full or read-only cache just means a miss next time - but don't keep an output without its stats
+            if not os.path.exists(meta_path):
+                self.remove(key)
+
+    def remove(self, key):
+        for path in self.paths(key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # Already gone, or best effort like store()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes; returns how many.
+
+        An entry is last used when its .json was last touched. An .out left
+        without one (its stats couldn't be written) goes by its own mtime.
+        """
+        entries = {}  # key -> [last used, bytes]
+        total = 0
+        for folder in os.scandir(self.directory):
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                key, extension = os.path.splitext(entry.name)
+                if extension not in ('.json', '.out'):
+                    continue
+                info = entry.stat()
+                last_used, size = entries.setdefault(key, [None, 0])
+                if extension == '.json' or last_used is None:
+                    entries[key][0] = info.st_mtime_ns
+                entries[key][1] += info.st_size
+                total += info.st_size
+        evicted = 0
+        for last_used, key, size in sorted((last_used, key, size) for key, (last_used, size) in entries.items()):
+            if total <= self.max_bytes:
+                break
+            self.remove(key)
+            total -= size
+            evicted += 1
+        return evicted
@@ -0,0 +1,276 @@
+"""
+NumPy columnar engine.
+
+Lines are parsed a block at a time into X/Y/Z/A columns. Compare-against A
+values, A deltas, tiers and taper Z are then worked out for the whole block
+with array operations, and only the lines that change are re-formatted.
+
+NumPy is optional - without it, use the plain streaming GCodeEngine.
+"""
+
+import math
+import struct
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional
+    np = None
+
+from gcode_engine import Decimator, GCodeEngine, LookaheadWindow, has_explicit_g1, splice_line, new_stats
+from gcode_fixed import FixedPointEngine
+from gcode_mmap import MappedEngine
+
+
+NAN = math.nan
+
+# One packed record per line: X, Y, Z, A (NaN when missing), then the
+# is_parsed and explicit flags - 34 bytes instead of a float object per axis
+RECORD = struct.Struct('<4d2?')
+NO_RECORD = RECORD.pack(NAN, NAN, NAN, NAN, False, False)
+RECORD_FIELDS = (('x', '<f8'), ('y', '<f8'), ('z', '<f8'), ('a', '<f8'), ('is_parsed', '?'), ('explicit', '?'))
+
+
+def numpy_available():
+    return np is not None
+
+
+def taper_adjustments(profile, x):
+    """TaperProfile.adjustment() for an array of X values, with one sorted-array search."""
+    position = profile.offset - x if profile.reverse else x - profile.offset
+    k = np.searchsorted(np.array(profile.starts), position, side='right') - 1
+    k = np.clip(k, 0, len(profile.widths) - 1)
+    starts = np.array(profile.starts)[k]
+    z = np.array(profile.drops)[k] * (1.0 - (position - starts) / np.array(profile.widths)[k])
+    ends = np.array(profile.ends)[k]
+    # Adding an end offset of 0 would turn -0.0 into 0.0
+    return np.where(ends != 0.0, z + ends, z)
+
+
+class ColumnBlock:
+    """Raw lines of a block plus their parsed records (NaN for missing axes).
+
+    Lines are kept as read, newline included, so untouched ones can be
+    written straight back out. The numbers go into one bytearray of packed
+    records, and only the (F, X, Z) texts splice_line() needs are kept of
+    each line's words.
+    """
+
+    def __init__(self):
+        self.lines = []
+        self.records = bytearray()
+        self.texts = []
+
+    def append(self, line, words):
+        self.lines.append(line)
+        if words is None:
+            self.records += NO_RECORD
+            self.texts.append(None)
+            return
+        x, y, z, a, f, explicit_g1, texts = words
+        self.records += RECORD.pack(NAN if x is None else x, NAN if y is None else y,
+                                    NAN if z is None else z, NAN if a is None else a,
+                                    True, a is not None and has_explicit_g1(line, explicit_g1))
+        self.texts.append(texts)
+
+    def columns(self):
+        """The records as one NumPy array per field (copies, so the block can still be resized)."""
+        records = np.frombuffer(self.records, dtype=np.dtype(list(RECORD_FIELDS)))
+        return [records[name].copy() for name, kind in RECORD_FIELDS]
+
+    def drop(self, count):
+        """Forget the first count lines once they have been written."""
+        del self.lines[:count]
+        del self.records[:count * RECORD.size]
+        del self.texts[:count]
+
+
+class ColumnarEngine(GCodeEngine):
+    """GCodeEngine that tiers and tapers whole blocks of lines with NumPy.
+
+    Output is identical to the streaming engine. Memory is bounded by
+    chunk_lines: an explicit G1 line still waiting for its next A value at the
+    end of a block waits in a LookaheadWindow, as in the streaming engine, and
+    the lines behind it are processed a block at a time into that window.
+    """
+
+    def __init__(self, *args, chunk_lines=262144, **kwargs):
+        if np is None:
+            raise ImportError("The NumPy engine needs numpy (pip install numpy)")
+        super().__init__(*args, **kwargs)
+        self.chunk_lines = chunk_lines
+
+    def tiers(self, a_change):
+        """Vectorized classify(): the tier number (0 = default) for each A change."""
+        # searchsorted(side='left') counts the thresholds below each change, like bisect_left
+        limits = np.array(self.table.limits, dtype=np.float64)
+        return (len(limits) - np.searchsorted(limits, a_change, side='left')).astype(np.int8)
+
+    def process_block(self, block, first_line_number, state, stats, out, final, next_a=NAN):
+        """Process a block and return how many lines were written.
+
+        Unless this is the final block, the block is cut at its last A line if
+        that line is an explicit G1 (it needs the next block's first A value);
+        the caller carries the rest over into the next block.
+        """
+        lines = block.lines
+        x, y, z, a, is_parsed, explicit = block.columns()
+        a_index = np.flatnonzero(~np.isnan(a))
+        explicit = explicit[a_index]
+
+        cut = len(lines)
+        next_after = next_a
+        if not final and len(a_index) and explicit[-1]:
+            cut = int(a_index[-1])
+            next_after = a[cut]
+            a_index = a_index[:-1]
+            explicit = explicit[:-1]
+        if cut == 0:
+            return 0
+
+        # Modal Z: forward-fill the Z of Z-only moves (like G1Z-0.0071)
+        z_only = is_parsed[:cut] & ~np.isnan(z[:cut]) & np.isnan(x[:cut]) & np.isnan(y[:cut])
+        last_z_only = np.maximum.accumulate(np.where(z_only, np.arange(cut), -1))
+        modal_z = np.where(last_z_only >= 0, z[np.maximum(last_z_only, 0)], state['modal_z'])
+
+        # Compare-against A: the next A for explicit G1 lines, the previous A for modal ones
+        a_values = a[a_index]
+        previous_a = np.concatenate(([state['previous_a']], a_values))[:-1]
+        next_a = np.concatenate((a_values, [next_after]))[1:]
+        compare_a = np.where(explicit, next_a, previous_a)
+        known = ~np.isnan(compare_a)
+        a_change = np.abs(a_values - compare_a)
+        tier_values = self.tiers(a_change)
+
+        line_tier = np.full(cut, -1, dtype=np.int8)
+        line_tier[a_index[known]] = tier_values[known]
+        counts = np.bincount(tier_values[known], minlength=len(self.table) + 1)
+        for tier in stats['tier_counts']:
+            stats['tier_counts'][tier] += int(counts[tier])
+
+        line_a_change = np.zeros(cut, dtype=np.float64)
+        line_a_change[a_index] = a_change
+
+        # Taper Z for every X move: Z + adjustment if the line has Z, else modal Z + adjustment
+        if self.apply_taper:
+            taper = is_parsed[:cut] & ~np.isnan(x[:cut])
+            z_adjustment = taper_adjustments(self.taper, x[:cut])
+            has_z = ~np.isnan(z[:cut])
+            taper_z = np.where(has_z, z[:cut], modal_z) + z_adjustment
+            stats['taper_count'] += int(np.count_nonzero(taper))
+            taper_l, has_z_l, taper_z_l = taper.tolist(), has_z.tolist(), taper_z.tolist()
+        else:
+            taper_l = has_z_l = [False] * cut
+
+        # Emit: untouched lines pass straight through, the rest are spliced
+        feeds = self.table.feedrates
+        tier_l = line_tier.tolist()
+        change_l = line_a_change.tolist()
+        texts_l = block.texts
+        write = out.write
+        detail = self.detail
+        for i in range(cut):
+            tier = tier_l[i]
+            line = lines[i]
+            if tier < 0 and not taper_l[i]:
+                write(line if line[-1:] == '\n' else line + '\n')
+                continue
+
+            original_line = line.rstrip('\n')
+            feedrate = None
+            if tier >= 0:
+                feedrate = feeds[tier]
+                if tier:
+                    self.record_modification(stats, first_line_number + i, change_l[i], tier,
+                                             feedrate, original_line, texts_l[i])
+            z_value = taper_z_l[i] if taper_l[i] else None
+            if detail is not None:
+                self.log_detail(first_line_number + i, change_l[i], tier, feedrate, z_value)
+            write(splice_line(original_line, texts_l[i], feedrate, z_value, has_z_l[i]) + '\n')
+
+        state['modal_z'] = float(modal_z[-1])
+        if len(a_values):
+            state['previous_a'] = float(a_values[-1])
+        return cut
+
+    def process_lines(self, lines, out, max_buffered_lines=65536, carry=None):
+        """Stream lines from an iterable to out, a block of chunk_lines at a time.
+
+        max_buffered_lines and carry work as in GCodeEngine.process_lines.
+        """
+        stats = new_stats(len(self.table))
+        carry = carry or {}
+        decimator = None
+        if self.decimate:
+            decimator = Decimator(self.decimate)
+            lines = decimator.filter(lines)
+        self.current_motion_mode = None
+        previous_a = carry.get('previous_a')
+        next_a = carry.get('next_a')
+        state = {'previous_a': NAN if previous_a is None else previous_a, 'modal_z': carry.get('modal_z', 0.0)}
+        block = ColumnBlock()
+        window = LookaheadWindow(max_buffered_lines)
+        first_line_number = carry.get('first_line_number', 1)
+        line_number = first_line_number  # line number of the block's first line
+        parse_words = self.parse_words
+
+        for line in lines:
+            words = parse_words(line.rstrip('\n'))
+            if window.pending is not None and words is not None and words[3] is not None:
+                # The A value the waiting line needs: finish it, with everything behind it
+                line_number += self.process_block(block, line_number, state, stats, window, True)
+                block.drop(len(block.lines))
+                self.flush_pending(window, words[3], stats, out)
+            block.append(line, words)
+            if len(block.lines) >= self.chunk_lines:
+                done = self.process_block(block, line_number, state, stats,
+                                          out if window.pending is None else window, False)
+                block.drop(done)
+                line_number += done
+                if block.lines and window.pending is None:
+                    # Cut at an explicit G1 line - it waits for the next A value outside the block
+                    self.start_pending(block, line_number, state, window)
+                    line_number += 1
+
+        if window.pending is not None:
+            line_number += self.process_block(block, line_number, state, stats, window, True)
+            self.flush_pending(window, next_a, stats, out)
+        elif block.lines:
+            line_number += self.process_block(block, line_number, state, stats, out, True,
+                                              NAN if next_a is None else next_a)
+
+        stats['total_lines'] = line_number - first_line_number
+        if decimator:
+            stats['decimation'] = decimator.summary()
+        return stats
+
+    def start_pending(self, block, line_number, state, window):
+        """Move the block's first line (an explicit G1 line waiting for the next A) into window."""
+        x, y, z, a, is_parsed, explicit = RECORD.unpack_from(block.records)
+        if not math.isnan(z) and math.isnan(x) and math.isnan(y):
+            state['modal_z'] = z  # A Z-only move, for itself and the lines after it
+        window.start((line_number, block.lines[0].rstrip('\n'), a, state['modal_z']))
+        state['previous_a'] = a
+        block.drop(1)
+
+    def flush_pending(self, window, next_a, stats, out):
+        """Rewrite the waiting line for next_a (None if there's none) and write it and what's behind it."""
+        p_number, p_line, p_a, p_modal_z = window.pending
+        a_change = None if next_a is None else abs(p_a - next_a)
+        window.flush(self.rewrite_line(p_number, p_line, self.parse_gcode_line(p_line), a_change, p_modal_z, stats), out)
+
+
+def create_engine(name, *args, fixed_point=False, **kwargs):
+    """Build the named engine ('stream', 'numpy' or 'mmap') with GCodeEngine's arguments.
+
+    fixed_point picks the integer-unit FixedPointEngine (gcode_fixed.py) -
+    a streaming engine - whichever engine is named.
+    """
+    if name not in ('stream', 'numpy', 'mmap'):
+        raise ValueError(f"Unknown engine '{name}' (expected 'stream', 'numpy' or 'mmap')")
+    if fixed_point:
+        return FixedPointEngine(*args, **kwargs)
+    if name == 'numpy':
+        return ColumnarEngine(*args, **kwargs)
+    if name == 'stream':
+        return GCodeEngine(*args, **kwargs)
+    return MappedEngine(*args, **kwargs)
@@ -0,0 +1,212 @@
+"""
+Cycle-time estimate: how long a program keeps the machine busy.
+
+Tiering trades speed for finish, and this puts a number on the speed side.
+Each feed move takes its length over the modal feedrate. X/Y/Z and A degrees
+are combined into one distance, the way Mach3 feeds a wrapped rotary axis.
+Rapids run at a fixed rapid rate. Acceleration is ignored. Optionally, every
+block takes at least 1 / block_rate seconds, for a controller that can't
+keep up with very short moves.
+
+Lines are read in blocks of end-point and feedrate columns, and each block's
+distances and times are summed in one pass, vectorized with NumPy when it's
+installed. Only running totals are kept between blocks, so memory doesn't
+grow with the program. Arcs are counted as their chords.
+"""
+
+import math
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional
+    np = None
+
+from gcode_engine import COMMENT_RE, WORD_RE, open_input, track_progress
+
+
+DEFAULT_RAPID_RATE = 200.0  # Units per minute
+ESTIMATE_BLOCK_MOVES = 1 << 16  # Moves summed at a time
+
+
+class MoveColumns:
+    """End point (X, Y, Z, A - NaN until first set), feedrate and rapid flag of every move."""
+
+    def __init__(self):
+        self.points = array('d')  # 4 per move
+        self.feeds = array('d')  # NaN before the first F
+        self.rapid = bytearray()
+
+    def __len__(self):
+        return len(self.feeds)
+
+
+def read_moves(lines, block_moves=ESTIMATE_BLOCK_MOVES):
+    """MoveColumns for the G0/G1/G2/G3 moves in an iterable of lines, at most block_moves at a time."""
+    moves = MoveColumns()
+    position = [math.nan] * 4
+    feed = math.nan
+    motion = None
+    absolute = True
+    axes = {'X': 0, 'Y': 1, 'Z': 2, 'A': 3}
+    findall = WORD_RE.findall
+    for line in lines:
+        if '(' in line:
+            line = COMMENT_RE.sub('', line)
+        moved = False
+        for letter, value in findall(line.upper()):
+            if letter in axes:
+                index = axes[letter]
+                if absolute:
+                    position[index] = float(value)
+                else:
+                    position[index] = (0.0 if math.isnan(position[index]) else position[index]) + float(value)
+                moved = True
+            elif letter == 'F':
+                feed = float(value)
+            elif letter == 'G':
+                code = float(value)
+                if code in (0, 1, 2, 3):
+                    motion = code
+                elif code in (90, 91):
+                    absolute = code == 90
+                elif code in (28, 30, 53, 80, 92) or 73 <= code <= 89:
+                    motion = None  # Homing, machine coordinates, cycles: not estimated
+        if moved and motion is not None:
+            moves.points.extend(position)
+            moves.feeds.append(feed)
+            moves.rapid.append(motion == 0)
+            if len(moves) >= block_moves:
+                yield moves
+                moves = MoveColumns()
+    if len(moves):
+        yield moves
+
+
+def estimate(lines, rapid_rate=DEFAULT_RAPID_RATE, block_rate=None):
+    """Time and distance totals for a program's lines (minutes and program units).
+
+    The first time an axis is set it hasn't moved (where it started is
+    unknown). Feed moves before the first F aren't timed, only counted.
+    """
+    sum_block = sum_block_numpy if np is not None else sum_block_python
+    min_minutes = 1.0 / block_rate / 60.0 if block_rate else 0.0
+    totals = [0.0, 0.0, 0.0, 0.0, 0]  # Feed/rapid minutes, feed/rapid distance, untimed moves
+    count = 0
+    previous = None  # Where the last block ended
+    for moves in read_moves(lines):
+        if previous is None:
+            previous = moves.points[0:4]
+        for k, total in enumerate(sum_block(moves, previous, rapid_rate, min_minutes)):
+            totals[k] += total
+        count += len(moves)
+        previous = moves.points[-4:]
+    return cycle_time(count, *totals)
+
+
+def sum_block_python(moves, previous, rapid_rate, min_minutes):
+    """(feed minutes, rapid minutes, feed distance, rapid distance, untimed moves) for one block."""
+    feed_minutes = rapid_minutes = feed_distance = rapid_distance = 0.0
+    untimed = 0
+    points = moves.points
+    for k in range(len(moves)):
+        point = points[4 * k:4 * k + 4]
+        distance = math.sqrt(sum((p - q) ** 2 for p, q in zip(point, previous) if p == p and q == q))
+        previous = point
+        if moves.rapid[k]:
+            rapid_distance += distance
+            rapid_minutes += max(distance / rapid_rate, min_minutes)
+        elif moves.feeds[k] > 0:
+            feed_distance += distance
+            feed_minutes += max(distance / moves.feeds[k], min_minutes)
+        else:
+            untimed += 1
+    return feed_minutes, rapid_minutes, feed_distance, rapid_distance, untimed
+
+
+def sum_block_numpy(moves, previous, rapid_rate, min_minutes):
+    points = np.frombuffer(moves.points, dtype=np.float64).reshape(-1, 4)
+    steps = np.diff(points, axis=0, prepend=np.frombuffer(previous, dtype=np.float64).reshape(1, 4))
+    distance = np.sqrt(np.sum(np.nan_to_num(steps) ** 2, axis=1))
+    feeds = np.frombuffer(moves.feeds, dtype=np.float64)
+    rapid = np.frombuffer(bytes(moves.rapid), dtype=np.bool_)
+    timed = ~rapid & (feeds > 0)  # NaN compares False
+    minutes = np.zeros(len(moves))
+    minutes[rapid] = distance[rapid] / rapid_rate
+    minutes[timed] = distance[timed] / feeds[timed]
+    if min_minutes:
+        minutes[rapid | timed] = np.maximum(minutes[rapid | timed], min_minutes)
+    return (float(minutes[timed].sum()), float(minutes[rapid].sum()),
+            float(distance[timed].sum()), float(distance[rapid].sum()),
+            int(len(moves) - rapid.sum() - timed.sum()))
+
+
+def cycle_time(moves, feed_minutes, rapid_minutes, feed_distance, rapid_distance, untimed):
+    return {
+        'moves': moves,
+        'minutes': feed_minutes + rapid_minutes,
+        'feed_minutes': feed_minutes,
+        'rapid_minutes': rapid_minutes,
+        'feed_distance': feed_distance,
+        'rapid_distance': rapid_distance,
+        'untimed_moves': untimed,
+    }
+
+
+def estimate_file(path, rapid_rate=DEFAULT_RAPID_RATE, block_rate=None, progress=None):
+    """estimate() for a program file (.gz/.xz/.bz2 are decompressed as read).
+
+    progress is called as by track_progress() and may raise ProcessingCancelled.
+    """
+    with open_input(path) as f:
+        return estimate(f if progress is None else track_progress(f, progress), rapid_rate, block_rate)
+
+
+def compare_files(input_file, output_file, rapid_rate=DEFAULT_RAPID_RATE, block_rate=None, progress=None):
+    """Estimates for a program before and after processing, and the difference in minutes.
+
+    progress(lines_done, chars_done) counts through the input and then the
+    output; it may raise ProcessingCancelled to stop.
+    """
+    read = [0, 0]  # Lines and chars of the input, once it's done
+    def input_progress(lines_done, chars_done):
+        read[:] = lines_done, chars_done
+        progress(lines_done, chars_done)
+    def output_progress(lines_done, chars_done):
+        progress(read[0] + lines_done, read[1] + chars_done)
+    before = estimate_file(input_file, rapid_rate, block_rate, progress and input_progress)
+    after = estimate_file(output_file, rapid_rate, block_rate, progress and output_progress)
+    return {'input': before, 'output': after, 'delta_minutes': after['minutes'] - before['minutes'],
+            'rapid_rate': rapid_rate, 'block_rate': block_rate}
+
+
+def format_minutes(minutes):
+    """'1:02:03' or '2:03' (h:mm:ss / m:ss) for a time in minutes."""
+    seconds = round(abs(minutes) * 60)
+    hours, seconds = divmod(seconds, 3600)
+    text = f"{hours}:{seconds // 60:02d}:{seconds % 60:02d}" if hours else f"{seconds // 60}:{seconds % 60:02d}"
+    return ('-' if minutes < 0 and seconds + hours else '') + text
+
+
+def comparison_lines(comparison):
+    """Human-readable lines for compare_files(), for the CLI summary and the GUI log."""
+    before = comparison['input']
+    after = comparison['output']
+    delta = comparison['delta_minutes']
+    share = f", {delta / before['minutes']:+.1%}" if before['minutes'] else ""
+    sign = '+' if delta >= 0 else ''
+    lines = [
+        f"Original: {format_minutes(before['minutes'])} "
+        f"(feed {format_minutes(before['feed_minutes'])}, rapid {format_minutes(before['rapid_minutes'])})",
+        f"Modified: {format_minutes(after['minutes'])} "
+        f"(feed {format_minutes(after['feed_minutes'])}, rapid {format_minutes(after['rapid_minutes'])})",
+        f"Difference: {sign}{format_minutes(delta)}{share}",
+    ]
+    untimed = max(before['untimed_moves'], after['untimed_moves'])
+    if untimed:
+        lines.append(f"{untimed:,} feed moves before the first F weren't timed")
+    rates = f"rapids at {comparison['rapid_rate']:g}/min"
+    if comparison['block_rate']:
+        rates += f", at most {comparison['block_rate']:g} blocks/sec"
+    lines.append(f"Estimate: {rates}, no acceleration")
+    return lines
@@ -0,0 +1,343 @@
+"""
+Daemon mode: a long-running local server with a warm worker pool.
+
+A CAM post-hook that calls the processor for every program pays for a fresh
+interpreter, the imports and the regex compiles each time. The daemon pays
+once. Clients POST a program to /process over localhost HTTP (or a Unix
+socket), with settings in the query string named like manifest columns, and
+get the modified program back with its stats in an X-GCode-Stats header:
+
+    curl --data-binary @part.tap -o part_modified.tap \\
+         'http://127.0.0.1:8765/process?threshold1=2&feedrate1=120'
+
+Jobs run on a process pool started when the daemon starts. At most
+workers + queue jobs are taken at a time; past that the daemon answers 503
+with Retry-After instead of piling work up. GET /status reports the counters.
+"""
+
+import errno
+import json
+import locale
+import os
+import shutil
+import socket
+import socketserver
+import stat
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from gcode_batch import SETTING_DEFAULTS, clean_settings, run_job
+from gcode_engine import decimate_error, parse_profile_pairs, taper_error, tier_error
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+COPY_CHUNK = 1 << 20
+
+# Bodies up to this size are read and dropped before an early error reply, so
+# the client sees the reply rather than a connection reset mid-upload
+DISCARD_LIMIT = 64 << 20
+
+
+def warm_up():
+    """Runs in each worker at startup; unpickling this call imports the engines."""
+    return os.getpid()
+
+
+def job_settings(query, defaults):
+    """Settings for one request from its query string, over the daemon's defaults."""
+    raw = dict(parse_qsl(query, keep_blank_values=True))
+    for name in raw:
+        if name not in SETTING_DEFAULTS:
+            raise ValueError(f"Unknown setting '{name}'")
+    if raw.get('taper_profile', '').strip():
+        # Only "x:diameter,..." pairs over the wire - a client doesn't get to name files on this machine
+        try:
+            raw['taper_profile'] = parse_profile_pairs(raw['taper_profile'])
+        except ValueError as e:
+            raise ValueError(f"{e} - send the points themselves, the daemon doesn't read profile files")
+    settings = clean_settings(raw, defaults)
+    tiers = settings['tiers'] or [(settings['threshold1'], settings['feedrate1']),
+                                  (settings['threshold2'], settings['feedrate2'])]
+    error = (taper_error(settings['large_diameter'], settings['small_diameter'], settings['length'],
+                         settings['taper_profile'])
+             or tier_error(tiers) or decimate_error(settings['decimate']))
+    if error:
+        raise ValueError(error)
+    return settings
+
+
+class JobPool:
+    """The warm worker pool, admission control and counters shared by every request."""
+
+    def __init__(self, workers=None, queue_size=None, engine='stream', defaults=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.capacity = self.workers + (self.workers * 2 if queue_size is None else queue_size)
+        self.engine = engine
+        self.defaults = dict(SETTING_DEFAULTS if defaults is None else defaults)
+        self.slots = threading.BoundedSemaphore(self.capacity)
+        self.lock = threading.Lock()
+        self.counts = {'active': 0, 'completed': 0, 'failed': 0, 'rejected': 0}
+        self.started = time.time()
+        self.tmp = tempfile.TemporaryDirectory(prefix='gcode_daemon_')
+        self.pool = self.start_pool()
+
+    def start_pool(self):
+        pool = ProcessPoolExecutor(max_workers=self.workers)
+        # One call per worker, all at once, so every process is started and imported now
+        for future in [pool.submit(warm_up) for _ in range(self.workers)]:
+            future.result()
+        return pool
+
+    def replace_pool(self, broken):
+        """Start a fresh warm pool in place of broken (once, however many jobs saw it break)."""
+        with self.lock:
+            if self.pool is not broken:
+                return
+            self.pool = self.start_pool()
+        broken.shutdown(wait=False)
+
+    def count(self, name, change=1):
+        with self.lock:
+            self.counts[name] += change
+
+    def admit(self):
+        """Take a slot for a new job, or False if workers and queue are all taken."""
+        if self.slots.acquire(blocking=False):
+            self.count('active')
+            return True
+        self.count('rejected')
+        return False
+
+    def release(self):
+        self.count('active', -1)
+        self.slots.release()
+
+    def job_dir(self):
+        return tempfile.mkdtemp(dir=self.tmp.name)
+
+    def run(self, input_file, output_file, settings):
+        """Process one program on the pool and wait for its result dict (see run_job).
+
+        If a worker process dies (killed for memory, say), the job fails with
+        result['crashed'] set and the pool is replaced, so later jobs still run.
+        """
+        pool = self.pool
+        try:
+            result = pool.submit(run_job, input_file, output_file, settings, self.engine).result()
+        except BrokenProcessPool as e:
+            self.replace_pool(pool)
+            result = {'input_file': input_file, 'output_file': output_file, 'elapsed': 0.0, 'crashed': True,
+                      'error': f"Worker process died, pool restarted: {e}"}
+        self.count('failed' if result['error'] else 'completed')
+        return result
+
+    def status(self):
+        with self.lock:
+            counts = dict(self.counts)
+        return dict(counts, workers=self.workers, capacity=self.capacity, engine=self.engine,
+                    uptime_seconds=round(time.time() - self.started, 1))
+
+    def close(self):
+        self.pool.shutdown()
+        self.tmp.cleanup()
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """POST /process runs a program, GET /status reports on the daemon."""
+
+    server_version = 'GCodeDaemon/1.0'
+    protocol_version = 'HTTP/1.1'  # Keep-alive, for clients that send job after job
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_request(self, code='-', size='-'):
+        pass  # Jobs are reported by the daemon itself, one line each
+
+    def send_text(self, code, text, headers=(), body_unread=False):
+        """Send a short plain-text response and close the connection."""
+        if body_unread:
+            self.discard_body()
+        body = (text + '\n').encode('utf-8')
+        self.send_response(code)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlsplit(self.path).path != '/status':
+            self.send_text(404, "Not found (POST /process or GET /status)")
+            return
+        body = json.dumps(self.server.jobs.status(), indent=2).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != '/process':
+            self.send_text(404, "Not found (POST /process or GET /status)", body_unread=True)
+            return
+        jobs = self.server.jobs
+        try:
+            settings = job_settings(url.query, jobs.defaults)
+        except ValueError as e:
+            self.send_text(400, f"Error: {e}", body_unread=True)
+            return
+        chunked = 'chunked' in self.headers.get('Transfer-Encoding', '').lower()
+        if not chunked and self.headers.get('Content-Length') is None:
+            self.send_text(411, "Error: Send the program with a Content-Length or chunked")
+            return
+
+        # Backpressure: turn the job away before reading it rather than queue without limit
+        if not jobs.admit():
+            self.send_text(503, "Busy - all workers and queue slots are taken, try again shortly",
+                           [('Retry-After', '1')], body_unread=True)
+            return
+        job_dir = jobs.job_dir()
+        try:
+            # A gzip body stays compressed on disk; the engine decompresses it as it reads
+            gzipped = self.headers.get('Content-Encoding', '').lower() == 'gzip'
+            input_file = os.path.join(job_dir, 'program.tap.gz' if gzipped else 'program.tap')
+            output_file = os.path.join(job_dir, 'program_modified.tap')
+            try:
+                self.receive(input_file)
+            except ConnectionError as e:
+                # The client went away mid-upload - there's no one to answer
+                print(f"✗ Upload cut short: {e}", flush=True)
+                self.close_connection = True
+                return
+            except ValueError:
+                self.send_text(400, "Error: Malformed request body")
+                return
+            result = jobs.run(input_file, output_file, settings)
+            if result['error']:
+                print(f"✗ {result['error']}", flush=True)
+                self.send_text(500 if result.get('crashed') else 422, f"Error: {result['error']}")
+                return
+            try:
+                self.send_program(output_file, result)
+            except ConnectionError as e:
+                print(f"✗ Client went away before the program was sent back: {e}", flush=True)
+                self.close_connection = True
+                return
+            stats = result['stats']
+            print(f"✓ {stats['total_lines']} lines in {result['elapsed']:.2f} s", flush=True)
+        finally:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            jobs.release()
+
+    def discard_body(self):
+        length = self.headers.get('Content-Length', '')
+        if length.isdigit() and int(length) <= DISCARD_LIMIT:
+            remaining = int(length)
+            while remaining > 0:
+                data = self.rfile.read(min(remaining, COPY_CHUNK))
+                if not data:
+                    break
+                remaining -= len(data)
+
+    def receive(self, path):
+        """Copy the request body (Content-Length or chunked) to path.
+
+        Raises ConnectionError if the client closes the connection before the
+        body ends, and ValueError if it's malformed.
+        """
+        with open(path, 'wb') as f:
+            length = self.headers.get('Content-Length')
+            if length is not None:
+                remaining = int(length)
+                while remaining > 0:
+                    data = self.rfile.read(min(remaining, COPY_CHUNK))
+                    if not data:
+                        raise ConnectionError("Client closed the connection mid-upload")
+                    f.write(data)
+                    remaining -= len(data)
+                return
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    raise ConnectionError("Client closed the connection mid-upload")
+                size = int(line.split(b';')[0], 16)
+                if size == 0:
+                    break
+                data = self.rfile.read(size)
+                if len(data) < size:
+                    raise ConnectionError("Client closed the connection mid-upload")
+                f.write(data)
+                self.rfile.readline()  # CRLF after the chunk
+            while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                pass  # Trailers
+
+    def send_program(self, path, result):
+        """Stream the modified program back with its stats in the X-GCode-Stats header."""
+        stats = dict(result['stats'], elapsed=round(result['elapsed'], 4))
+        self.send_response(200)
+        self.send_header('Content-Type', f"text/plain; charset={locale.getpreferredencoding(False)}")
+        self.send_header('Content-Length', str(os.path.getsize(path)))
+        self.send_header('X-GCode-Stats', json.dumps(stats, separators=(',', ':')))
+        self.end_headers()
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, self.wfile, COPY_CHUNK)
+
+
+def remove_stale_socket(path):
+    """Remove a socket file left behind by a daemon that was killed (it would block the bind).
+
+    Raises OSError if a daemon is still listening there.
+    """
+    if not os.path.exists(path) or not stat.S_ISSOCK(os.stat(path).st_mode):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        os.remove(path)  # Nobody listening
+        return
+    finally:
+        probe.close()
+    raise OSError(errno.EADDRINUSE, f"A daemon is already running on {path}")
+
+
+class UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None, workers=None, queue_size=None,
+          engine='stream', defaults=None, on_ready=None):
+    """Run the daemon until interrupted.
+
+    Listens on host:port, or on the Unix socket socket_path if given.
+    on_ready(jobs) is called once the pool is warm and the socket is bound.
+    """
+    jobs = JobPool(workers, queue_size, engine, defaults)
+    try:
+        if socket_path:
+            remove_stale_socket(socket_path)
+            server = UnixHTTPServer(socket_path, RequestHandler)
+        else:
+            server = ThreadingHTTPServer((host, port), RequestHandler)
+        server.jobs = jobs
+        try:
+            if on_ready:
+                on_ready(jobs)
+            server.serve_forever()
+        finally:
+            server.server_close()
+            if socket_path and os.path.exists(socket_path):
+                os.remove(socket_path)
+    finally:
+        jobs.close()
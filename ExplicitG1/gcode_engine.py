@@ -0,0 +1,882 @@
+"""
+Streaming processing engine shared by the GUI and command-line processors.
+
+Lines are read, tiered, tapered and written one at a time. The only lines held
+in memory are the ones waiting on an explicit G1 line's "look forward to next A"
+rule; everything else goes straight to the output. Untouched lines are written
+as read, and changed ones have their new words spliced in without a regex.
+"""
+
+import bz2
+import csv
+import gzip
+import io
+import lzma
+import math
+import os
+import re
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right
+from operator import mul, sub
+
+
+# Precompiled patterns - compiled once at import, not per line
+COMMENT_RE = re.compile(r'\(.*?\)')
+WORD_RE = re.compile(r'([A-Za-z])([+-]?\d+\.?\d*)')
+G0_RE = re.compile(r'G0+(?![1-9])', re.IGNORECASE)
+G1_RE = re.compile(r'G0*1', re.IGNORECASE)
+F_WORD_RE = re.compile(r'F[+-]?\d+\.?\d*', re.IGNORECASE)
+Z_WORD_RE = re.compile(r'Z[+-]?\d+\.?\d*', re.IGNORECASE)
+X_WORD_RE = re.compile(r'(X[+-]?\d+\.?\d*)', re.IGNORECASE)
+
+# A move decimation may merge away: X/Y/Z/A (and F) words and nothing else on the line
+PLAIN_MOVE_RE = re.compile(r'\s*(?:[XYZAF][+-]?\d+\.?\d*\s*)+', re.IGNORECASE)
+
+# Output goes through one large buffer instead of a flush every 8 KB
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+# Compressed programs are read and written through these, picked by extension
+COMPRESSORS = {'.gz': gzip, '.xz': lzma, '.bz2': bz2}
+
+# Leading bytes of each format, for compressed data arriving on stdin
+COMPRESSED_MAGIC = ((b'\x1f\x8b', gzip), (b'\xfd7zXZ\x00', lzma), (b'BZh', bz2))
+
+
+class ProcessingCancelled(Exception):
+    """Raised from a progress callback to stop a job part way through."""
+
+
+def track_progress(lines, callback, every=2000):
+    """Pass lines through, calling callback(lines_done, chars_done) every few lines.
+
+    The callback may raise ProcessingCancelled to stop the job.
+    """
+    lines_done = 0
+    chars_done = 0
+    for line in lines:
+        lines_done += 1
+        chars_done += len(line)
+        if lines_done % every == 0:
+            callback(lines_done, chars_done)
+        yield line
+    callback(lines_done, chars_done)
+
+
+def tokenize(line):
+    """Split a line into (letter, value, span) words in a single scan.
+
+    Letters are upper-cased. A word's value is only digits, sign and decimal
+    point, so one left-to-right scan finds exactly the words a separate
+    re.search per axis would have found.
+    """
+    return [(m.group(1).upper(), float(m.group(2)), m.span()) for m in WORD_RE.finditer(line)]
+
+
+def has_explicit_g1(original_line, parsed_explicit_g1):
+    """True if the raw line starts with G1/G01 (the explicit G1 check sees comments too)."""
+    if '(' in original_line:
+        return bool(G1_RE.match(original_line.strip()))
+    return parsed_explicit_g1
+
+
+def set_feedrate(line, feedrate):
+    """Replace any F words on the line with a single trailing feedrate."""
+    return f"{F_WORD_RE.sub('', line).strip()} F{feedrate}"
+
+
+def set_taper_z(line, z_value, has_z):
+    """Overwrite the line's Z words, or add a Z after its X words (z_value: a float, or its text)."""
+    z_word = f'Z{z_value}' if isinstance(z_value, str) else f'Z{z_value:.4f}'
+    if has_z:
+        return Z_WORD_RE.sub(z_word, line)
+    return X_WORD_RE.sub(lambda m: m.group(1) + z_word, line)
+
+
+def splice_line(line, texts, feedrate=None, z_value=None, has_z=False):
+    """set_feedrate() (if feedrate is given) then set_taper_z() (if z_value is given).
+
+    texts is the (F, X, Z) value texts parse_words found in the line. An F,
+    X or Z word that is the only one of its letter is found with a plain
+    string search and the new text spliced in around it - no regex. Other
+    lines (comments, lower-case letters, repeated words) use the regexes.
+
+    A float z_value is written with 4 decimals; text (from the fixed-point
+    engine) is written as it is.
+    """
+    if texts is not None:
+        if feedrate is not None:
+            f_value = texts[0]
+            if f_value is None:
+                line = f"{line.strip()} F{feedrate}"
+            else:
+                start = line.find('F')
+                end = start + 1 + len(f_value)
+                if line.find('F', start + 1) >= 0:
+                    texts = None
+                elif z_value is not None and line[end:end + 1] in ('+', '-', '.') and start and not line[start - 1].isspace():
+                    # Cutting "F5" out of "X1F5.2" would change the X word taper sees
+                    texts = None
+                else:
+                    line = f"{(line[:start] + line[end:]).strip()} F{feedrate}"
+            if texts is None:
+                line = set_feedrate(line, feedrate)
+                feedrate = None
+
+        if texts is not None and z_value is not None:
+            letter = 'Z' if has_z else 'X'
+            start = line.find(letter)
+            end = start + 1 + len(texts[2] if has_z else texts[1])
+            if line.find(letter, start + 1) >= 0:
+                texts = None
+            else:
+                z_text = z_value if isinstance(z_value, str) else f'{z_value:.4f}'
+                if has_z:
+                    return f'{line[:start]}Z{z_text}{line[end:]}'
+                return f'{line[:end]}Z{z_text}{line[end:]}'
+        if texts is not None:
+            return line
+
+    if feedrate is not None:
+        line = set_feedrate(line, feedrate)
+    if z_value is not None:
+        line = set_taper_z(line, z_value, has_z)
+    return line
+
+
+def compressor_for(path):
+    """The gzip, lzma or bz2 module for a .gz, .xz or .bz2 path, or None."""
+    return COMPRESSORS.get(os.path.splitext(path)[1].lower())
+
+
+def is_plain_file(path):
+    """True unless path is '-' (stdin/stdout) or compressed - plain files can be seeked and mapped."""
+    return path != '-' and compressor_for(path) is None
+
+
+def open_input(path):
+    """Open a program for reading as text, decoded like open(path, 'r').
+
+    '-' is stdin. .gz/.xz/.bz2 files, and compressed data on stdin, are
+    decompressed as they are read.
+    """
+    if path == '-':
+        stdin = open(sys.stdin.fileno(), 'rb', closefd=False)
+        head = stdin.peek(6)
+        for magic, module in COMPRESSED_MAGIC:
+            if head.startswith(magic):
+                return module.open(stdin, 'rt')
+        return io.TextIOWrapper(stdin)
+    module = compressor_for(path)
+    if module is not None:
+        return module.open(path, 'rt')
+    return open(path, 'r')
+
+
+def open_output(path, binary=False):
+    """Open an output file for writing through one large buffer.
+
+    '-' is stdout (left open afterwards). .gz/.xz/.bz2 files are compressed as
+    they are written. With binary=True the file takes bytes.
+    """
+    mode = 'wb' if binary else 'w'
+    if path == '-':
+        # The real stdout, even while print() output is redirected to stderr
+        return open(sys.__stdout__.fileno(), mode, buffering=OUTPUT_BUFFER_SIZE, closefd=False)
+    module = compressor_for(path)
+    if module is not None:
+        return module.open(path, 'wb' if binary else 'wt')
+    return open(path, mode, buffering=OUTPUT_BUFFER_SIZE)
+
+
+def taper_error(large_diameter, small_diameter, length, profile=None):
+    """Return an error message for invalid taper settings, or None if they're usable.
+
+    profile is a taper profile table (see TaperProfile), used instead of the
+    three cone values.
+    """
+    if profile is not None:
+        if large_diameter is not None or small_diameter is not None or length is not None:
+            return "Use either a taper profile or large/small diameter and length, not both!"
+        return profile_error(profile)
+    if large_diameter is None or small_diameter is None or length is None:
+        return None  # Taper disabled
+    if large_diameter <= 0 or small_diameter <= 0 or length <= 0:
+        return "All taper values must be positive!"
+    if small_diameter >= large_diameter:
+        return "Small diameter must be less than large diameter!"
+    return None
+
+
+def profile_error(points):
+    """Return an error message for an invalid taper profile table, or None if it's usable.
+
+    points is a list of (x, diameter) pairs in X order. Two points may share
+    an X to make a step, but not the first two or the last two.
+    """
+    if len(points) < 2:
+        return "A taper profile needs at least two points!"
+    for number, (x, diameter) in enumerate(points, 1):
+        if not diameter > 0:
+            return f"Taper profile point {number}: diameter must be positive!"
+        if number > 1 and not x >= points[number - 2][0]:
+            return f"Taper profile point {number}: X must not be less than the point before!"
+        if number > 2 and x == points[number - 3][0]:
+            return f"Taper profile point {number}: only two points can share an X (a step)!"
+    if points[0][0] == points[1][0] or points[-1][0] == points[-2][0]:
+        return "A taper profile can't start or end with a step!"
+    return None
+
+
+def load_taper_profile(path):
+    """Read an x,diameter CSV file into (x, diameter) pairs.
+
+    A header row, blank lines and lines starting with # are skipped.
+    """
+    points = []
+    with open(path, 'r', newline='') as f:
+        for number, row in enumerate(csv.reader(f), 1):
+            if not row or not ''.join(row).strip() or row[0].lstrip().startswith('#'):
+                continue
+            try:
+                points.append((float(row[0]), float(row[1])))
+            except (IndexError, ValueError):
+                if points or number > 1:
+                    raise ValueError(f"{os.path.basename(path)} line {number}: expected x,diameter")
+                # A header row
+    return points
+
+
+def parse_taper_profile(text, base_dir=None):
+    """A taper profile from a CSV file name (relative to base_dir), or written out as "x:diameter,..."."""
+    path = os.path.join(base_dir or '', text)
+    if os.path.isfile(path):
+        try:
+            return load_taper_profile(path)
+        except OSError as e:
+            raise ValueError(f"Can't read taper profile: {e}")
+    try:
+        return parse_profile_pairs(text)
+    except ValueError:
+        raise ValueError(f"Taper profile '{text}' is neither a CSV file nor x:diameter pairs")
+
+
+def parse_profile_pairs(text):
+    """A taper profile written out as "x:diameter,..." (never read from a file)."""
+    points = []
+    for item in text.replace(';', ',').split(','):
+        if not item.strip():
+            continue
+        x, sep, diameter = item.partition(':')
+        try:
+            if not sep:
+                raise ValueError
+            points.append((float(x), float(diameter)))
+        except ValueError:
+            raise ValueError(f"Taper profile '{text}' isn't x:diameter pairs")
+    return points
+
+
+def tier_error(tiers):
+    """Return an error message for an invalid tier table, or None if it's usable.
+
+    tiers is a list of (threshold, feedrate) pairs, Tier 1 first.
+    """
+    if not tiers:
+        return "At least one feedrate tier is needed!"
+    for number, (threshold, feedrate) in enumerate(tiers, 1):
+        if threshold < 0:
+            return f"Tier {number} threshold can't be negative!"
+        if feedrate <= 0:
+            return f"Tier {number} feedrate must be positive!"
+        if number > 1 and threshold >= tiers[number - 2][0]:
+            return f"Tier {number} threshold must be less than Tier {number - 1} threshold!"
+    return None
+
+
+def decimate_error(tolerance):
+    """Return an error message for an invalid decimation tolerance, or None (None = off)."""
+    if tolerance is not None and not tolerance > 0:
+        return "Decimation tolerance must be positive!"
+    return None
+
+
+def parse_tiers(text):
+    """Parse "1.5:100,0.5:50,0.2:25" (threshold:feedrate, Tier 1 first) into pairs."""
+    tiers = []
+    for item in text.replace(';', ',').split(','):
+        if not item.strip():
+            continue
+        threshold, sep, feedrate = item.partition(':')
+        if not sep:
+            raise ValueError(f"Tier '{item.strip()}' should be threshold:feedrate")
+        try:
+            tiers.append((float(threshold), float(feedrate)))
+        except ValueError:
+            raise ValueError(f"Invalid tier '{item.strip()}'")
+    return tiers
+
+
+class FeedrateTable:
+    """Ordered A-change thresholds and the feedrate for each tier.
+
+    Tier 1 has the largest threshold and each later tier a smaller one. An A
+    change gets the last (tightest) tier it is within, or the default
+    feedrate - tier 0 - when it is above Tier 1.
+    """
+
+    def __init__(self, tiers, default_feedrate):
+        error = tier_error(tiers)
+        if error:
+            raise ValueError(error)
+        self.tiers = [tuple(tier) for tier in tiers]
+        self.default_feedrate = default_feedrate
+        # Feedrate by tier number, and the thresholds smallest first for bisect
+        self.feedrates = [default_feedrate] + [feedrate for threshold, feedrate in self.tiers]
+        self.limits = [threshold for threshold, feedrate in reversed(self.tiers)]
+
+    def __len__(self):
+        return len(self.tiers)
+
+    def classify(self, a_change):
+        """Return (tier, feedrate) for an A-axis change."""
+        tier = len(self.limits) - bisect_left(self.limits, a_change)
+        return tier, self.feedrates[tier]
+
+    def describe(self):
+        """Settings lines like "Tier 1: A-axis ≤ 1.5° → F100", Tier 1 first."""
+        return [f"Tier {number}: A-axis ≤ {threshold}° → F{feedrate}"
+                for number, (threshold, feedrate) in enumerate(self.tiers, 1)]
+
+    def summary(self, tier_counts):
+        """Summary lines like "Tier 2 (≤ 0.5°): 12 lines → F50", tightest tier first."""
+        lines = [f"Tier {number} (≤ {threshold}°): {tier_counts[number]} lines → F{feedrate}"
+                 for number, (threshold, feedrate) in reversed(list(enumerate(self.tiers, 1)))]
+        lines.append(f"Default (> {self.tiers[0][0]}°): {tier_counts[0]} lines → F{self.default_feedrate}")
+        return lines
+
+
+class TaperProfile:
+    """Part diameter along X as a table, and the Z offset that follows the surface.
+
+    The largest diameter in the table is cut as programmed. Everywhere else Z
+    goes deeper by the difference in radius. The diameter is linear between
+    points, and the first and last segments carry on past the ends. offset is
+    the machine X where the table's X 0 sits. reverse runs the table towards
+    -X from there.
+    """
+
+    def __init__(self, points, offset=0.0, reverse=False):
+        error = profile_error(points)
+        if error:
+            raise ValueError(error)
+        self.points = [(float(x), float(diameter)) for x, diameter in points]
+        self.offset = offset
+        self.reverse = reverse
+        reference = max(diameter for x, diameter in self.points) / 2.0
+        radii = [diameter / 2.0 - reference for x, diameter in self.points]
+        # Per segment: start X, width, and the offsets at its ends
+        self.starts = [x for x, diameter in self.points]
+        self.widths = [self.starts[k + 1] - self.starts[k] for k in range(len(radii) - 1)]
+        self.drops = [radii[k] - radii[k + 1] for k in range(len(radii) - 1)]
+        self.ends = radii[1:]
+
+    @classmethod
+    def cone(cls, large_diameter, small_diameter, length):
+        """The straight taper from small_diameter at X 0 to large_diameter at X length."""
+        return cls([(0.0, small_diameter), (length, large_diameter)])
+
+    def __len__(self):
+        return len(self.points)
+
+    def position(self, x):
+        return self.offset - x if self.reverse else x - self.offset
+
+    def segment(self, position):
+        """Index of the segment a table X falls in (the end ones stretch on past the table)."""
+        return min(max(bisect_right(self.starts, position) - 1, 0), len(self.widths) - 1)
+
+    def adjustment(self, x):
+        """Z adjustment at machine X (gcode_columnar.taper_adjustments() does a whole column)."""
+        position = self.position(x)
+        k = self.segment(position) if len(self.widths) > 1 else 0
+        z = self.drops[k] * (1.0 - (position - self.starts[k]) / self.widths[k])
+        # Adding an end offset of 0 would turn -0.0 into 0.0
+        return z + self.ends[k] if self.ends[k] else z
+
+    def describe(self):
+        """Settings line like "Taper profile: 5 points, X 0 to 12, diameter 0.85 to 1.25"."""
+        xs = [x for x, diameter in self.points]
+        diameters = [diameter for x, diameter in self.points]
+        text = (f"Taper profile: {len(self)} points, X {xs[0]:g} to {xs[-1]:g}, "
+                f"diameter {min(diameters):g} to {max(diameters):g}")
+        if self.offset:
+            text += f", offset X{self.offset:g}"
+        if self.reverse:
+            text += ", reversed"
+        return text
+
+
+def new_stats(tier_count=2):
+    """Empty stats dict filled in by the engines."""
+    return {
+        'total_lines': 0,
+        'tier_counts': dict.fromkeys(range(tier_count + 1), 0),
+        'modifications_count': 0,
+        'taper_count': 0,
+        'modification_details': []
+    }
+
+
+class LookaheadWindow:
+    """Holds output lines that are waiting on a pending explicit G1 line.
+
+    The pending line can only be finished once the next A value is known, and
+    every line after it has to be written behind it. Long runs of non-A moves
+    are spilled to a temporary file so memory stays bounded. With binary=True
+    the lines are bytes.
+    """
+
+    def __init__(self, max_buffered_lines=65536, binary=False):
+        self.max_buffered_lines = max_buffered_lines
+        self.spill_mode = 'w+b' if binary else 'w+'
+        self.empty = b'' if binary else ''
+        self.pending = None
+        self.buffered = []
+        self.spill = None
+
+    def start(self, pending):
+        self.pending = pending
+
+    def append(self, text):
+        self.buffered.append(text)
+        if len(self.buffered) >= self.max_buffered_lines:
+            if self.spill is None:
+                self.spill = tempfile.TemporaryFile(self.spill_mode)
+            self.spill.writelines(self.buffered)
+            self.buffered = []
+
+    write = append  # So an engine can write into the window as into its output
+
+    def flush(self, pending_text, out):
+        """Write the finished pending line followed by everything behind it."""
+        out.write(pending_text)
+        if self.spill is not None:
+            self.spill.seek(0)
+            for chunk in iter(lambda: self.spill.read(1 << 20), self.empty):
+                out.write(chunk)
+            self.spill.close()
+            self.spill = None
+        out.writelines(self.buffered)
+        self.pending = None
+        self.buffered = []
+
+
+class Decimator:
+    """Merges runs of short G1 moves that lie along one straight line.
+
+    A move is dropped when the one after it makes it redundant: both carry the
+    same axis words and nothing else (no comments, G or other words, and an F
+    only if it repeats the modal feedrate), in absolute G1 mode, and every point of the run stays within tolerance of the
+    straight move from the run's start to the point that is kept. X/Y/Z and A
+    are compared as they are written, so the tolerance is in program units
+    and degrees alike.
+
+    Runs are grown Reumann-Witkam style: the first move sets a direction, and
+    the run goes on while each new point is within half the tolerance of that
+    line and further along it. That is one check per line, and it keeps every
+    dropped point within the full tolerance of the merged move.
+    """
+
+    AXES = 'XYZA'
+    # Words and G codes after which the program coordinates still say where the machine is
+    POSITION_LETTERS = frozenset('GXYZAFNSIJKR')
+    POSITION_G_CODES = frozenset((0, 1, 2, 3, 4, 17, 18, 19, 61, 64, 90, 94))
+
+    def __init__(self, tolerance):
+        self.tolerance = tolerance
+        self.lines_in = 0
+        self.lines_out = 0
+
+    def summary(self):
+        return {'tolerance': self.tolerance, 'blocks_before': self.lines_in, 'blocks_after': self.lines_out}
+
+    def filter(self, lines):
+        """Yield the lines that are kept, in order."""
+        position = dict.fromkeys(self.AXES)  # None until a line sets it
+        state = {'motion': None, 'absolute': True, 'feed': None}
+        limit = (self.tolerance / 2.0) ** 2
+        held = None  # Last move of the current run, written once the run ends
+        letters = start = direction = None
+        reach = 0.0
+        plain_move = PLAIN_MOVE_RE.fullmatch
+        findall = WORD_RE.findall
+
+        for line in lines:
+            self.lines_in += 1
+            if state['motion'] == 1 and state['absolute'] and plain_move(line):
+                words = findall(line.upper())
+                fields = dict(words)
+                feed = fields.pop('F', None)
+                if fields and len(fields) + (feed is not None) == len(words) and (
+                        feed is None or float(feed) == state['feed']):
+                    move_letters = ''.join(fields)
+                    point = list(map(float, fields.values()))
+                    before = [position[letter] for letter in move_letters]
+                    position.update(zip(move_letters, point))
+
+                    if held is not None and move_letters == letters and direction is not None:
+                        offset = list(map(sub, point, start))
+                        along = sum(map(mul, offset, direction))
+                        if along > reach and sum(map(mul, offset, offset)) - along * along <= limit:
+                            held = line  # The held move lies on the way - drop it
+                            reach = along
+                            continue
+
+                    if held is not None:
+                        self.lines_out += 1
+                        yield held
+                    # Start a new run at the position before this move
+                    held = line
+                    letters = move_letters
+                    direction = None
+                    if None not in before:
+                        offset = list(map(sub, point, before))
+                        reach = math.hypot(*offset)
+                        if reach > 0:
+                            start = before
+                            direction = [o / reach for o in offset]
+                    continue
+
+            # Anything else ends the run and is written as it is
+            if held is not None:
+                self.lines_out += 1
+                yield held
+                held = None
+            self.track(line, position, state)
+            self.lines_out += 1
+            yield line
+
+        if held is not None:
+            self.lines_out += 1
+            yield held
+
+    def track(self, line, position, state):
+        """Follow the motion mode, distance mode, feedrate and position through a line that is kept."""
+        if '(' in line:
+            line = COMMENT_RE.sub('', line)
+        words = WORD_RE.findall(line.upper())
+        forget = False
+        for letter, value in words:
+            if letter == 'G':
+                code = float(value)
+                if code in (0, 1, 2, 3):
+                    state['motion'] = code
+                elif code in (90, 91):
+                    state['absolute'] = code == 90
+                if code not in self.POSITION_G_CODES:
+                    forget = True
+                    if code not in (90, 91):
+                        state['motion'] = None  # Cycles, offsets, homing... wait for the next G1
+            elif letter == 'F':
+                state['feed'] = float(value)
+            elif letter not in self.POSITION_LETTERS:
+                forget = True
+        if forget:
+            for letter in self.AXES:
+                position[letter] = None
+            return
+        for letter, value in words:
+            if letter in position:
+                position[letter] = float(value)
+
+
+class GCodeEngine:
+    # Reads a word's value text (the fixed-point engine reads whole 0.0001 units instead)
+    number = float
+
+    def __init__(self, threshold1=1.5, feedrate1=100, threshold2=0.5, feedrate2=50,
+                 default_feedrate=380, large_diameter=None, small_diameter=None, length=None, tiers=None,
+                 decimate=None, taper_profile=None, taper_offset=None, taper_reverse=None):
+        # tiers (a list of (threshold, feedrate), Tier 1 first) replaces the two-tier arguments
+        if tiers is None:
+            tiers = [(threshold1, feedrate1), (threshold2, feedrate2)]
+        self.table = FeedrateTable(tiers, default_feedrate)
+        self.default_feedrate = default_feedrate
+
+        # Merge collinear G1 moves within this tolerance before tiering (None = off)
+        error = decimate_error(decimate)
+        if error:
+            raise ValueError(error)
+        self.decimate = decimate
+
+        # Taper follows a profile table (a list of (x, diameter)), or a cone when all
+        # three cone values are given (validated by the caller)
+        if taper_profile is not None:
+            if large_diameter is not None or small_diameter is not None or length is not None:
+                raise ValueError(taper_error(large_diameter, small_diameter, length, taper_profile))
+            self.taper = TaperProfile(taper_profile, taper_offset or 0.0, bool(taper_reverse))
+        elif large_diameter is not None and small_diameter is not None and length is not None:
+            self.taper = TaperProfile.cone(large_diameter, small_diameter, length)
+        else:
+            self.taper = None
+        self.apply_taper = self.taper is not None
+
+        # Called with a message for every rewritten line (tier decision, taper Z), or None
+        self.detail = None
+
+        self.current_motion_mode = None
+
+    def parse_words(self, line):
+        """Return (x, y, z, a, f, explicit_g1, texts) for a G1 move, or None.
+
+        Missing axes are None. texts is the (F, X, Z) value texts, for
+        splice_line(), or None if the line has comments or lower-case
+        letters. Tracks the modal motion mode as a side effect.
+        """
+        # Remove comments (only pay for the regex when there is one)
+        raw = line
+        if '(' in line:
+            line = COMMENT_RE.sub('', line)
+            raw = None
+        line = line.strip()
+
+        # Update motion mode if G command is present
+        explicit_g1 = False
+        if line[:1] in ('G', 'g'):
+            # G0 or G00 = rapid positioning (not followed by 1-9)
+            if G0_RE.match(line):
+                self.current_motion_mode = 'G0'
+                return None
+
+            # G1 or G01 = linear interpolation
+            if G1_RE.match(line):
+                self.current_motion_mode = 'G1'
+                explicit_g1 = True
+
+        # Only process lines when in G1 mode
+        if self.current_motion_mode != 'G1':
+            return None
+
+        # Keep the first value of each axis, like a left-to-right search would.
+        # An upper-case line without comments is scanned as it is, so the
+        # value texts match the line a rewrite splices.
+        spliceable = raw is not None and raw.isupper()
+        if spliceable:
+            words = dict(WORD_RE.findall(raw)[::-1])
+        elif line.isascii():
+            words = dict(WORD_RE.findall(line.upper())[::-1])
+        else:
+            words = {}
+            for letter, value, span in tokenize(line):
+                words.setdefault(letter, line[span[0] + 1:span[1]])
+        x = words.get('X')
+        y = words.get('Y')
+        z = words.get('Z')
+        a = words.get('A')
+
+        # Only process if there are actual axis moves
+        if x is None and y is None and z is None and a is None:
+            return None
+
+        f = words.get('F')
+        number = self.number
+        return (x if x is None else number(x), y if y is None else number(y),
+                z if z is None else number(z), a if a is None else number(a),
+                f if f is None else number(f), explicit_g1, (f, x, z) if spliceable else None)
+
+    def parse_gcode_line(self, line):
+        """Parse a GCode line and extract relevant information."""
+        words = self.parse_words(line)
+        if words is None:
+            return None
+        x, y, z, a, f, explicit_g1, texts = words
+        return {'X': x, 'Y': y, 'Z': z, 'A': a, 'F': f, 'original': line, 'explicit_g1': explicit_g1,
+                'texts': texts}
+
+    def classify(self, a_change):
+        """Return (tier, feedrate) for an A-axis change; tier 0 is the default feedrate."""
+        return self.table.classify(a_change)
+
+    def taper_adjustment(self, x_val):
+        """Z adjustment for the taper at an X position."""
+        # For a cone: 0 at X=length (large end), -radius difference at X=0 (small end, deeper cut)
+        return self.taper.adjustment(x_val)
+
+    def record_modification(self, stats, line_number, a_change, tier, feedrate, original_line, texts):
+        """Count a non-default feedrate change and keep the first 10 as examples.
+
+        An example shows the line with only its feedrate changed.
+        """
+        stats['modifications_count'] += 1
+        if stats['modifications_count'] <= 10:
+            stats['modification_details'].append({
+                'line': line_number,
+                'a_change': a_change,
+                'tier': tier,
+                'feedrate': feedrate,
+                'original': original_line,
+                'modified': splice_line(original_line, texts, feedrate)
+            })
+
+    def log_detail(self, line_number, a_change, tier, feedrate, z_value):
+        """Pass one rewritten line's tier decision and taper Z to self.detail."""
+        parts = []
+        if feedrate is not None:
+            parts.append(f"A-change {a_change:.4f}° → {f'Tier {tier}' if tier else 'default'} F{feedrate}")
+        if z_value is not None:
+            parts.append(f"taper Z{z_value:.4f}")
+        self.detail(f"Line {line_number}: {', '.join(parts)}")
+
+    def rewrite_line(self, line_number, original_line, parsed, a_change, modal_z, stats):
+        """Apply the tier feedrate (when a_change is known) and taper to one line."""
+        # For lines with A-axis, always set explicit feedrate based on tiers
+        tier = feedrate = None
+        if a_change is not None:
+            tier, feedrate = self.classify(a_change)
+            stats['tier_counts'][tier] += 1
+            if tier:
+                self.record_modification(stats, line_number, a_change, tier, feedrate, original_line, parsed['texts'])
+
+        # Apply taper if needed (can be combined with feedrate modification)
+        z_value = None
+        has_z = parsed['Z'] is not None
+        if self.apply_taper and parsed['X'] is not None:
+            z_adjustment = self.taper_adjustment(parsed['X'])
+
+            # Line already has Z: add adjustment to it. Otherwise add modal Z + adjustment after X
+            z_value = (parsed['Z'] if has_z else modal_z) + z_adjustment
+            stats['taper_count'] += 1
+
+        if feedrate is None and z_value is None:
+            return original_line + '\n'
+        if self.detail is not None:
+            self.log_detail(line_number, a_change, tier, feedrate, z_value)
+        return splice_line(original_line, parsed['texts'], feedrate, z_value, has_z) + '\n'
+
+    def process_lines(self, lines, out, max_buffered_lines=65536, carry=None):
+        """Stream lines from an iterable to out (anything with write/writelines).
+
+        carry is used when the lines are one segment of a bigger program (see
+        gcode_parallel.py): a dict with the 'previous_a' and 'modal_z' left by
+        earlier segments, the 'next_a' at the start of later ones, and the
+        'first_line_number' of the segment.
+
+        Returns a stats dict with tier counts, taper count and the first 10
+        feedrate modifications.
+        """
+        stats = new_stats(len(self.table))
+        carry = carry or {}
+        decimator = None
+        if self.decimate:
+            decimator = Decimator(self.decimate)
+            lines = decimator.filter(lines)
+
+        self.current_motion_mode = None
+        previous_a_for_comparison = carry.get('previous_a')
+        current_modal_z = carry.get('modal_z', 0.0)  # Track the current Z depth from G1Z commands
+        window = LookaheadWindow(max_buffered_lines)
+        write = out.write
+        first_line_number = carry.get('first_line_number', 1)
+        line_number = first_line_number - 1
+
+        for line in lines:
+            line_number += 1
+            original_line = line.rstrip('\n')
+            parsed = self.parse_gcode_line(original_line)
+
+            if parsed is None:
+                # Passed through as read (only a last line without newline needs one)
+                text = line if line[-1:] == '\n' else original_line + '\n'
+                if window.pending is not None:
+                    window.append(text)
+                else:
+                    write(text)
+                continue
+
+            # Update modal Z if this line sets a new Z depth
+            if parsed['Z'] is not None and parsed['X'] is None and parsed['Y'] is None:
+                # This is a Z-only move (like G1Z-0.0071), update modal Z
+                current_modal_z = parsed['Z']
+
+            current_a = parsed['A']
+            if current_a is None:
+                text = self.rewrite_line(line_number, original_line, parsed, None, current_modal_z, stats)
+                if window.pending is not None:
+                    window.append(text)
+                else:
+                    write(text)
+                continue
+
+            # This A value is the "next A" an earlier explicit G1 line was waiting for
+            if window.pending is not None:
+                p_number, p_line, p_parsed, p_a, p_modal_z = window.pending
+                window.flush(self.rewrite_line(p_number, p_line, p_parsed, abs(p_a - current_a), p_modal_z, stats), out)
+
+            if has_explicit_g1(original_line, parsed['explicit_g1']):
+                # New G1 command - look forward to next A value
+                window.start((line_number, original_line, parsed, current_a, current_modal_z))
+            else:
+                # Modal G1 command - look backward to previous A value
+                a_change = None
+                if previous_a_for_comparison is not None:
+                    a_change = abs(current_a - previous_a_for_comparison)
+                write(self.rewrite_line(line_number, original_line, parsed, a_change, current_modal_z, stats))
+
+            # Update previous A value for next iteration
+            previous_a_for_comparison = current_a
+
+        # An explicit G1 line with no later A value keeps its original feedrate
+        if window.pending is not None:
+            p_number, p_line, p_parsed, p_a, p_modal_z = window.pending
+            next_a = carry.get('next_a')
+            a_change = None if next_a is None else abs(p_a - next_a)
+            window.flush(self.rewrite_line(p_number, p_line, p_parsed, a_change, p_modal_z, stats), out)
+
+        stats['total_lines'] = line_number - first_line_number + 1
+        if decimator:
+            stats['decimation'] = decimator.summary()
+        return stats
+
+    def process_file(self, input_file, output_file):
+        """Stream input_file through the engine into output_file (either may be '-' or compressed)."""
+        with open_input(input_file) as f_in, open_output(output_file) as f_out:
+            return self.process_lines(f_in, f_out)
+
+
+def collect_a_changes(lines):
+    """A-axis change of every A move that gets a tier feedrate, in file order.
+
+    Uses the same forward/backward rule as process_lines, so tier counts
+    worked out from these changes match a real run.
+    """
+    parser = GCodeEngine()
+    a_values = array('d')
+    explicit = bytearray()
+    for line in lines:
+        original_line = line.rstrip('\n')
+        words = parser.parse_words(original_line)
+        if words is not None and words[3] is not None:
+            a_values.append(words[3])
+            explicit.append(has_explicit_g1(original_line, words[5]))
+
+    changes = array('d')
+    last = len(a_values) - 1
+    for k, current_a in enumerate(a_values):
+        if explicit[k]:
+            # New G1 command - compare with the next A value
+            if k < last:
+                changes.append(abs(current_a - a_values[k + 1]))
+        elif k > 0:
+            # Modal G1 command - compare with the previous A value
+            changes.append(abs(current_a - a_values[k - 1]))
+    return changes
+
+
+def tier_counts_sorted(sorted_changes, table):
+    """Tier counts for sorted A changes under a FeedrateTable, by binary search."""
+    # within[k] = changes within Tier k's threshold (tier k or tighter)
+    within = [len(sorted_changes)] + [bisect_right(sorted_changes, threshold) for threshold, feedrate in table.tiers]
+    within.append(0)
+    return {tier: within[tier] - within[tier + 1] for tier in range(len(table) + 1)}
@@ -0,0 +1,187 @@
+"""
+Fixed-point numeric core: coordinates as whole numbers of 0.0001 units.
+
+CAM posts write every coordinate with 4 decimals. The float engines read
+each one with float(), work out A changes and taper Z in binary floating
+point, and format Z with '.4f' - so an A change that is exactly a threshold
+can land either side of it, and a Z can come out one digit off (or as
+-0.0000). Here words are read straight into integers (X-12.3456 is -123456),
+A changes and tier thresholds are compared exactly, the taper is worked out
+as an exact fraction rounded once to the nearest 0.0001, and numbers are
+written back with integer division.
+
+Feedrates are written in their shortest form: F50, not F50.0.
+
+Values with more than 4 decimals are rounded to 4 as they are read.
+"""
+
+import math
+from bisect import bisect_left, bisect_right
+
+from gcode_engine import GCodeEngine, splice_line
+
+
+DECIMALS = 4
+SCALE = 10 ** DECIMALS
+
+# Word texts, X positions and Z values repeat from pass to pass, so what
+# they convert to is kept - up to this many of each before starting over
+MEMO_SIZE = 1 << 16
+
+# Ten to the power of the missing decimals, for values with fewer than 4
+PADDING = [10 ** (DECIMALS - decimals) for decimals in range(DECIMALS + 1)]
+
+
+def round_div(numerator, denominator):
+    """numerator / denominator (denominator > 0) rounded to the nearest whole number, halves away from zero."""
+    quotient, remainder = divmod(numerator, denominator)
+    if numerator < 0:
+        return quotient + (2 * remainder > denominator)
+    return quotient + (2 * remainder >= denominator)
+
+
+def to_units(text):
+    """A word's value text (like '-179.4729', '12' or '0.5') in 0.0001 units."""
+    point = text.find('.')
+    if point < 0:
+        return int(text) * SCALE
+    decimals = len(text) - point - 1
+    if decimals <= DECIMALS:
+        return int(text[:point] + text[point + 1:]) * PADDING[decimals]
+    return round_div(int(text[:point] + text[point + 1:]), 10 ** (decimals - DECIMALS))
+
+
+def float_units(value):
+    """A setting (float) in 0.0001 units, rounded to the nearest."""
+    return round_div(round(value * SCALE * 1000), 1000)
+
+
+def format_units(units):
+    """0.0001 units as text with 4 decimals, like '-0.0025' (never '-0.0000')."""
+    whole, fraction = divmod(abs(units), SCALE)
+    return f"{'-' if units < 0 else ''}{whole}.{fraction:04d}"
+
+
+def format_feed(units):
+    """0.0001 units as the shortest text: 50 for 50.0000, 37.5 for 37.5000."""
+    text = format_units(units).rstrip('0')
+    return text[:-1] if text.endswith('.') else text
+
+
+class Memo(dict):
+    """function(key), kept. Looking up memo[key] (or memo.__getitem__) is a plain dict hit once seen."""
+
+    def __init__(self, function, size=MEMO_SIZE):
+        super().__init__()
+        self.function = function
+        self.size = size
+
+    def __missing__(self, key):
+        if len(self) >= self.size:
+            self.clear()
+        value = self[key] = self.function(key)
+        return value
+
+
+class FixedTaper:
+    """A TaperProfile in 0.0001 units: each X's Z adjustment, exact to the nearest unit.
+
+    Diameters are kept in units, not radii, so a diameter with an odd last
+    digit still gives an exact half-unit radius until the final rounding.
+    """
+
+    def __init__(self, profile):
+        self.offset = float_units(profile.offset)
+        self.reverse = profile.reverse
+        self.starts = [float_units(x) for x, diameter in profile.points]
+        diameters = [float_units(diameter) for x, diameter in profile.points]
+        reference = max(diameters)
+        offsets = [diameter - reference for diameter in diameters]  # Twice the radius offset
+        self.widths = [self.starts[k + 1] - self.starts[k] for k in range(len(offsets) - 1)]
+        self.drops = [offsets[k] - offsets[k + 1] for k in range(len(offsets) - 1)]
+        self.ends = offsets[1:]
+
+    def adjustment(self, x):
+        """Z adjustment in units at machine X (units)."""
+        position = self.offset - x if self.reverse else x - self.offset
+        k = min(max(bisect_right(self.starts, position) - 1, 0), len(self.widths) - 1)
+        width = self.widths[k]
+        # drop * (1 - (position - start) / width) + end, over 2 for radius
+        return round_div(self.drops[k] * (width - (position - self.starts[k])) + self.ends[k] * width, 2 * width)
+
+
+class FixedPointEngine(GCodeEngine):
+    """The streaming engine with X/Y/Z/A held as integer 0.0001 units (see the module docstring).
+
+    Takes GCodeEngine's arguments. Its output matches the float engines
+    except where they lose a last digit: an A change at a threshold, a taper
+    Z that rounds on exactly half a unit, a Z of -0.0000 - and F words,
+    written without a trailing '.0'.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        table = self.table
+        # A change <= threshold, in whole units, is A change <= the threshold rounded down
+        self.limits = [math.floor(round(limit * SCALE, 6)) for limit in table.limits]
+        self.feed_texts = [format_feed(float_units(feedrate)) for feedrate in table.feedrates]
+        # Plain dict lookups once a text, X or Z has been seen
+        self.number = Memo(to_units).__getitem__
+        self.z_text = Memo(format_units).__getitem__
+        if self.taper is not None:
+            self.taper_adjustment = Memo(FixedTaper(self.taper).adjustment).__getitem__
+
+    def classify(self, a_change):
+        """Return (tier, feedrate text) for an A-axis change in units."""
+        tier = len(self.limits) - bisect_left(self.limits, a_change)
+        return tier, self.feed_texts[tier]
+
+    def record_modification(self, stats, line_number, a_change, tier, feedrate, original_line, texts):
+        stats['modifications_count'] += 1
+        if stats['modifications_count'] <= 10:
+            stats['modification_details'].append({
+                'line': line_number,
+                'a_change': a_change / SCALE,
+                'tier': tier,
+                'feedrate': self.table.feedrates[tier],
+                'original': original_line,
+                'modified': splice_line(original_line, texts, feedrate)
+            })
+
+    def log_detail(self, line_number, a_change, tier, feedrate, z_value):
+        parts = []
+        if feedrate is not None:
+            parts.append(f"A-change {format_units(a_change)}° → {f'Tier {tier}' if tier else 'default'} F{feedrate}")
+        if z_value is not None:
+            parts.append(f"taper Z{z_value}")
+        self.detail(f"Line {line_number}: {', '.join(parts)}")
+
+    def rewrite_line(self, line_number, original_line, parsed, a_change, modal_z, stats):
+        """GCodeEngine.rewrite_line() in units; the new F and Z go in as text."""
+        tier = feedrate = None
+        if a_change is not None:
+            tier, feedrate = self.classify(a_change)
+            stats['tier_counts'][tier] += 1
+            if tier:
+                self.record_modification(stats, line_number, a_change, tier, feedrate, original_line, parsed['texts'])
+
+        z_value = None
+        has_z = parsed['Z'] is not None
+        if self.apply_taper and parsed['X'] is not None:
+            z_value = self.z_text((parsed['Z'] if has_z else modal_z) + self.taper_adjustment(parsed['X']))
+            stats['taper_count'] += 1
+
+        if feedrate is None and z_value is None:
+            return original_line + '\n'
+        if self.detail is not None:
+            self.log_detail(line_number, a_change, tier, feedrate, z_value)
+        return splice_line(original_line, parsed['texts'], feedrate, z_value, has_z) + '\n'
+
+    def process_lines(self, lines, out, max_buffered_lines=65536, carry=None):
+        """GCodeEngine.process_lines(); a --parallel carry's A and Z (floats) are turned into units."""
+        carry = dict(carry or {})
+        for name in ('previous_a', 'modal_z', 'next_a'):
+            if carry.get(name) is not None:
+                carry[name] = float_units(carry[name])
+        carry.setdefault('modal_z', 0)
+        return super().process_lines(lines, out, max_buffered_lines, carry)
@@ -0,0 +1,61 @@
+"""
+Log buffer for the GUI's processing log.
+
+Inserting into a Tk Text widget, scrolling it and redrawing for every message
+is what made per-line logging unusably slow (see SPEED_OPTIMIZATION.md).
+Messages - from the UI thread or the worker - go into a bounded ring buffer
+instead, and the UI moves them into the widget in batches on a timer. When
+messages arrive faster than that, only the newest max_lines are kept for the
+widget, but every message still reaches the detail log file if one is open.
+"""
+
+import threading
+from collections import deque
+
+
+LOG_BUFFER_LINES = 2000  # Newest lines kept between flushes, and in the widget
+
+
+class LogBuffer:
+    """Thread-safe ring buffer of (message, tag) lines, optionally teed to a file."""
+
+    def __init__(self, max_lines=LOG_BUFFER_LINES):
+        self.lines = deque(maxlen=max_lines)
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.file = None
+        self.path = None
+
+    def append(self, message, tag=None):
+        with self.lock:
+            if len(self.lines) == self.lines.maxlen:
+                self.dropped += 1
+            self.lines.append((message, tag))
+            if self.file is not None:
+                self.file.write(message + '\n')
+
+    def drain(self):
+        """Return (lines, dropped): the buffered lines and how many older ones were pushed out."""
+        with self.lock:
+            lines = list(self.lines)
+            self.lines.clear()
+            dropped, self.dropped = self.dropped, 0
+        return lines, dropped
+
+    def clear(self):
+        self.drain()
+
+    def open_file(self, path):
+        """Also write every message to path (UTF-8), until close_file()."""
+        detail_file = open(path, 'w', encoding='utf-8')
+        with self.lock:
+            self.file, self.path = detail_file, path
+
+    def close_file(self):
+        """Stop writing to the detail file; returns its path, or None if none was open."""
+        with self.lock:
+            detail_file, path = self.file, self.path
+            self.file = self.path = None
+        if detail_file is not None:
+            detail_file.close()
+        return path
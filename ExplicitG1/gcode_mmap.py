@@ -0,0 +1,301 @@
+"""
+Memory-mapped, bytes-level engine for multi-gigabyte programs.
+
+The input file is mapped instead of read, and lines are scanned as byte
+slices of the mapping. G-code words are ASCII, so lines are parsed as bytes
+(float() reads the numbers straight from them) and only the lines that change
+are decoded, rewritten and encoded again. Runs of untouched lines - comments,
+tool changes, rapids - are written to the output straight from the mapping.
+
+Output is byte-identical to GCodeEngine reading the file in text mode. Files
+where the bytes can't be trusted to give that - an encoding that isn't
+ASCII-compatible, old Mac CR-only line endings - go through the text path,
+and so do stdin and compressed input, which can't be mapped.
+"""
+
+import locale
+import mmap
+import os
+import re
+
+from gcode_engine import (G0_RE, G1_RE, WORD_RE, GCodeEngine, LookaheadWindow, has_explicit_g1, is_plain_file,
+                          new_stats, open_output)
+
+
+# The engine's patterns, for bytes (\d only matches ASCII digits there)
+WORD_RE_B = re.compile(WORD_RE.pattern.encode())
+G0_RE_B = re.compile(G0_RE.pattern.encode(), re.IGNORECASE)
+G1_RE_B = re.compile(G1_RE.pattern.encode(), re.IGNORECASE)
+
+# Lines the text parser handles: comments, non-ASCII text, and the ASCII
+# separators \x1c-\x1f that str.strip() removes but bytes.strip() doesn't.
+# Most files have none of the latter (see scan_mapped).
+TEXT_ONLY_RE = re.compile(rb'[(\x1c-\x1f\x80-\xff]')
+SEPARATORS = (b'\x1c', b'\x1d', b'\x1e', b'\x1f')
+
+# "(" as a byte value - `40 in line` is much quicker than `b'(' in line`
+OPEN_PAREN = ord('(')
+
+# A CR that isn't part of CRLF ends a line in text mode but not here
+BARE_CR_RE = re.compile(rb'\r(?!\n)')
+LONE_LF_RE = re.compile(rb'(?<!\r)\n')
+
+# Outside G1 mode only a line starting with G, once its comments are gone, can
+# change anything; lines up to the next such one are copied in one go, up to
+# SKIP_BYTES at a time. The match starts on the newline before the line.
+MODE_LINE_RE = re.compile(rb'\n[ \t\x0b\x0c]*(?:\([^)\n]*\)[ \t\x0b\x0c]*)*[Gg]')
+MODE_LINE_STARTS = frozenset(b'Gg')  # Byte values - no search needed when the next line starts with one
+SKIP_BYTES = 1 << 20
+
+# Mapped pages already processed are let go every so often, so resident
+# memory stays flat however big the file is
+RELEASE_BYTES = 4 << 20
+
+
+def ascii_compatible(encoding):
+    """True if ASCII bytes decode to the same characters in encoding."""
+    try:
+        return bytes(range(128)).decode(encoding) == ''.join(map(chr, range(128)))
+    except (LookupError, UnicodeError):
+        return False
+
+
+def release_pages(data, start, end):
+    """Let the mapped pages in [start, end) go (start page-aligned); they're read back if touched again."""
+    if end > start and hasattr(mmap, 'MADV_DONTNEED'):
+        data.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+
+def scan_mapped(data, lone_lf=False, chunk_bytes=4 << 20):
+    """What process_mapped() needs to know about a mapped file up front.
+
+    Returns a dict of flags: 'bare_cr' (a CR not followed by LF), 'cr' (any
+    CR), 'unusual' (non-ASCII bytes or \\x1c-\\x1f) and, if asked for,
+    'lone_lf' (an LF without a CR before it). The file is checked a chunk at
+    a time with find() and isascii() (memchr/SIMD loops, much quicker than a
+    regex over every byte) and each chunk's pages are let go afterwards.
+    """
+    layout = {'bare_cr': False, 'cr': False, 'unusual': False, 'lone_lf': False}
+    size = len(data)
+    for start in range(0, size, chunk_bytes):
+        end = min(start + chunk_bytes, size)
+        # An mmap's find() starts at its file position unless given a start
+        if data.find(b'\r', start, end) >= 0:
+            layout['cr'] = True
+            # One byte past the chunk, so a CRLF split across two chunks isn't bare
+            match = BARE_CR_RE.search(data, start, min(end + 1, size))
+            if match is not None and match.start() < end:
+                layout['bare_cr'] = True
+        if not layout['unusual']:
+            layout['unusual'] = (any(data.find(separator, start, end) >= 0 for separator in SEPARATORS)
+                                 or not data[start:end].isascii())
+        if lone_lf and not layout['lone_lf']:
+            layout['lone_lf'] = LONE_LF_RE.search(data, start, end) is not None
+        release_pages(data, start, end)
+    return layout
+
+
+class MappedEngine(GCodeEngine):
+    """GCodeEngine that processes files through a memory map, as bytes.
+
+    process_lines() (used for --parallel segments and the GUI) is the normal
+    text path; process_file() is the mapped one.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # What open(path, 'r') and open(path, 'w') would use
+        self.encoding = locale.getpreferredencoding(False)
+        self.linesep = os.linesep
+        self.newline = os.linesep.encode()
+        self.unusual_bytes = True  # Set per file by process_mapped()
+
+    def parse_bytes(self, line):
+        """parse_words() for a line given as bytes.
+
+        The texts for splice_line() are bytes; only their lengths are used.
+        """
+        if OPEN_PAREN in line or (self.unusual_bytes and TEXT_ONLY_RE.search(line) is not None):
+            # super() so an instrumented run doesn't time the line twice
+            return super().parse_words(line.decode(self.encoding))
+        stripped = line.strip()
+
+        # Update motion mode if G command is present
+        explicit_g1 = False
+        if stripped[:1] in (b'G', b'g'):
+            if G0_RE_B.match(stripped):
+                self.current_motion_mode = 'G0'
+                return None
+            if G1_RE_B.match(stripped):
+                self.current_motion_mode = 'G1'
+                explicit_g1 = True
+
+        if self.current_motion_mode != 'G1':
+            return None
+
+        spliceable = line.isupper()
+        words = dict(WORD_RE_B.findall(line if spliceable else stripped.upper())[::-1])
+        x = words.get(b'X')
+        y = words.get(b'Y')
+        z = words.get(b'Z')
+        a = words.get(b'A')
+        if x is None and y is None and z is None and a is None:
+            return None
+
+        f = words.get(b'F')
+        texts = (f, x, z) if spliceable else None
+        return (x if x is None else float(x), y if y is None else float(y),
+                z if z is None else float(z), a if a is None else float(a),
+                f if f is None else float(f), explicit_g1, texts)
+
+    def parse_gcode_bytes(self, line):
+        """parse_gcode_line() for a line given as bytes ('original' stays bytes)."""
+        words = self.parse_bytes(line)
+        if words is None:
+            return None
+        x, y, z, a, f, explicit_g1, texts = words
+        return {'X': x, 'Y': y, 'Z': z, 'A': a, 'F': f, 'original': line, 'explicit_g1': explicit_g1,
+                'texts': texts}
+
+    def rewrite_bytes(self, line_number, line, parsed, a_change, modal_z, stats):
+        """rewrite_line() for a line given as bytes, or None if the line stays as it is."""
+        if a_change is None and not (self.apply_taper and parsed['X'] is not None):
+            return None
+        text = self.rewrite_line(line_number, line.decode(self.encoding), parsed, a_change, modal_z, stats)
+        if self.linesep != '\n':
+            text = text[:-1] + self.linesep
+        return text.encode(self.encoding)
+
+    def process_mapped(self, data, out, max_buffered_lines=65536, layout=None):
+        """Process a whole program held in an mmap into a binary out.
+
+        Same rules and stats as process_lines(). layout is scan_mapped()'s
+        result, if already known; the file must not have CR-only line endings
+        (see process_file).
+        """
+        stats = new_stats(len(self.table))
+
+        self.current_motion_mode = None
+        previous_a_for_comparison = None
+        current_modal_z = 0.0
+        window = LookaheadWindow(max_buffered_lines, binary=True)
+        write = out.write
+        view = memoryview(data)
+        newline = self.newline
+        parse = self.parse_gcode_bytes
+        size = len(data)
+
+        if layout is None:
+            layout = scan_mapped(data, newline != b'\n')
+        self.unusual_bytes = layout['unusual']
+        # Untouched lines can be copied as they are only if every line already
+        # ends the way text mode would write it
+        has_cr = layout['cr']
+        raw_endings = not has_cr if newline == b'\n' else not layout['lone_lf']
+        skip_lines = raw_endings and not self.unusual_bytes
+        released = 0
+
+        line_number = 0
+        pos = 0
+        run_start = 0  # Untouched lines from here on are written in one go
+        data.seek(0)
+        for raw in iter(data.readline, b''):
+            line_number += 1
+            start = pos
+            pos += len(raw)
+            if raw[-1] == 10:  # '\n'
+                line = raw[:-2] if has_cr and raw[-2:-1] == b'\r' else raw[:-1]
+                as_is = raw_endings
+            else:
+                line = raw  # A last line without newline gets one
+                as_is = False
+            if start - released >= RELEASE_BYTES:
+                # Only pages before the unwritten run, which is still to be copied
+                done = min(start, run_start) // mmap.PAGESIZE * mmap.PAGESIZE
+                release_pages(data, released, done)
+                released = max(done, released)
+            parsed = parse(line)
+
+            text = None
+            if parsed is not None:
+                # Update modal Z if this line sets a new Z depth
+                if parsed['Z'] is not None and parsed['X'] is None and parsed['Y'] is None:
+                    current_modal_z = parsed['Z']
+
+                current_a = parsed['A']
+                if current_a is None:
+                    text = self.rewrite_bytes(line_number, line, parsed, None, current_modal_z, stats)
+                else:
+                    # This A value is the "next A" an earlier explicit G1 line was waiting for
+                    if window.pending is not None:
+                        p_number, p_line, p_parsed, p_a, p_modal_z, p_raw = window.pending
+                        p_text = self.rewrite_bytes(p_number, p_line, p_parsed, abs(p_a - current_a), p_modal_z, stats)
+                        window.flush(p_raw if p_text is None else p_text, out)
+                        run_start = start
+
+                    explicit_g1 = parsed['explicit_g1']
+                    if OPEN_PAREN in line:
+                        explicit_g1 = has_explicit_g1(line.decode(self.encoding), explicit_g1)
+                    previous_a = previous_a_for_comparison
+                    previous_a_for_comparison = current_a
+                    if explicit_g1:
+                        # New G1 command - look forward to next A value
+                        if run_start < start:
+                            write(view[run_start:start])
+                        raw = raw if as_is else line + newline
+                        window.start((line_number, line, parsed, current_a, current_modal_z, raw))
+                        run_start = pos
+                        continue
+
+                    # Modal G1 command - look backward to previous A value
+                    a_change = None if previous_a is None else abs(current_a - previous_a)
+                    text = self.rewrite_bytes(line_number, line, parsed, a_change, current_modal_z, stats)
+
+            if text is None:
+                # Untouched: part of the current run, unless its line ending has to change
+                if window.pending is not None:
+                    window.append(raw if as_is else line + newline)
+                    continue
+                if as_is:
+                    if skip_lines and self.current_motion_mode != 'G1' and pos < size and data[pos] not in MODE_LINE_STARTS:
+                        match = MODE_LINE_RE.search(data, pos - 1, pos + SKIP_BYTES)
+                        skip_to = match.start() + 1 if match else data.rfind(b'\n', pos, pos + SKIP_BYTES) + 1
+                        if skip_to > pos:
+                            line_number += data[pos:skip_to].count(b'\n')
+                            pos = skip_to
+                            data.seek(pos)
+                    continue
+                text = line + newline
+
+            if window.pending is not None:
+                window.append(text)
+            else:
+                if run_start < start:
+                    write(view[run_start:start])
+                write(text)
+                run_start = pos
+
+        # An explicit G1 line with no later A value keeps its original feedrate
+        if window.pending is not None:
+            p_number, p_line, p_parsed, p_a, p_modal_z, p_raw = window.pending
+            p_text = self.rewrite_bytes(p_number, p_line, p_parsed, None, p_modal_z, stats)
+            window.flush(p_raw if p_text is None else p_text, out)
+            run_start = size
+        write(view[run_start:size])
+        view.release()
+
+        stats['total_lines'] = line_number
+        return stats
+
+    def process_file(self, input_file, output_file):
+        """Map input_file and process it as bytes, or stream it as text when bytes can't be exact."""
+        if is_plain_file(input_file) and not self.decimate:
+            with open(input_file, 'rb') as f_in:
+                if os.fstat(f_in.fileno()).st_size and ascii_compatible(self.encoding):
+                    with mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                        layout = scan_mapped(data, self.newline != b'\n')
+                        if not layout['bare_cr']:
+                            with open_output(output_file, binary=True) as f_out:
+                                return self.process_mapped(data, f_out, layout=layout)
+        # Stdin, compressed and empty files, other encodings, CR-only line endings and decimation
+        return super().process_file(input_file, output_file)
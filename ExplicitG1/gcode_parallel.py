@@ -0,0 +1,194 @@
+"""
+Intra-file parallelism: split one big program at G0 rapids and process the
+pieces on several cores.
+
+A G0 line resets the motion mode, so a segment that starts on one parses the
+same way on its own as it does in the full file. The only state that crosses
+a boundary is:
+- the previous A value (for the first modal A move of a segment)
+- the modal Z from Z-only moves (for taper on moves without Z)
+- the next A value (for an explicit G1 line near the end of a segment)
+
+A quick parallel scan collects those per segment, the carried state is worked
+out in order, then every segment is processed in parallel with its carry and
+the parts are stitched back together. Output is byte-identical to a serial run.
+"""
+
+import io
+import locale
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from gcode_columnar import create_engine
+from gcode_engine import COMMENT_RE, G0_RE, GCodeEngine, is_plain_file, new_stats, open_output
+
+
+def is_g0_line(line):
+    """True if this line switches the parser to G0 (rapid) mode."""
+    if '(' in line:
+        line = COMMENT_RE.sub('', line)
+    return bool(G0_RE.match(line.strip()))
+
+
+class SegmentReader(io.RawIOBase):
+    """Raw reader over bytes [start, end) of a file."""
+
+    def __init__(self, path, start, end):
+        self.file = open(path, 'rb')
+        self.file.seek(start)
+        self.remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.remaining)
+        if size <= 0:
+            return 0
+        data = self.file.read(size)
+        buffer[:len(data)] = data
+        self.remaining -= len(data)
+        return len(data)
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+def open_segment(path, start, end):
+    """Open a byte range as text, decoded exactly like open(path, 'r')."""
+    return io.TextIOWrapper(io.BufferedReader(SegmentReader(path, start, end)))
+
+
+def find_segments(path, count, min_segment_bytes=1 << 20):
+    """Split a file into up to count (start, end) byte ranges, each starting on a G0 line.
+
+    Small files (under min_segment_bytes per segment) get fewer segments.
+    """
+    size = os.path.getsize(path)
+    count = max(1, min(count, size // max(min_segment_bytes, 1)))
+    encoding = locale.getpreferredencoding(False)
+    bounds = [0]
+    with open(path, 'rb') as f:
+        for k in range(1, count):
+            f.seek(max(size * k // count, bounds[-1]))
+            f.readline()  # Move to the start of the next line
+
+            # Walk forward to the next G0 line
+            boundary = None
+            while True:
+                position = f.tell()
+                raw = f.readline()
+                if not raw:
+                    break
+                if b'\r' in raw.rstrip(b'\r\n'):
+                    continue  # Old-Mac line endings inside - not a clean line start
+                if is_g0_line(raw.decode(encoding, errors='replace')):
+                    boundary = position
+                    break
+
+            if boundary is None:
+                break
+            if boundary > bounds[-1]:
+                bounds.append(boundary)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def scan_segment(path, start, end):
+    """Collect the state a segment hands on: line count, first/last A and last Z-only Z."""
+    parser = GCodeEngine()
+    scan = {'lines': 0, 'first_a': None, 'last_a': None, 'last_z': None}
+    with open_segment(path, start, end) as f:
+        for line in f:
+            scan['lines'] += 1
+            words = parser.parse_words(line.rstrip('\n'))
+            if words is None:
+                continue
+            x, y, z, a, f_value, explicit_g1, texts = words
+            if z is not None and x is None and y is None:
+                scan['last_z'] = z
+            if a is not None:
+                if scan['first_a'] is None:
+                    scan['first_a'] = a
+                scan['last_a'] = a
+    return scan
+
+
+def carry_states(scans):
+    """Work out each segment's carried-in state from the scans, in order."""
+    carries = []
+    previous_a = None
+    modal_z = 0.0
+    first_line_number = 1
+    for scan in scans:
+        carries.append({'previous_a': previous_a, 'modal_z': modal_z, 'first_line_number': first_line_number})
+        if scan['last_a'] is not None:
+            previous_a = scan['last_a']
+        if scan['last_z'] is not None:
+            modal_z = scan['last_z']
+        first_line_number += scan['lines']
+
+    next_a = None
+    for carry, scan in zip(reversed(carries), reversed(scans)):
+        carry['next_a'] = next_a
+        if scan['first_a'] is not None:
+            next_a = scan['first_a']
+    return carries
+
+
+def process_segment(path, start, end, part_file, settings, engine, carry):
+    """Process one segment into part_file (runs in a worker process)."""
+    processor = create_engine(engine, **settings)
+    with open_segment(path, start, end) as f_in, open_output(part_file) as f_out:
+        return processor.process_lines(f_in, f_out, carry=carry)
+
+
+def merge_stats(segment_stats):
+    """Add up per-segment stats; the first 10 modifications come from the earliest segments."""
+    stats = new_stats(len(segment_stats[0]['tier_counts']) - 1)
+    for part in segment_stats:
+        stats['total_lines'] += part['total_lines']
+        stats['modifications_count'] += part['modifications_count']
+        stats['taper_count'] += part['taper_count']
+        for tier, count in part['tier_counts'].items():
+            stats['tier_counts'][tier] += count
+        stats['modification_details'].extend(part['modification_details'])
+    del stats['modification_details'][10:]
+    return stats
+
+
+def process_file_parallel(input_file, output_file, settings, workers, engine='stream',
+                          segments_per_worker=2, min_segment_bytes=1 << 20):
+    """Process input_file into output_file using up to workers processes.
+
+    settings are GCodeEngine keyword arguments. Falls back to a normal
+    serial run when the file is too small to split, or is stdin or
+    compressed (neither can be split by byte offset), or when decimating
+    (a merged run may cross a segment boundary).
+    """
+    segments = [None]
+    if is_plain_file(input_file) and not settings.get('decimate'):
+        segments = find_segments(input_file, workers * segments_per_worker, min_segment_bytes)
+    if len(segments) == 1:
+        return create_engine(engine, **settings).process_file(input_file, output_file)
+
+    output_dir = os.path.dirname(os.path.abspath(output_file))
+    with ProcessPoolExecutor(max_workers=workers) as pool, tempfile.TemporaryDirectory(dir=output_dir) as tmp:
+        scans = list(pool.map(scan_segment, *zip(*((input_file, start, end) for start, end in segments))))
+        carries = carry_states(scans)
+
+        parts = [os.path.join(tmp, f"part{k:05d}") for k in range(len(segments))]
+        futures = [pool.submit(process_segment, input_file, start, end, part, settings, engine, carry)
+                   for (start, end), part, carry in zip(segments, parts, carries)]
+        segment_stats = [future.result() for future in futures]
+
+        # Stitch the parts back together in order
+        with open_output(output_file, binary=True) as out:
+            for part in parts:
+                with open(part, 'rb') as f:
+                    shutil.copyfileobj(f, out, 1 << 20)
+
+    return merge_stats(segment_stats)
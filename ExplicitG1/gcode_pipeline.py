@@ -0,0 +1,155 @@
+"""
+Threaded read -> process -> write pipeline.
+
+A plain run reads a block, processes it, writes it, and only then reads the
+next one, so the disk waits on the CPU and the CPU waits on the disk. Here a
+reader thread reads blocks of lines ahead into a bounded queue, the engine
+takes lines from it, and the text it writes is handed in blocks to a writer
+thread through another bounded queue. File reads and writes release the GIL
+while they wait on the disk, so on a slow or network drive the wall time
+comes down towards the larger of I/O and processing instead of their sum.
+
+Memory is bounded by the queue depth: at most depth blocks of
+PIPELINE_BLOCK_CHARS waiting on each side, plus the ones being worked on.
+"""
+
+import io
+import queue
+import threading
+from itertools import chain
+
+
+PIPELINE_DEPTH = 8  # Blocks waiting in each queue
+PIPELINE_BLOCK_CHARS = 1 << 20  # Text per block, roughly
+
+
+class BlockReader:
+    """Reads a text file ahead, in blocks of whole lines, on a background thread."""
+
+    def __init__(self, f, depth=PIPELINE_DEPTH, block_chars=PIPELINE_BLOCK_CHARS):
+        self.f = f
+        self.block_chars = block_chars
+        self.queue = queue.Queue(maxsize=depth)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='gcode-reader', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        # One big read() per block rather than readlines(), which goes through the file 8 KB
+        # at a time, and every one of those reads has to win the GIL back from the processing
+        # thread. The text is already newline-translated, so it splits on '\n' like readlines().
+        tail = ''
+        try:
+            while not self.stopped.is_set():
+                text = self.f.read(self.block_chars)
+                if not text:
+                    if tail:
+                        self.queue.put([tail])
+                    self.queue.put([])
+                    return
+                block = io.StringIO(tail + text).readlines()
+                # A line cut off at the end of the read waits for the rest of it
+                tail = '' if block[-1].endswith('\n') else block.pop()
+                if block:
+                    self.queue.put(block)
+        except BaseException as e:
+            self.queue.put(e)
+
+    def next_block(self):
+        block = self.queue.get()
+        if isinstance(block, BaseException):
+            raise block
+        return block
+
+    def lines(self):
+        """The file's lines, in order; raises whatever the reader hit."""
+        return chain.from_iterable(iter(self.next_block, []))
+
+    def close(self):
+        """Stop reading ahead (the file may not have been read to the end)."""
+        self.stopped.set()
+        while self.thread.is_alive():
+            # Make room for a put the reader may be blocked on
+            try:
+                self.queue.get(timeout=0.05)
+            except queue.Empty:
+                pass
+        self.thread.join()
+
+
+class BlockWriter:
+    """write()/writelines() that hands blocks of text to a background thread writing f."""
+
+    def __init__(self, f, depth=PIPELINE_DEPTH, block_chars=PIPELINE_BLOCK_CHARS):
+        self.f = f
+        self.block_chars = block_chars
+        self.parts = []
+        self.size = 0
+        self.error = None
+        self.queue = queue.Queue(maxsize=depth)
+        self.thread = threading.Thread(target=self.run, name='gcode-writer', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        chunks = iter(self.queue.get, None)
+        try:
+            for chunk in chunks:
+                self.f.write(chunk)
+        except BaseException as e:
+            self.error = e
+            # Keep taking blocks so the engine isn't left blocked on a full queue
+            for chunk in chunks:
+                pass
+
+    def write(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.block_chars:
+            self.send()
+
+    def writelines(self, lines):
+        for text in lines:
+            self.write(text)
+
+    def send(self):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(''.join(self.parts))
+        self.parts = []
+        self.size = 0
+
+    def close(self, flush=True):
+        """Write out the rest (unless flush is False) and wait for the writer; raises what it hit."""
+        if flush and self.parts:
+            self.send()
+        self.parts = []
+        self.queue.put(None)
+        self.thread.join()
+        if flush and self.error is not None:
+            raise self.error
+
+
+class Pipeline:
+    """Context manager running an engine's input and output through BlockReader/BlockWriter.
+
+    with Pipeline(f_in, f_out) as pipe:
+        stats = engine.process_lines(pipe.lines, pipe.out)
+
+    On a clean exit everything is written to f_out before the with block
+    ends; on an exception the threads are stopped and the output is left
+    incomplete. f_in and f_out stay open.
+    """
+
+    def __init__(self, f_in, f_out, depth=PIPELINE_DEPTH, block_chars=PIPELINE_BLOCK_CHARS):
+        self.reader = BlockReader(f_in, depth, block_chars)
+        self.writer = BlockWriter(f_out, depth, block_chars)
+        self.lines = self.reader.lines()
+        self.out = self.writer
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.reader.close()
+        self.writer.close(flush=exc_type is None)
+        return False
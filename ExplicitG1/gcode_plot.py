@@ -0,0 +1,226 @@
+"""
+Toolpath plot data: a program's G1 moves as columns, ready to draw at any zoom.
+
+The program is read once into per-move columns: X and A, the Z each move
+cuts at, and the A change its tier is picked by. Each plotted series gets a
+min/max pyramid, where level k holds the min and max of every block of 2**k
+moves. A view is drawn as one min-max bar per pixel column, read from the
+level whose blocks just fit in a column. A redraw costs the same for ten
+million moves as for ten thousand, and no spike is lost the way it would be
+by plotting every Nth point. Pan and zoom only change which moves are on
+screen. Changing the tiers or the taper rebuilds one pyramid, not the
+columns.
+"""
+
+import math
+from array import array
+from bisect import bisect_left
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional
+    np = None
+
+from gcode_columnar import taper_adjustments
+from gcode_engine import GCodeEngine, has_explicit_g1
+
+
+INF = float('inf')
+NAN = float('nan')
+
+# The narrowest view, in moves - zooming in further just stretches single moves
+MIN_VIEW_MOVES = 8
+
+
+class Toolpath:
+    """Per-move columns of a program. Every G1 line with an X/Y/Z/A word is one move."""
+
+    def __init__(self):
+        self.x = array('d')  # X and A carried forward (NaN until first set)
+        self.a = array('d')
+        self.z = array('d')  # The move's Z, or the modal Z if it has none - what taper adds to
+        self.tapered = bytearray()  # 1 where the move has an X word (taper changes its Z)
+        self.a_change = array('d')  # The A change it's tiered by, or NaN if it keeps its feedrate
+
+    def __len__(self):
+        return len(self.x)
+
+    def changes(self):
+        """The A changes that pick a tier, in file order (as collect_a_changes())."""
+        return array('d', (change for change in self.a_change if change == change))
+
+
+def read_toolpath(lines):
+    """Toolpath of an iterable of lines.
+
+    Follows process_lines: the same moves, the same modal Z, and the same
+    forward/backward rule for which A each A change is measured against.
+    """
+    parse_words = GCodeEngine().parse_words
+    path = Toolpath()
+    a_moves = array('l')  # Move index of each A move
+    explicit = bytearray()
+    x = a = NAN
+    modal_z = 0.0
+    moves = 0
+    append_x, append_a, append_z, append_tapered = path.x.append, path.a.append, path.z.append, path.tapered.append
+    for line in lines:
+        original_line = line.rstrip('\n')
+        words = parse_words(original_line)
+        if words is None:
+            continue
+        line_x, line_y, line_z, line_a, f, explicit_g1, texts = words
+        if line_x is not None:
+            x = line_x
+        elif line_z is not None and line_y is None:
+            modal_z = line_z
+        if line_a is not None:
+            a = line_a
+            a_moves.append(moves)
+            explicit.append(has_explicit_g1(original_line, explicit_g1))
+        append_x(x)
+        append_a(a)
+        append_z(modal_z if line_z is None else line_z)
+        append_tapered(line_x is not None)
+        moves += 1
+
+    path.a_change = array('d', [NAN]) * len(path.x)
+    last = len(a_moves) - 1
+    for k, move in enumerate(a_moves):
+        if explicit[k]:
+            # New G1 command - compared with the next A value
+            if k < last:
+                path.a_change[move] = abs(path.a[move] - path.a[a_moves[k + 1]])
+        elif k > 0:
+            # Modal G1 command - compared with the previous A value
+            path.a_change[move] = abs(path.a[move] - path.a[a_moves[k - 1]])
+    return path
+
+
+def halve(values, pad, pick):
+    """pick (min or max) of each pair of values, padding an odd length with pad."""
+    if np is not None:
+        if len(values) % 2:
+            values = np.append(values, pad)
+        return (np.minimum if pick is min else np.maximum)(values[0::2], values[1::2])
+    if len(values) % 2:
+        values = values + array('d', [pad])
+    return array('d', map(pick, values[0::2], values[1::2]))
+
+
+class MinMaxPyramid:
+    """Min and max of a series over aligned blocks of 1, 2, 4, ... values. NaNs are skipped."""
+
+    def __init__(self, values):
+        if np is not None:
+            values = np.asarray(values, dtype=np.float64)
+            low = np.where(np.isnan(values), INF, values)
+            high = np.where(np.isnan(values), -INF, values)
+        else:
+            low = array('d', (INF if value != value else value for value in values))
+            high = array('d', (-INF if value != value else value for value in values))
+        self.lows = [low]
+        self.highs = [high]
+        while len(low) > 1:
+            low = halve(low, INF, min)
+            high = halve(high, -INF, max)
+            self.lows.append(low)
+            self.highs.append(high)
+
+    def __len__(self):
+        return len(self.lows[0])
+
+    def columns(self, start, stop, count):
+        """(lows, highs) of count equal columns across values start to stop (floats).
+
+        A column with no values (or only NaNs) has low INF and high -INF.
+        Columns are read from whole blocks, so a column can reach up to one
+        block past its edges - less than a column wide.
+        """
+        total = len(self)
+        if not total:
+            return [INF] * count, [-INF] * count
+        span = (stop - start) / count
+        level = min(int(math.log2(span)) if span >= 2 else 0, len(self.lows) - 1)
+        low_level = self.lows[level]
+        high_level = self.highs[level]
+        lows = []
+        highs = []
+        for column in range(count):
+            first = min(max(int(start + column * span), 0), total - 1)
+            last = min(max(int(start + (column + 1) * span), first + 1), total)
+            first_block = first >> level
+            last_block = ((last - 1) >> level) + 1
+            lows.append(float(min(low_level[first_block:last_block])))
+            highs.append(float(max(high_level[first_block:last_block])))
+        return lows, highs
+
+
+class ToolpathView:
+    """Pyramids for the plotted series (X, A, taper Z and tier) and the moves on screen."""
+
+    def __init__(self, toolpath):
+        self.toolpath = toolpath
+        self.pyramids = {'X': MinMaxPyramid(toolpath.x), 'A': MinMaxPyramid(toolpath.a)}
+        self.set_taper(None)
+        self.set_table(None)
+        self.reset()
+
+    def __len__(self):
+        return len(self.toolpath)
+
+    def set_table(self, table):
+        """Tier every move under a FeedrateTable (None: no tiers); the tightest shows per column."""
+        changes = self.toolpath.a_change
+        if table is None:
+            tiers = array('d', [-1.0]) * len(changes)
+        elif np is not None:
+            changes = np.frombuffer(changes, dtype=np.float64)
+            limits = np.array(table.limits, dtype=np.float64)
+            tiers = np.where(np.isnan(changes), -1.0,
+                             len(limits) - np.searchsorted(limits, changes, side='left'))
+        else:
+            limits = table.limits
+            tiers = array('d', (len(limits) - bisect_left(limits, change) if change == change else -1.0
+                                for change in changes))
+        self.pyramids['tier'] = MinMaxPyramid(tiers)
+
+    def set_taper(self, taper):
+        """Show Z with a TaperProfile's adjustment added, or without (None)."""
+        path = self.toolpath
+        if taper is None:
+            z = path.z
+        else:
+            if np is not None:
+                x = np.frombuffer(path.x, dtype=np.float64)
+                z = np.frombuffer(path.z, dtype=np.float64)
+                tapered = np.frombuffer(bytes(path.tapered), dtype=np.bool_)
+                z = np.where(tapered, z + taper_adjustments(taper, x), z)
+            else:
+                adjustment = taper.adjustment
+                z = array('d', (z + adjustment(x) if tapered else z
+                                for x, z, tapered in zip(path.x, path.z, path.tapered)))
+        self.pyramids['Z'] = MinMaxPyramid(z)
+
+    def columns(self, series, count):
+        """(lows, highs) of the named series for count pixel columns of the current view."""
+        return self.pyramids[series].columns(self.start, self.stop, count)
+
+    def reset(self):
+        """Show the whole program."""
+        self.start, self.stop = 0.0, float(max(len(self), 1))
+
+    def zoom(self, factor, anchor=0.5):
+        """Zoom in (factor < 1) or out around a point anchor (0-1) of the way across the view."""
+        total = max(len(self), 1)
+        span = min(max((self.stop - self.start) * factor, min(MIN_VIEW_MOVES, total)), total)
+        pivot = self.start + (self.stop - self.start) * anchor
+        self.start = pivot - span * anchor
+        self.stop = self.start + span
+        self.pan(0.0)
+
+    def pan(self, fraction):
+        """Scroll by a fraction of the view's width (positive: later in the program), within the program."""
+        span = self.stop - self.start
+        start = min(max(self.start + span * fraction, 0.0), max(len(self), 1) - span)
+        self.start, self.stop = start, start + span
@@ -1,8 +1,41 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-import re
 import os
 import json
+import queue
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from itertools import groupby
+from operator import itemgetter
+
+from gcode_columnar import create_engine, numpy_available
+from gcode_cycletime import DEFAULT_RAPID_RATE, compare_files, comparison_lines, format_minutes
+from gcode_engine import (FeedrateTable, ProcessingCancelled, TaperProfile, open_output, parse_taper_profile, taper_error,
+                          tier_counts_sorted, tier_error, track_progress)
+from gcode_log import LOG_BUFFER_LINES, LogBuffer
+from gcode_pipeline import Pipeline
+from gcode_plot import INF, ToolpathView, read_toolpath
+from gcode_stats import Instrumentation, report_lines, run_report
+
+
+# Tier preview histogram: A changes from 0° to HISTOGRAM_MAX° plus one overflow bar
+HISTOGRAM_MAX = 5.0
+HISTOGRAM_BINS = 50
+
+# Feedrate tiers for a fresh install: (threshold, feedrate), Tier 1 first
+DEFAULT_TIERS = [('1.5', '100'), ('0.5', '50')]
+
+# Preview bar colours, tightest tier first (default-feedrate bars are green)
+TIER_COLORS = ['#f38ba8', '#89b4fa', '#f9e2af', '#cba6f7', '#fab387', '#94e2d5']
+
+# How often buffered log messages are moved into the log pane (ms)
+LOG_FLUSH_MS = 100
+
+# Toolpath plot: strips top to bottom (series, label), and the room left for their labels
+TOOLPATH_STRIPS = [('X', 'X'), ('A', 'A°'), ('Z', 'Z')]
+TOOLPATH_MARGIN = 56
 
 
 class GCodeProcessor:
@@ -14,14 +47,26 @@ class GCodeProcessor:
         self.root.resizable(True, True)
         
         self.selected_file = None
-        self.previous_a_value = None
-        self.current_motion_mode = None
+        
+        # Background job state - the worker only talks to the UI through job_queue
+        self.job = None
+        self.job_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        
+        # Tier preview - A changes of the selected file, read once in the background
+        self.preview = None
+        self.preview_queue = queue.Queue()
+        self.preview_polling = False
+        
+        # Log pane - messages are buffered and shown in batches (see gcode_log.py)
+        self.log_buffer = LogBuffer()
         
         # Config file to save settings
         self.config_file = os.path.join(os.path.expanduser("~"), ".gcode_processor_config.json")
         
         self.setup_ui()
         self.load_settings()
+        self.root.after(LOG_FLUSH_MS, self.poll_log)
     
     def load_settings(self):
         """Load settings from config file."""
@@ -30,13 +75,23 @@ class GCodeProcessor:
                 with open(self.config_file, 'r') as f:
                     config = json.load(f)
                     self.default_feedrate_var.set(config.get('default_feedrate', '380'))
-                    self.threshold1_var.set(config.get('threshold1', '1.5'))
-                    self.feedrate1_var.set(config.get('feedrate1', '100'))
-                    self.threshold2_var.set(config.get('threshold2', '0.5'))
-                    self.feedrate2_var.set(config.get('feedrate2', '50'))
+                    self.rapid_rate_var.set(config.get('rapid_rate', f'{DEFAULT_RAPID_RATE:g}'))
+                    if 'tiers' in config:
+                        self.set_tiers(config['tiers'])
+                    else:
+                        # Config saved before the tier table - two fixed tiers
+                        self.set_tiers([(config.get('threshold1', '1.5'), config.get('feedrate1', '100')),
+                                        (config.get('threshold2', '0.5'), config.get('feedrate2', '50'))])
                     self.large_diameter_var.set(config.get('large_diameter', ''))
                     self.small_diameter_var.set(config.get('small_diameter', ''))
                     self.length_var.set(config.get('length', ''))
+                    self.taper_profile_var.set(config.get('taper_profile', ''))
+                    self.taper_offset_var.set(config.get('taper_offset', ''))
+                    self.taper_reverse_var.set(bool(config.get('taper_reverse', False)))
+                    self.stage_stats_var.set(bool(config.get('stage_stats', False)))
+                    self.detail_log_var.set(bool(config.get('detail_log', False)))
+                    self.fixed_point_var.set(bool(config.get('fixed_point', False)))
+                    self.cycle_time_var.set(bool(config.get('cycle_time', False)))
             except:
                 pass  # If config file is corrupted, just use defaults
     
@@ -45,13 +100,18 @@ class GCodeProcessor:
         try:
             config = {
                 'default_feedrate': self.default_feedrate_var.get(),
-                'threshold1': self.threshold1_var.get(),
-                'feedrate1': self.feedrate1_var.get(),
-                'threshold2': self.threshold2_var.get(),
-                'feedrate2': self.feedrate2_var.get(),
+                'rapid_rate': self.rapid_rate_var.get(),
+                'tiers': [[threshold_var.get(), feedrate_var.get()] for threshold_var, feedrate_var in self.tier_vars],
                 'large_diameter': self.large_diameter_var.get(),
                 'small_diameter': self.small_diameter_var.get(),
-                'length': self.length_var.get()
+                'length': self.length_var.get(),
+                'taper_profile': self.taper_profile_var.get(),
+                'taper_offset': self.taper_offset_var.get(),
+                'taper_reverse': self.taper_reverse_var.get(),
+                'stage_stats': self.stage_stats_var.get(),
+                'detail_log': self.detail_log_var.get(),
+                'fixed_point': self.fixed_point_var.get(),
+                'cycle_time': self.cycle_time_var.get()
             }
             with open(self.config_file, 'w') as f:
                 json.dump(config, f, indent=2)
@@ -94,6 +154,8 @@ class GCodeProcessor:
                  background=[('active', '#74c7ec'), ('disabled', self.bg_light)],
                  foreground=[('disabled', self.text_dim)])
         
+        style.configure('Small.TButton', font=('Segoe UI', 9, 'bold'), padding=(6, 2))
+        
         style.configure('Accent.TButton',
                        background=self.accent_green,
                        foreground='#1e1e2e',
@@ -102,6 +164,9 @@ class GCodeProcessor:
         style.map('Accent.TButton',
                  background=[('active', '#94e2d5')])
         
+        style.configure('TCheckbutton', background=self.bg_dark, foreground=self.text_dim, font=('Segoe UI', 9))
+        style.map('TCheckbutton', background=[('active', self.bg_dark)])
+        
         style.configure('TEntry',
                        fieldbackground=self.bg_light,
                        foreground=self.text_color,
@@ -169,61 +234,41 @@ class GCodeProcessor:
         default_feedrate_entry = ttk.Entry(settings_frame, textvariable=self.default_feedrate_var, width=12)
         default_feedrate_entry.grid(row=row, column=1, sticky=tk.W, pady=8)
         
-        # Separator
-        row += 1
-        separator1 = ttk.Separator(settings_frame, orient=tk.HORIZONTAL)
-        separator1.grid(row=row, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=15)
-        
-        # Tier 1 - Below threshold 1
-        row += 1
-        ttk.Label(settings_frame, text="🎯 Tier 1", 
-                  style='Subtitle.TLabel').grid(
-            row=row, column=0, columnspan=2, sticky=tk.W, pady=(0, 8)
-        )
-        
+        # Rapid rate - only used for the cycle time estimate
         row += 1
-        ttk.Label(settings_frame, text="A-Axis Delta Below:").grid(
+        ttk.Label(settings_frame, text="Rapid Rate:").grid(
             row=row, column=0, sticky=tk.W, pady=8, padx=(0, 15)
         )
-        self.threshold1_var = tk.StringVar(value="1.5")
-        threshold1_entry = ttk.Entry(settings_frame, textvariable=self.threshold1_var, width=12)
-        threshold1_entry.grid(row=row, column=1, sticky=tk.W, pady=8)
-        
-        row += 1
-        ttk.Label(settings_frame, text="Reduced Feedrate 1:").grid(
-            row=row, column=0, sticky=tk.W, pady=8, padx=(0, 15)
-        )
-        self.feedrate1_var = tk.StringVar(value="100")
-        feedrate1_entry = ttk.Entry(settings_frame, textvariable=self.feedrate1_var, width=12)
-        feedrate1_entry.grid(row=row, column=1, sticky=tk.W, pady=8)
+        self.rapid_rate_var = tk.StringVar(value=f"{DEFAULT_RAPID_RATE:g}")
+        rapid_rate_entry = ttk.Entry(settings_frame, textvariable=self.rapid_rate_var, width=12)
+        rapid_rate_entry.grid(row=row, column=1, sticky=tk.W, pady=8)
         
         # Separator
         row += 1
-        separator2 = ttk.Separator(settings_frame, orient=tk.HORIZONTAL)
-        separator2.grid(row=row, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=15)
+        separator1 = ttk.Separator(settings_frame, orient=tk.HORIZONTAL)
+        separator1.grid(row=row, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=15)
         
-        # Tier 2 - Below threshold 2
+        # Feedrate tiers - any number of rows, Tier 1 (largest threshold) first
         row += 1
-        ttk.Label(settings_frame, text="🎯 Tier 2", 
+        ttk.Label(settings_frame, text="🎯 Feedrate Tiers", 
                   style='Subtitle.TLabel').grid(
             row=row, column=0, columnspan=2, sticky=tk.W, pady=(0, 8)
         )
         
         row += 1
-        ttk.Label(settings_frame, text="A-Axis Delta Below:").grid(
-            row=row, column=0, sticky=tk.W, pady=8, padx=(0, 15)
-        )
-        self.threshold2_var = tk.StringVar(value="0.5")
-        threshold2_entry = ttk.Entry(settings_frame, textvariable=self.threshold2_var, width=12)
-        threshold2_entry.grid(row=row, column=1, sticky=tk.W, pady=8)
+        self.tier_frame = ttk.Frame(settings_frame, style='TFrame')
+        self.tier_frame.grid(row=row, column=0, columnspan=2, sticky=(tk.W, tk.E))
+        self.tier_vars = []
         
         row += 1
-        ttk.Label(settings_frame, text="Reduced Feedrate 2:").grid(
-            row=row, column=0, sticky=tk.W, pady=8, padx=(0, 15)
+        add_tier_btn = ttk.Button(settings_frame, text="+ Add Tier", command=self.add_tier, style='Small.TButton')
+        add_tier_btn.grid(row=row, column=0, columnspan=2, sticky=tk.W, pady=(8, 0))
+        
+        row += 1
+        ttk.Label(settings_frame, text="Each tier needs a smaller A-axis delta than the one above", 
+                  style='Dim.TLabel').grid(
+            row=row, column=0, columnspan=2, sticky=tk.W, pady=(5, 0)
         )
-        self.feedrate2_var = tk.StringVar(value="50")
-        feedrate2_entry = ttk.Entry(settings_frame, textvariable=self.feedrate2_var, width=12)
-        feedrate2_entry.grid(row=row, column=1, sticky=tk.W, pady=8)
         
         # Separator
         row += 1
@@ -267,11 +312,92 @@ class GCodeProcessor:
             row=row, column=0, columnspan=2, sticky=tk.W, pady=(0, 5)
         )
         
+        # Or a profile table - diameter vs X from a CSV file
+        row += 1
+        ttk.Label(settings_frame, text="Profile CSV:").grid(
+            row=row, column=0, sticky=tk.W, pady=8, padx=(0, 15)
+        )
+        profile_frame = ttk.Frame(settings_frame, style='TFrame')
+        profile_frame.grid(row=row, column=1, sticky=tk.W, pady=8)
+        self.taper_profile_var = tk.StringVar(value="")
+        ttk.Entry(profile_frame, textvariable=self.taper_profile_var, width=24).grid(row=0, column=0, sticky=tk.W)
+        ttk.Button(profile_frame, text="…", width=3, command=self.browse_taper_profile,
+                   style='Small.TButton').grid(row=0, column=1, sticky=tk.W, padx=(5, 0))
+        
+        row += 1
+        ttk.Label(settings_frame, text="Profile X Offset:").grid(
+            row=row, column=0, sticky=tk.W, pady=8, padx=(0, 15)
+        )
+        self.taper_offset_var = tk.StringVar(value="")
+        taper_offset_entry = ttk.Entry(settings_frame, textvariable=self.taper_offset_var, width=12)
+        taper_offset_entry.grid(row=row, column=1, sticky=tk.W, pady=8)
+        
+        row += 1
+        self.taper_reverse_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(settings_frame, text="Run the profile towards -X",
+                        variable=self.taper_reverse_var).grid(row=row, column=0, columnspan=2, sticky=tk.W)
+        
+        row += 1
+        ttk.Label(settings_frame, text="x,diameter rows - use instead of the diameters and length",
+                  style='Dim.TLabel').grid(
+            row=row, column=0, columnspan=2, sticky=tk.W, pady=(5, 5)
+        )
+        
+        for taper_var in (self.large_diameter_var, self.small_diameter_var, self.length_var,
+                          self.taper_profile_var, self.taper_offset_var, self.taper_reverse_var):
+            taper_var.trace_add('write', self.update_toolpath_taper)
+        
         # Run button - big and prominent
         self.run_btn = ttk.Button(left_column, text="🚀 Run Processing", 
                                    command=self.process_file, state=tk.DISABLED,
                                    style='Accent.TButton')
-        self.run_btn.grid(row=3, column=0, pady=20, sticky=(tk.W, tk.E))
+        self.run_btn.grid(row=3, column=0, pady=(20, 10), sticky=(tk.W, tk.E))
+        
+        # Progress bar, stats and Cancel button for the running job
+        progress_frame = ttk.Frame(left_column, style='TFrame')
+        progress_frame.grid(row=4, column=0, sticky=(tk.W, tk.E), pady=(0, 20))
+        progress_frame.columnconfigure(0, weight=1)
+        
+        self.progress_bar = ttk.Progressbar(progress_frame, mode='determinate', maximum=100)
+        self.progress_bar.grid(row=0, column=0, sticky=(tk.W, tk.E), padx=(0, 10))
+        
+        self.cancel_btn = ttk.Button(progress_frame, text="Cancel", 
+                                      command=self.cancel_job, state=tk.DISABLED)
+        self.cancel_btn.grid(row=0, column=1, sticky=tk.E)
+        
+        self.progress_label = ttk.Label(progress_frame, text="", style='Dim.TLabel')
+        self.progress_label.grid(row=1, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
+        
+        self.stage_stats_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(progress_frame, text="Log time per stage (read/parse/tier/taper/write) - slower",
+                        variable=self.stage_stats_var).grid(row=2, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
+        
+        self.detail_log_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(progress_frame, text="Log every tier decision and taper Z (saved to _modified.log)",
+                        variable=self.detail_log_var).grid(row=3, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
+        
+        self.fixed_point_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(progress_frame, text="Fixed-point numbers (exact to 0.0001, feedrates as F50 not F50.0)",
+                        variable=self.fixed_point_var).grid(row=4, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
+        
+        self.cycle_time_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(progress_frame, text="Estimate cycle time afterwards (reads both programs again)",
+                        variable=self.cycle_time_var).grid(row=5, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
+        
+        # Live tier preview - re-tiers the cached A changes on every keystroke
+        preview_frame = ttk.LabelFrame(left_column, text="📊 Tier Preview", padding="10")
+        preview_frame.grid(row=5, column=0, sticky=(tk.W, tk.E))
+        preview_frame.columnconfigure(0, weight=1)
+        
+        self.histogram_canvas = tk.Canvas(preview_frame, height=110, bg=self.bg_light,
+                                          highlightthickness=0, borderwidth=0)
+        self.histogram_canvas.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        
+        self.preview_label = ttk.Label(preview_frame, text="Select a file to preview tiers", style='Dim.TLabel')
+        self.preview_label.grid(row=1, column=0, sticky=tk.W, pady=(5, 0))
+        
+        self.histogram_canvas.bind('<Configure>', self.update_preview)
+        self.set_tiers(DEFAULT_TIERS)
         
         # RIGHT COLUMN - Processing Log (reading pane style)
         right_column = ttk.Frame(main_frame, style='TFrame')
@@ -309,6 +435,27 @@ class GCodeProcessor:
         self.log_text.tag_configure('error', foreground=self.accent_red)
         self.log_text.tag_configure('info', foreground=self.accent_blue)
         
+        # Toolpath plot - X, A and taper Z over the program, coloured by tier
+        toolpath_frame = ttk.LabelFrame(right_column, text="🗺 Toolpath", padding="10")
+        toolpath_frame.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=(15, 0))
+        toolpath_frame.columnconfigure(0, weight=1)
+        
+        self.toolpath_canvas = tk.Canvas(toolpath_frame, height=240, bg=self.bg_light,
+                                         highlightthickness=0, borderwidth=0)
+        self.toolpath_canvas.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        
+        self.toolpath_label = ttk.Label(toolpath_frame, text="Select a file to plot its toolpath", style='Dim.TLabel')
+        self.toolpath_label.grid(row=1, column=0, sticky=tk.W, pady=(5, 0))
+        
+        self.toolpath_canvas.bind('<Configure>', self.draw_toolpath)
+        self.toolpath_canvas.bind('<MouseWheel>', self.zoom_toolpath)
+        self.toolpath_canvas.bind('<Button-4>', self.zoom_toolpath)  # Wheel on X11
+        self.toolpath_canvas.bind('<Button-5>', self.zoom_toolpath)
+        self.toolpath_canvas.bind('<ButtonPress-1>', self.start_toolpath_pan)
+        self.toolpath_canvas.bind('<B1-Motion>', self.pan_toolpath)
+        self.toolpath_canvas.bind('<Double-Button-1>', self.reset_toolpath)
+        self.toolpath_drag_x = None
+        
         # Store references to columns for responsive layout
         self.left_column = left_column
         self.right_column = right_column
@@ -317,6 +464,70 @@ class GCodeProcessor:
         self.root.bind('<Configure>', self.on_window_resize)
         self.current_layout = 'two-column'  # Track current layout
     
+    def set_tiers(self, tiers):
+        """Replace the tier rows with (threshold, feedrate) pairs, Tier 1 first."""
+        self.tier_vars = []
+        for threshold, feedrate in tiers:
+            self.add_tier_row(str(threshold), str(feedrate))
+        self.render_tiers()
+    
+    def add_tier_row(self, threshold, feedrate):
+        threshold_var = tk.StringVar(value=threshold)
+        feedrate_var = tk.StringVar(value=feedrate)
+        threshold_var.trace_add('write', self.update_preview)
+        self.tier_vars.append((threshold_var, feedrate_var))
+    
+    def add_tier(self):
+        """Add a tier below the last one, halving its threshold and feedrate as a start."""
+        threshold, feedrate = '', ''
+        if self.tier_vars:
+            try:
+                threshold = f"{float(self.tier_vars[-1][0].get()) / 2:g}"
+                feedrate = f"{float(self.tier_vars[-1][1].get()) / 2:g}"
+            except ValueError:
+                pass
+        self.add_tier_row(threshold, feedrate)
+        self.render_tiers()
+    
+    def remove_tier(self, index):
+        if len(self.tier_vars) > 1:
+            del self.tier_vars[index]
+            self.render_tiers()
+    
+    def render_tiers(self):
+        """Rebuild the tier table rows from tier_vars."""
+        for widget in self.tier_frame.winfo_children():
+            widget.destroy()
+        
+        ttk.Label(self.tier_frame, text="A-Axis Delta ≤", style='Dim.TLabel').grid(
+            row=0, column=1, sticky=tk.W, padx=(0, 10)
+        )
+        ttk.Label(self.tier_frame, text="Feedrate", style='Dim.TLabel').grid(
+            row=0, column=2, sticky=tk.W, padx=(0, 10)
+        )
+        for index, (threshold_var, feedrate_var) in enumerate(self.tier_vars):
+            row = index + 1
+            ttk.Label(self.tier_frame, text=f"Tier {row}:").grid(
+                row=row, column=0, sticky=tk.W, pady=4, padx=(0, 15)
+            )
+            ttk.Entry(self.tier_frame, textvariable=threshold_var, width=8).grid(
+                row=row, column=1, sticky=tk.W, pady=4, padx=(0, 10)
+            )
+            ttk.Entry(self.tier_frame, textvariable=feedrate_var, width=8).grid(
+                row=row, column=2, sticky=tk.W, pady=4, padx=(0, 10)
+            )
+            remove_btn = ttk.Button(self.tier_frame, text="✕", style='Small.TButton',
+                                    command=lambda index=index: self.remove_tier(index))
+            remove_btn.grid(row=row, column=3, sticky=tk.W, pady=4)
+            if len(self.tier_vars) == 1:
+                remove_btn.config(state=tk.DISABLED)
+        self.update_preview()
+    
+    def read_tiers(self):
+        """Tier table as [(threshold, feedrate)] floats; raises ValueError on a bad entry."""
+        return [(float(threshold_var.get()), float(feedrate_var.get()))
+                for threshold_var, feedrate_var in self.tier_vars]
+    
     def browse_file(self):
         filename = filedialog.askopenfilename(
             title="Select GCode File",
@@ -327,8 +538,242 @@ class GCodeProcessor:
             self.selected_file = filename
             display_name = os.path.basename(filename)
             self.file_label.config(text=display_name, foreground=self.accent_green, font=('Segoe UI', 10, 'bold'))
-            self.run_btn.config(state=tk.NORMAL)
+            if self.job is None:
+                self.run_btn.config(state=tk.NORMAL)
             self.log_message(f"✓ File selected: {display_name}", 'success')
+            self.load_preview(filename)
+    
+    def load_preview(self, filename):
+        """Read the file's A changes on a background thread for the tier preview."""
+        self.preview = None
+        self.preview_label.config(text="Reading A-axis changes...")
+        self.histogram_canvas.delete('all')
+        self.toolpath_canvas.delete('all')
+        self.toolpath_label.config(text="Reading toolpath...")
+        threading.Thread(target=self.read_preview, args=(filename,), daemon=True).start()
+        if not self.preview_polling:
+            self.preview_polling = True
+            self.root.after(100, self.poll_preview)
+    
+    def read_preview(self, filename):
+        """Worker thread: sorted A changes plus histogram bin counts, and the toolpath plot's columns."""
+        try:
+            with open(filename, 'r') as f:
+                toolpath = read_toolpath(f)
+            changes = array('d', sorted(toolpath.changes()))
+            
+            # Bin i holds changes in (i * step, (i + 1) * step]; the last bin is the overflow
+            step = HISTOGRAM_MAX / HISTOGRAM_BINS
+            edges = [bisect_right(changes, i * step) if i else 0 for i in range(HISTOGRAM_BINS + 1)]
+            bins = [edges[i + 1] - edges[i] for i in range(HISTOGRAM_BINS)]
+            bins.append(len(changes) - edges[-1])
+            self.preview_queue.put((filename, {'changes': changes, 'bins': bins, 'view': ToolpathView(toolpath)}))
+        except Exception as e:
+            self.preview_queue.put((filename, str(e)))
+    
+    def poll_preview(self):
+        while True:
+            try:
+                filename, result = self.preview_queue.get_nowait()
+            except queue.Empty:
+                break
+            if filename != self.selected_file:
+                continue  # A newer file has been selected since
+            self.preview_polling = False
+            if isinstance(result, str):
+                self.preview_label.config(text=f"Preview unavailable: {result}")
+                self.toolpath_label.config(text=f"Toolpath unavailable: {result}")
+            else:
+                self.preview = result
+                self.update_toolpath_taper()
+                self.update_preview()
+            return
+        self.root.after(100, self.poll_preview)
+    
+    def update_preview(self, *args):
+        """Re-tier the cached A changes against the thresholds as they are typed."""
+        if self.preview is None:
+            return
+        try:
+            # Feedrates don't change the counts, so only the thresholds have to be valid
+            tiers = [(float(threshold_var.get()), 1) for threshold_var, feedrate_var in self.tier_vars]
+        except ValueError:
+            self.preview_label.config(text="Enter numeric thresholds to preview tiers")
+            return
+        error = tier_error(tiers)
+        if error:
+            self.preview_label.config(text=error)
+            return
+        
+        table = FeedrateTable(tiers, 1)
+        changes = self.preview['changes']
+        counts = tier_counts_sorted(changes, table)
+        tier_text = " • ".join(f"Tier {tier}: {counts[tier]:,}" for tier in range(len(table), 0, -1))
+        self.preview_label.config(
+            text=f"{tier_text} • Default: {counts[0]:,} (of {len(changes):,} A moves)")
+        self.draw_histogram(table)
+        self.preview['table'] = table
+        self.preview['view'].set_table(table)
+        self.draw_toolpath()
+    
+    def draw_histogram(self, table):
+        canvas = self.histogram_canvas
+        canvas.delete('all')
+        width = canvas.winfo_width()
+        height = canvas.winfo_height()
+        if width <= 1 or height <= 1:
+            return  # Not laid out yet
+        
+        bins = self.preview['bins']
+        tallest = max(bins) or 1
+        bar_width = width / len(bins)
+        step = HISTOGRAM_MAX / HISTOGRAM_BINS
+        for i, count in enumerate(bins):
+            # Colour each bar by the tier its upper edge falls in
+            upper = (i + 1) * step if i < HISTOGRAM_BINS else float('inf')
+            tier = table.classify(upper)[0]
+            color = TIER_COLORS[(len(table) - tier) % len(TIER_COLORS)] if tier else self.accent_green
+            bar_height = (height - 14) * count / tallest
+            x0 = i * bar_width
+            canvas.create_rectangle(x0 + 1, height - 12 - bar_height, x0 + bar_width, height - 12,
+                                    fill=color, outline='')
+        
+        # Threshold markers and axis labels
+        for threshold in table.limits:
+            if 0 <= threshold <= HISTOGRAM_MAX:
+                x = threshold / HISTOGRAM_MAX * HISTOGRAM_BINS * bar_width
+                canvas.create_line(x, 0, x, height - 12, fill=self.text_color, dash=(3, 2))
+        canvas.create_text(2, height - 1, text="0°", anchor=tk.SW, fill=self.text_dim, font=('Segoe UI', 7))
+        canvas.create_text(width - 2, height - 1, text=f"{HISTOGRAM_MAX:g}°+", anchor=tk.SE,
+                           fill=self.text_dim, font=('Segoe UI', 7))
+    
+    def browse_taper_profile(self):
+        filename = filedialog.askopenfilename(
+            title="Select Taper Profile",
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+        )
+        if filename:
+            self.taper_profile_var.set(filename)
+    
+    def read_taper_profile(self):
+        """TaperProfile from the profile fields, or None if they're blank; raises ValueError."""
+        text = self.taper_profile_var.get().strip()
+        if not text:
+            return None
+        offset = float(self.taper_offset_var.get().strip() or 0)
+        return TaperProfile(parse_taper_profile(text), offset, self.taper_reverse_var.get())
+    
+    def preview_taper(self):
+        """TaperProfile for the toolpath plot, or None while the taper fields are blank or invalid."""
+        try:
+            profile = self.read_taper_profile()
+            if profile is not None:
+                return profile
+            taper = tuple(float(var.get()) for var in (self.large_diameter_var, self.small_diameter_var,
+                                                        self.length_var))
+        except ValueError:
+            return None
+        return None if taper_error(*taper) else TaperProfile.cone(*taper)
+    
+    def update_toolpath_taper(self, *args):
+        """Re-apply the taper to the plotted Z as the taper fields are typed."""
+        if self.preview is None:
+            return
+        self.preview['view'].set_taper(self.preview_taper())
+        self.draw_toolpath()
+    
+    def tier_color(self, tier, table):
+        """Plot colour for a tier number (0 = default feedrate, -1 = no tier decision)."""
+        if tier < 0:
+            return self.text_dim
+        tier = int(tier)
+        return TIER_COLORS[(len(table) - tier) % len(TIER_COLORS)] if tier else self.accent_green
+    
+    def draw_toolpath(self, *args):
+        """Draw the moves in view as one min-max bar per pixel column (see gcode_plot.py)."""
+        canvas = self.toolpath_canvas
+        canvas.delete('all')
+        width = canvas.winfo_width()
+        height = canvas.winfo_height()
+        if self.preview is None or width <= TOOLPATH_MARGIN + 1 or height <= 1:
+            return  # Nothing loaded, or not laid out yet
+        view = self.preview['view']
+        if not len(view):
+            self.toolpath_label.config(text="No G1 moves to plot")
+            return
+        
+        # X and A are coloured by the tightest tier in each column
+        columns = width - TOOLPATH_MARGIN
+        table = self.preview.get('table')
+        tiers = view.columns('tier', columns)[1]
+        colors = [self.tier_color(tier, table) if table else self.accent_blue for tier in tiers]
+        strip_height = height / len(TOOLPATH_STRIPS)
+        font = ('Segoe UI', 7)
+        
+        for index, (series, label) in enumerate(TOOLPATH_STRIPS):
+            top = index * strip_height + 6
+            bottom = (index + 1) * strip_height - 6
+            lows, highs = view.columns(series, columns)
+            low = min(lows)
+            high = max(highs)
+            if low == INF:
+                continue  # The program never sets this axis
+            scale = (bottom - top) / (high - low) if high > low else 0.0
+            middle = (top + bottom) / 2
+            
+            def y(value):
+                return bottom - (value - low) * scale if scale else middle
+            
+            # One polyline per run of same-coloured columns, zig-zagging min → max
+            run_color = None
+            points = []
+            for column in range(columns + 1):
+                at_end = column == columns or lows[column] == INF
+                color = None if at_end else (colors[column] if series != 'Z' else self.accent_blue)
+                if points and color != run_color:
+                    if len(points) == 4:
+                        points += [points[0] + 1, points[3]]
+                    canvas.create_line(*points, fill=run_color)
+                    points = points[-2:] if color is not None else []
+                if color is not None:
+                    x = TOOLPATH_MARGIN + column + 0.5
+                    points += [x, y(lows[column]), x, y(highs[column])]
+                    run_color = color
+            
+            canvas.create_text(2, top, text=label, anchor=tk.NW, fill=self.text_color, font=('Segoe UI', 8, 'bold'))
+            canvas.create_text(TOOLPATH_MARGIN - 4, top, text=f"{high:.4g}", anchor=tk.NE,
+                               fill=self.text_dim, font=font)
+            canvas.create_text(TOOLPATH_MARGIN - 4, bottom, text=f"{low:.4g}", anchor=tk.SE,
+                               fill=self.text_dim, font=font)
+        
+        self.toolpath_label.config(
+            text=f"Moves {int(view.start):,}–{int(view.stop):,} of {len(view):,} • "
+                 f"scroll to zoom, drag to pan, double-click for all")
+    
+    def zoom_toolpath(self, event):
+        if self.preview is None:
+            return
+        zoom_in = event.num == 4 or getattr(event, 'delta', 0) > 0
+        columns = max(self.toolpath_canvas.winfo_width() - TOOLPATH_MARGIN, 1)
+        anchor = min(max((event.x - TOOLPATH_MARGIN) / columns, 0.0), 1.0)
+        self.preview['view'].zoom(0.8 if zoom_in else 1.25, anchor)
+        self.draw_toolpath()
+    
+    def start_toolpath_pan(self, event):
+        self.toolpath_drag_x = event.x
+    
+    def pan_toolpath(self, event):
+        if self.preview is None or self.toolpath_drag_x is None:
+            return
+        columns = max(self.toolpath_canvas.winfo_width() - TOOLPATH_MARGIN, 1)
+        self.preview['view'].pan((self.toolpath_drag_x - event.x) / columns)
+        self.toolpath_drag_x = event.x
+        self.draw_toolpath()
+    
+    def reset_toolpath(self, event):
+        if self.preview is not None:
+            self.preview['view'].reset()
+            self.draw_toolpath()
     
     def on_window_resize(self, event):
         """Handle window resize to switch between single and two-column layouts."""
@@ -353,51 +798,37 @@ class GCodeProcessor:
             self.right_column.grid(row=0, column=1, sticky=(tk.W, tk.E, tk.N, tk.S), pady=0)
     
     def log_message(self, message, tag=None):
-        self.log_text.insert(tk.END, message + "\n", tag)
+        """Queue a line for the log pane. Safe to call from the worker thread."""
+        self.log_buffer.append(message, tag)
+    
+    def clear_log(self):
+        self.log_buffer.clear()
+        self.log_text.delete(1.0, tk.END)
+    
+    def flush_log(self):
+        """Move buffered messages into the log pane, keeping it to LOG_BUFFER_LINES lines."""
+        lines, dropped = self.log_buffer.drain()
+        if not lines:
+            return
+        if dropped:
+            detail = f" - full log in {os.path.basename(self.log_buffer.path)}" if self.log_buffer.path else ""
+            self.log_text.insert(tk.END, f"… {dropped:,} lines not shown{detail}\n", 'info')
+        # One insert per run of lines with the same tag
+        for tag, run in groupby(lines, key=itemgetter(1)):
+            self.log_text.insert(tk.END, ''.join(message + '\n' for message, _ in run), tag)
+        excess = int(self.log_text.index('end-1c').split('.')[0]) - 1 - LOG_BUFFER_LINES
+        if excess > 0:
+            self.log_text.delete(1.0, f"{excess + 1}.0")
         self.log_text.see(tk.END)
-        self.root.update_idletasks()
-    
-    def extract_axis_value(self, line, axis):
-        """Extract the value for a specific axis from a GCode line."""
-        pattern = rf'{axis}([+-]?\d+\.?\d*)'
-        match = re.search(pattern, line, re.IGNORECASE)
-        if match:
-            return float(match.group(1))
-        return None
-    
-    def parse_gcode_line(self, line):
-        """Parse a GCode line and extract relevant information."""
-        # Remove comments
-        line = re.sub(r'\(.*?\)', '', line).strip()
-        
-        # Update motion mode if G command is present
-        # G0 or G00 = rapid positioning (not followed by 1-9)
-        if re.match(r'G0+(?![1-9])', line, re.IGNORECASE):
-            self.current_motion_mode = 'G0'
-            return None
-        
-        # G1 or G01 = linear interpolation
-        if re.match(r'G0*1', line, re.IGNORECASE):
-            self.current_motion_mode = 'G1'
-        
-        # Only process lines when in G1 mode
-        if self.current_motion_mode != 'G1':
-            return None
-        
-        # Extract axis values
-        x = self.extract_axis_value(line, 'X')
-        y = self.extract_axis_value(line, 'Y')
-        z = self.extract_axis_value(line, 'Z')
-        a = self.extract_axis_value(line, 'A')
-        f = self.extract_axis_value(line, 'F')
-        
-        # Only process if there are actual axis moves
-        if all(v is None for v in [x, y, z, a]):
-            return None
-        
-        return {'X': x, 'Y': y, 'Z': z, 'A': a, 'F': f, 'original': line}
+    
+    def poll_log(self):
+        self.flush_log()
+        self.root.after(LOG_FLUSH_MS, self.poll_log)
     
     def process_file(self):
+        if self.job is not None:
+            return  # Already running
+        
         if not self.selected_file:
             messagebox.showerror("Error", "No file selected!")
             return
@@ -407,18 +838,20 @@ class GCodeProcessor:
         
         try:
             default_feedrate = float(self.default_feedrate_var.get())
-            threshold1 = float(self.threshold1_var.get())
-            feedrate1 = float(self.feedrate1_var.get())
-            threshold2 = float(self.threshold2_var.get())
-            feedrate2 = float(self.feedrate2_var.get())
+            rapid_rate = float(self.rapid_rate_var.get())
+            tiers = self.read_tiers()
+            if rapid_rate <= 0:
+                raise ValueError
         except ValueError:
-            messagebox.showerror("Error", "Invalid feedrate or threshold value!")
+            messagebox.showerror("Error", "Invalid feedrate, rapid rate or threshold value!")
             return
         
-        # Validate that threshold2 < threshold1
-        if threshold2 >= threshold1:
-            messagebox.showerror("Error", "Tier 2 threshold must be less than Tier 1 threshold!")
+        # Validate the tier table - thresholds must shrink from Tier 1 down
+        error = tier_error(tiers)
+        if error:
+            messagebox.showerror("Error", error)
             return
+        table = FeedrateTable(tiers, default_feedrate)
         
         # Check taper settings
         apply_taper = False
@@ -434,12 +867,9 @@ class GCodeProcessor:
                 small_diameter = float(self.small_diameter_var.get())
                 length = float(self.length_var.get())
                 
-                if large_diameter <= 0 or small_diameter <= 0 or length <= 0:
-                    messagebox.showerror("Error", "All taper values must be positive!")
-                    return
-                
-                if small_diameter >= large_diameter:
-                    messagebox.showerror("Error", "Small diameter must be less than large diameter!")
+                error = taper_error(large_diameter, small_diameter, length)
+                if error:
+                    messagebox.showerror("Error", error)
                     return
                 
                 apply_taper = True
@@ -454,178 +884,253 @@ class GCodeProcessor:
                 messagebox.showerror("Error", "Invalid taper values!")
                 return
         
-        self.log_text.delete(1.0, tk.END)
+        # Or a profile table instead
+        try:
+            taper_profile = self.read_taper_profile()
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid taper profile:\n{e}")
+            return
+        if taper_profile is not None:
+            error = taper_error(*((large_diameter, small_diameter, length) if apply_taper else (None,) * 3),
+                                taper_profile.points)
+            if error:
+                messagebox.showerror("Error", error)
+                return
+            apply_taper = True
+        
+        # Generate output filename
+        base, ext = os.path.splitext(self.selected_file)
+        output_file = f"{base}_modified{ext}"
+        
+        # The detail log gets everything from here on, including every rewritten line
+        detail_file = f"{base}_modified.log" if self.detail_log_var.get() else None
+        if detail_file:
+            try:
+                self.log_buffer.open_file(detail_file)
+            except OSError as e:
+                messagebox.showerror("Error", f"Can't write the detail log:\n{e}")
+                return
+        
+        self.clear_log()
         self.log_message("=" * 70)
         self.log_message("Starting GCode processing...")
         self.log_message(f"Default Feedrate: F{default_feedrate}")
-        self.log_message(f"Tier 1: A-axis ≤ {threshold1}° → F{feedrate1}")
-        self.log_message(f"Tier 2: A-axis ≤ {threshold2}° → F{feedrate2}")
-        if apply_taper:
+        for line in table.describe():
+            self.log_message(line)
+        if taper_profile is not None:
+            self.log_message(taper_profile.describe())
+        elif apply_taper:
             self.log_message(f"Taper: {large_diameter} → {small_diameter} over length {length}")
+        fixed_point = self.fixed_point_var.get()
+        if fixed_point:
+            self.log_message("Numbers: fixed point (whole 0.0001 units)")
+        if detail_file:
+            self.log_message(f"Detail log: {os.path.basename(detail_file)}")
         self.log_message("=" * 70)
         
+        
+        # Use the vectorized engine when NumPy is installed (same output either way)
+        engine_name = 'numpy' if numpy_available() else 'stream'
         try:
-            # Read input file
-            with open(self.selected_file, 'r') as f:
-                lines = f.readlines()
-            
-            # Reset state
-            self.previous_a_value = None
-            self.current_motion_mode = None
-            
-            # First pass: parse all lines and extract A-axis values
-            parsed_lines = []
-            for line in lines:
-                original_line = line.rstrip('\n')
-                parsed = self.parse_gcode_line(original_line)
-                parsed_lines.append({
-                    'original': line,
-                    'parsed': parsed,
-                    'has_explicit_g1': bool(re.match(r'G0*1', original_line.strip(), re.IGNORECASE))
-                })
-            
-            # Second pass: process and modify lines
-            modified_lines = []
-            modifications_count = 0
-            tier1_count = 0
-            tier2_count = 0
-            default_count = 0
-            taper_count = 0
-            previous_a_for_comparison = None
-            current_modal_z = 0.0  # Track the current Z depth from G1Z commands
-            
-            for i, line_data in enumerate(parsed_lines):
-                parsed = line_data['parsed']
-                original_line = line_data['original'].rstrip('\n')
-                has_explicit_g1 = line_data['has_explicit_g1']
-                
-                # Update modal Z if this line sets a new Z depth
-                if parsed and parsed['Z'] is not None and parsed['X'] is None and parsed['Y'] is None:
-                    # This is a Z-only move (like G1Z-0.0071), update modal Z
-                    current_modal_z = parsed['Z']
-                
-                should_modify = False
-                a_change = 0
-                
-                # Check if this line should be modified
-                if parsed:
-                    # ONLY process lines that have an explicit A-axis value in them
-                    if parsed['A'] is not None:
-                        current_a = parsed['A']
-                        compare_a = None
-                        
-                        # Determine which A value to compare against
-                        if has_explicit_g1:
-                            # New G1 command - look forward to next A value
-                            next_a = None
-                            for j in range(i + 1, len(parsed_lines)):
-                                if parsed_lines[j]['parsed'] and parsed_lines[j]['parsed']['A'] is not None:
-                                    next_a = parsed_lines[j]['parsed']['A']
-                                    break
-                            
-                            if next_a is not None:
-                                a_change = abs(current_a - next_a)
-                                compare_a = next_a
-                        else:
-                            # Modal G1 command - look backward to previous A value
-                            if previous_a_for_comparison is not None:
-                                a_change = abs(current_a - previous_a_for_comparison)
-                                compare_a = previous_a_for_comparison
-                        
-                        # Check if we should modify
-                        if compare_a is not None and a_change <= threshold2:
-                            should_modify = True
-                        
-                        # Update previous A value for next iteration
-                        previous_a_for_comparison = current_a
-                
-                # Apply modification if needed
-                line_to_output = original_line
-                
-                # For lines with A-axis, always set explicit feedrate based on tiers
-                if parsed and parsed['A'] is not None and compare_a is not None:
-                    # Determine which tier this falls into
-                    if a_change <= threshold2:
-                        # Tier 2: Smallest changes, slowest feedrate
-                        line_to_output = re.sub(r'F[+-]?\d+\.?\d*', '', line_to_output, flags=re.IGNORECASE).strip()
-                        line_to_output = f"{line_to_output} F{feedrate2}"
-                        modifications_count += 1
-                        tier2_count += 1
-                    elif a_change <= threshold1:
-                        # Tier 1: Medium changes, medium feedrate
-                        line_to_output = re.sub(r'F[+-]?\d+\.?\d*', '', line_to_output, flags=re.IGNORECASE).strip()
-                        line_to_output = f"{line_to_output} F{feedrate1}"
-                        modifications_count += 1
-                        tier1_count += 1
-                    else:
-                        # Above threshold1: Large changes, default feedrate
-                        line_to_output = re.sub(r'F[+-]?\d+\.?\d*', '', line_to_output, flags=re.IGNORECASE).strip()
-                        line_to_output = f"{line_to_output} F{default_feedrate}"
-                        default_count += 1
-                
-                # Apply taper if needed (can be combined with feedrate modification)
-                if apply_taper and parsed and parsed['X'] is not None:
-                    x_val = parsed['X']
-                    # Calculate Z adjustment based on X position
-                    # At X=length (large end): Z adjustment = 0 (no change)
-                    # At X=0 (small end): Z adjustment = -radius_diff (deeper cut)
-                    # Formula: as X decreases toward 0, Z goes more negative (deeper)
-                    z_adjustment = -radius_diff * (1.0 - (x_val / length))
-                    
-                    # Calculate the actual Z position: modal Z + taper adjustment
-                    actual_z = current_modal_z + z_adjustment
-                    
-                    # Modify the Z value if present, or add it if not
-                    if parsed['Z'] is not None:
-                        # Line already has Z, add adjustment to it
-                        new_z = parsed['Z'] + z_adjustment
-                        line_to_output = re.sub(r'Z[+-]?\d+\.?\d*', f'Z{new_z:.4f}', line_to_output, flags=re.IGNORECASE)
-                    else:
-                        # Add Z value after the X value (modal Z + taper adjustment)
-                        line_to_output = re.sub(r'(X[+-]?\d+\.?\d*)', rf'\1Z{actual_z:.4f}', line_to_output, flags=re.IGNORECASE)
-                    
-                    taper_count += 1
-                
-                modified_lines.append(line_to_output + '\n' if not line_to_output.endswith('\n') else line_to_output)
-            
-            # Generate output filename
-            base, ext = os.path.splitext(self.selected_file)
-            output_file = f"{base}_modified{ext}"
-            
-            # Write output file
-            with open(output_file, 'w') as f:
-                f.writelines(modified_lines)
+            cone = apply_taper and taper_profile is None
+            engine = create_engine(engine_name, default_feedrate=default_feedrate, tiers=tiers,
+                                   large_diameter=large_diameter if cone else None,
+                                   small_diameter=small_diameter if cone else None,
+                                   length=length if cone else None,
+                                   taper_profile=taper_profile.points if taper_profile else None,
+                                   taper_offset=taper_profile.offset if taper_profile else None,
+                                   taper_reverse=taper_profile.reverse if taper_profile else None,
+                                   fixed_point=fixed_point)
+        except Exception as e:
+            self.log_buffer.close_file()
+            self.log_message(f"✗ ERROR: {str(e)}", 'error')
+            messagebox.showerror("Error", f"An error occurred:\n{str(e)}")
+            return
+        if detail_file:
+            engine.detail = self.log_message
+        
+        # Everything the summary needs once the worker finishes
+        self.job = {
+            'input_file': self.selected_file,
+            'output_file': output_file,
+            'total_chars': max(os.path.getsize(self.selected_file), 1),
+            'start_time': time.perf_counter(),
+            'last_progress': 0.0,
+            'table': table,
+            'apply_taper': apply_taper,
+            'engine_name': 'fixed' if fixed_point else engine_name,
+            'stage_stats': self.stage_stats_var.get(),
+            'rapid_rate': rapid_rate,
+            'cycle_time': self.cycle_time_var.get(),
+        }
+        self.cancel_event.clear()
+        self.run_btn.config(state=tk.DISABLED)
+        self.cancel_btn.config(state=tk.NORMAL)
+        self.progress_bar.config(value=0)
+        self.progress_label.config(text="Starting...")
+        
+        self.job['thread'] = threading.Thread(target=self.run_job, args=(engine, self.job), daemon=True)
+        self.job['thread'].start()
+        self.root.after(100, self.poll_job)
+    
+    def run_job(self, engine, job):
+        """Worker thread: run the engine and report back through job_queue."""
+        def report_progress(lines_done, chars_done):
+            if self.cancel_event.is_set():
+                raise ProcessingCancelled()
+            # Throttle progress messages to ~10 per second
+            now = time.perf_counter()
+            if now - job['last_progress'] >= 0.1:
+                job['last_progress'] = now
+                self.job_queue.put(('progress', lines_done, chars_done, now - job['start_time']))
+        
+        try:
+            # Read ahead and write behind on background threads, so a slow drive overlaps processing
+            with open(job['input_file'], 'r') as f_in, open_output(job['output_file']) as f_out, \
+                    Pipeline(f_in, f_out) as pipe:
+                if job['stage_stats']:
+                    with Instrumentation(engine, job['engine_name']) as probe:
+                        stats = engine.process_lines(track_progress(probe.lines(pipe.lines), report_progress),
+                                                     probe.writer(pipe.out))
+                    report = probe.report(stats, job['input_file'])
+                else:
+                    stats = engine.process_lines(track_progress(pipe.lines, report_progress), pipe.out)
+                    report = run_report(stats, time.perf_counter() - job['start_time'],
+                                        job['engine_name'], job['input_file'])
+            report['cycle_time'] = self.estimate_cycle_time(job) if job['cycle_time'] else None
+            self.job_queue.put(('done', stats, report))
+        except ProcessingCancelled:
+            # Don't leave a half-written program behind
+            if os.path.exists(job['output_file']):
+                os.remove(job['output_file'])
+            self.job_queue.put(('cancelled',))
+        except Exception as e:
+            self.job_queue.put(('error', str(e)))
+    
+    def estimate_cycle_time(self, job):
+        """Worker thread: compare_files() for the finished job, or None if it's cancelled.
+        
+        The output is complete by now, so Cancel only skips the estimate.
+        """
+        total_chars = job['total_chars'] + max(os.path.getsize(job['output_file']), 1)
+        def report_progress(lines_done, chars_done):
+            if self.cancel_event.is_set():
+                raise ProcessingCancelled()
+            now = time.perf_counter()
+            if now - job['last_progress'] >= 0.1:
+                job['last_progress'] = now
+                self.job_queue.put(('estimating', chars_done / total_chars))
+        
+        try:
+            return compare_files(job['input_file'], job['output_file'], job['rapid_rate'], progress=report_progress)
+        except ProcessingCancelled:
+            return None
+    
+    def cancel_job(self):
+        if self.job is not None:
+            self.cancel_event.set()
+            self.cancel_btn.config(state=tk.DISABLED)
+            self.progress_label.config(text="Cancelling...")
+    
+    def poll_job(self):
+        """Drain messages from the worker; reschedules itself until the job ends."""
+        while self.job is not None:
+            try:
+                message = self.job_queue.get_nowait()
+            except queue.Empty:
+                break
             
-            self.log_message("=" * 70)
-            self.log_message(f"✓ Processing complete!", 'success')
-            self.log_message(f"Total lines processed: {len(lines)}")
+            kind = message[0]
+            if kind == 'progress':
+                self.show_progress(*message[1:])
+            elif kind == 'estimating':
+                self.progress_bar.config(value=min(100.0, 100.0 * message[1]))
+                if not self.cancel_event.is_set():
+                    self.progress_label.config(text=f"Estimating cycle time • {min(100.0, 100.0 * message[1]):.0f}%")
+            elif kind == 'done':
+                self.finish_job(message[1], message[2])
+            elif kind == 'cancelled':
+                self.log_message("✗ Processing cancelled - no output written", 'error')
+                self.end_job("Cancelled")
+            elif kind == 'error':
+                self.log_message(f"✗ ERROR: {message[1]}", 'error')
+                self.end_job("Failed")
+                messagebox.showerror("Error", f"An error occurred:\n{message[1]}")
+        
+        if self.job is not None:
+            self.root.after(100, self.poll_job)
+    
+    def show_progress(self, lines_done, chars_done, elapsed):
+        percent = min(100.0, 100.0 * chars_done / self.job['total_chars'])
+        rate = lines_done / elapsed if elapsed > 0 else 0
+        # ETA from the fraction of the file read so far
+        eta = elapsed * (self.job['total_chars'] - chars_done) / chars_done if chars_done else 0
+        minutes, seconds = divmod(int(max(eta, 0)), 60)
+        self.progress_bar.config(value=percent)
+        self.progress_label.config(text=f"{lines_done:,} lines • {rate:,.0f} lines/sec • ETA {minutes}:{seconds:02d}")
+    
+    def end_job(self, status):
+        self.job = None
+        self.log_buffer.close_file()
+        self.flush_log()
+        self.run_btn.config(state=tk.NORMAL if self.selected_file else tk.DISABLED)
+        self.cancel_btn.config(state=tk.DISABLED)
+        self.progress_label.config(text=status)
+    
+    def finish_job(self, stats, report):
+        job = self.job
+        elapsed = time.perf_counter() - job['start_time']
+        self.progress_bar.config(value=100)
+        
+        output_file = job['output_file']
+        tier_counts = stats['tier_counts']
+        modifications_count = stats['modifications_count']
+        taper_count = stats['taper_count']
+        
+        self.log_message("=" * 70)
+        self.log_message(f"✓ Processing complete!", 'success')
+        self.log_message(f"Total lines processed: {stats['total_lines']}")
+        self.log_message("")
+        self.log_message("Feedrate Modifications:", 'info')
+        for line in job['table'].summary(tier_counts):
+            self.log_message(f"  • {line}")
+        self.log_message(f"  • Total feedrate changes: {modifications_count}", 'info')
+        if job['apply_taper']:
             self.log_message("")
-            self.log_message("Feedrate Modifications:", 'info')
-            self.log_message(f"  • Tier 2 (≤ {threshold2}°): {tier2_count} lines → F{feedrate2}")
-            self.log_message(f"  • Tier 1 (≤ {threshold1}°): {tier1_count} lines → F{feedrate1}")
-            self.log_message(f"  • Default (> {threshold1}°): {default_count} lines → F{default_feedrate}")
-            self.log_message(f"  • Total feedrate changes: {modifications_count}", 'info')
-            if apply_taper:
-                self.log_message("")
-                self.log_message(f"Taper: {taper_count} X-axis moves adjusted", 'info')
+            self.log_message(f"Taper: {taper_count} X-axis moves adjusted", 'info')
+        cycle_time = report['cycle_time']
+        if cycle_time is not None:
             self.log_message("")
-            self.log_message(f"Output file: {os.path.basename(output_file)}", 'success')
-            self.log_message("=" * 70)
-            
-            summary = f"Processing complete!\n\n"
-            summary += f"Feedrate Modifications:\n"
-            summary += f"  • Tier 2: {tier2_count} lines\n"
-            summary += f"  • Tier 1: {tier1_count} lines\n"
-            summary += f"  • Default: {default_count} lines\n"
-            if apply_taper:
-                summary += f"\nTaper: {taper_count} X-axis moves\n"
-            summary += f"\nOutput saved to:\n{output_file}"
-            
-            messagebox.showinfo("Success", summary)
+            self.log_message("Cycle Time (estimated):", 'info')
+            for line in comparison_lines(cycle_time):
+                self.log_message(f"  • {line}")
+        elif job['cycle_time']:
+            self.log_message("")
+            self.log_message("Cycle time estimate cancelled", 'error')
+        self.log_message("")
+        self.log_message(f"Performance ({report['engine']} engine):", 'info')
+        for line in report_lines(report):
+            self.log_message(f"  • {line}")
+        self.log_message("")
+        self.log_message(f"Output file: {os.path.basename(output_file)}", 'success')
+        self.log_message("=" * 70)
+        self.end_job(f"Done: {stats['total_lines']:,} lines in {elapsed:.1f} s")
         
-        except Exception as e:
-            self.log_message(f"✗ ERROR: {str(e)}", 'error')
-            messagebox.showerror("Error", f"An error occurred:\n{str(e)}")
+        summary = f"Processing complete!\n\n"
+        summary += f"Feedrate Modifications:\n"
+        for tier in range(len(job['table']), 0, -1):
+            summary += f"  • Tier {tier}: {tier_counts[tier]} lines\n"
+        summary += f"  • Default: {tier_counts[0]} lines\n"
+        if job['apply_taper']:
+            summary += f"\nTaper: {taper_count} X-axis moves\n"
+        if cycle_time is not None:
+            delta = cycle_time['delta_minutes']
+            summary += (f"\nCycle time: {format_minutes(cycle_time['input']['minutes'])} → "
+                        f"{format_minutes(cycle_time['output']['minutes'])} "
+                        f"({'+' if delta >= 0 else ''}{format_minutes(delta)})\n")
+        summary += f"\nOutput saved to:\n{output_file}"
+        
+        messagebox.showinfo("Success", summary)
 
 
 def main():
@@ -2,81 +2,91 @@
 """
 Command-line version of GCode processor for testing
 Usage: python3 gcode_processor_cli.py input_file.tap [threshold] [feedrate]
+       python3 gcode_processor_cli.py batch <files|folders|globs|manifest>... [options]
+       python3 gcode_processor_cli.py serve [options]
+       python3 gcode_processor_cli.py watch <folders>... [options]
 """
 
 import sys
-import re
 import os
+import socket
+import time
+from contextlib import nullcontext, redirect_stdout
+
+from gcode_batch import SETTING_DEFAULTS, clean_settings, expand_inputs, load_manifest, output_path_for, run_batch
+from gcode_cache import DEFAULT_CACHE_SIZE, ResultCache
+from gcode_columnar import create_engine, numpy_available
+from gcode_cycletime import DEFAULT_RAPID_RATE, compare_files, comparison_lines
+from gcode_daemon import DEFAULT_HOST, DEFAULT_PORT, serve
+from gcode_engine import (FeedrateTable, TaperProfile, decimate_error, open_input, open_output, parse_taper_profile,
+                          parse_tiers, taper_error, tier_error)
+from gcode_parallel import process_file_parallel
+from gcode_pipeline import PIPELINE_DEPTH, Pipeline
+from gcode_stats import Instrumentation, profile_call, report_lines, run_report, write_report_json
+from gcode_watch import watch
 
 
 class GCodeProcessorCLI:
-    def __init__(self):
-        self.previous_a_value = None
-        self.current_motion_mode = None
-    
-    def extract_axis_value(self, line, axis):
-        """Extract the value for a specific axis from a GCode line."""
-        pattern = rf'{axis}([+-]?\d+\.?\d*)'
-        match = re.search(pattern, line, re.IGNORECASE)
-        if match:
-            return float(match.group(1))
-        return None
-    
-    def parse_gcode_line(self, line):
-        """Parse a GCode line and extract relevant information."""
-        # Remove comments
-        line = re.sub(r'\(.*?\)', '', line).strip()
+    def process_file(self, input_file, threshold1=1.5, feedrate1=100, threshold2=0.5, feedrate2=50, default_feedrate=380, large_diameter=None, small_diameter=None, length=None, engine='stream', workers=None, tiers=None, stats_mode=None, profile=None, output_file=None, decimate=None, cycle_time=False, rapid_rate=DEFAULT_RAPID_RATE, block_rate=None, taper_profile=None, taper_offset=None, taper_reverse=False, pipeline=None, fixed_point=False):
+        """Process the GCode file with the 'stream', 'numpy' or 'mmap' engine.
         
-        # Update motion mode if G command is present
-        # G0 or G00 = rapid positioning (not followed by 1-9)
-        if re.match(r'G0+(?![1-9])', line, re.IGNORECASE):
-            self.current_motion_mode = 'G0'
-            return None
+        input_file and output_file may be '-' for stdin/stdout, and either end
+        may be .gz/.xz/.bz2 compressed. output_file defaults to
+        <base>_modified<ext> in the current directory (stdout for stdin).
         
-        # G1 or G01 = linear interpolation
-        if re.match(r'G0*1', line, re.IGNORECASE):
-            self.current_motion_mode = 'G1'
+        tiers is a list of (threshold, feedrate) pairs, Tier 1 first; it replaces
+        the two-tier arguments. With workers > 1 the file is split at G0 rapids
+        and processed on that many cores. pipeline is a queue depth: the file
+        is read ahead and written behind on background threads, with at most
+        that many blocks waiting each way (None = off).
         
-        # Only process lines when in G1 mode
-        if self.current_motion_mode != 'G1':
-            return None
+        decimate is a tolerance for merging runs of collinear G1 moves before
+        tiering (None = off).
+        
+        taper_profile is a list of (x, diameter) points to taper to instead of
+        the large_diameter/small_diameter/length cone, shifted along X by
+        taper_offset and run towards -X if taper_reverse.
+        
+        fixed_point runs the integer-unit engine (gcode_fixed.py) instead of
+        the named one.
         
-        # Extract axis values
-        x = self.extract_axis_value(line, 'X')
-        y = self.extract_axis_value(line, 'Y')
-        z = self.extract_axis_value(line, 'Z')
-        a = self.extract_axis_value(line, 'A')
-        f = self.extract_axis_value(line, 'F')
+        cycle_time adds an estimated machine time for the input and the output
+        (rapids at rapid_rate, optionally at most block_rate blocks/sec). Both
+        files are read again after processing, so it's never in the stats
+        report's timings or peak memory - only in its cycle_time entry.
         
-        # Only process if there are actual axis moves
-        if all(v is None for v in [x, y, z, a]):
+        stats_mode 'text' or 'json' adds a per-stage performance report (printed,
+        or written to a file if it ends in .json). profile is a file prefix for
+        cProfile (.prof) and collapsed-stack (.folded) output.
+        """
+        if tiers is None:
+            tiers = [(threshold1, feedrate1), (threshold2, feedrate2)]
+        error = tier_error(tiers) or decimate_error(decimate)
+        if error:
+            print(f"ERROR: {error}")
             return None
+        table = FeedrateTable(tiers, default_feedrate)
         
-        return {'X': x, 'Y': y, 'Z': z, 'A': a, 'F': f, 'original': line}
-    
-    def process_file(self, input_file, threshold1=1.5, feedrate1=100, threshold2=0.5, feedrate2=50, default_feedrate=380, large_diameter=None, small_diameter=None, length=None):
-        """Process the GCode file."""
         print("=" * 80)
         print("GCode A-Axis Feedrate Adjuster - Command Line Version")
         print("=" * 80)
-        print(f"Input file: {input_file}")
+        print(f"Input file: {'stdin' if input_file == '-' else input_file}")
         print(f"Default Feedrate: F{default_feedrate}")
-        print(f"Tier 1: A-axis ≤ {threshold1}° → F{feedrate1}")
-        print(f"Tier 2: A-axis ≤ {threshold2}° → F{feedrate2}")
+        for line in table.describe():
+            print(line)
         
         # Check taper settings
         apply_taper = False
         radius_diff = 0
         
-        if large_diameter is not None and small_diameter is not None and length is not None:
-            if large_diameter <= 0 or small_diameter <= 0 or length <= 0:
-                print("ERROR: All taper values must be positive!")
-                return None
-            
-            if small_diameter >= large_diameter:
-                print("ERROR: Small diameter must be less than large diameter!")
-                return None
-            
+        error = taper_error(large_diameter, small_diameter, length, taper_profile)
+        if error:
+            print(f"ERROR: {error}")
+            return None
+        if taper_profile is not None:
+            apply_taper = True
+            print(TaperProfile(taper_profile, taper_offset or 0.0, taper_reverse).describe())
+        elif large_diameter is not None and small_diameter is not None and length is not None:
             apply_taper = True
             large_radius = large_diameter / 2.0
             small_radius = small_diameter / 2.0
@@ -86,166 +96,95 @@ class GCodeProcessorCLI:
             print(f"Radius difference: {radius_diff}")
             print(f"Z adjustment rate: {radius_diff/length:.6f} per X unit")
         
-        print("=" * 80)
+        if decimate:
+            print(f"Decimation: collinear G1 moves merged within {decimate}")
+        if fixed_point:
+            print("Numbers: fixed point (whole 0.0001 units)")
+        if pipeline:
+            print(f"Pipeline: read ahead and written behind, {pipeline} blocks each way")
         
-        # Read input file
-        with open(input_file, 'r') as f:
-            lines = f.readlines()
-        
-        # Reset state
-        self.previous_a_value = None
-        self.current_motion_mode = None
-        
-        # First pass: parse all lines and extract A-axis values
-        parsed_lines = []
-        for line in lines:
-            original_line = line.rstrip('\n')
-            parsed = self.parse_gcode_line(original_line)
-            parsed_lines.append({
-                'original': line,
-                'parsed': parsed,
-                'has_explicit_g1': bool(re.match(r'G0*1', original_line.strip(), re.IGNORECASE))
-            })
+        print("=" * 80)
         
-        # Second pass: process and modify lines
-        modified_lines = []
-        modifications_count = 0
-        tier1_count = 0
-        tier2_count = 0
-        default_count = 0
-        taper_count = 0
-        modification_details = []
-        previous_a_for_comparison = None
-        current_modal_z = 0.0  # Track the current Z depth from G1Z commands
+        # Generate output filename - write to current directory
+        if output_file is None:
+            output_file = '-' if input_file == '-' else output_path_for(input_file, '')
         
-        for i, line_data in enumerate(parsed_lines):
-            parsed = line_data['parsed']
-            original_line = line_data['original'].rstrip('\n')
-            has_explicit_g1 = line_data['has_explicit_g1']
-            
-            # Update modal Z if this line sets a new Z depth
-            if parsed and parsed['Z'] is not None and parsed['X'] is None and parsed['Y'] is None:
-                # This is a Z-only move (like G1Z-0.0071), update modal Z
-                current_modal_z = parsed['Z']
-            
-            should_modify = False
-            a_change = 0
-            
-            # Check if this line should be modified
-            if parsed:
-                # ONLY process lines that have an explicit A-axis value in them
-                if parsed['A'] is not None:
-                    current_a = parsed['A']
-                    compare_a = None
-                    
-                    # Determine which A value to compare against
-                    if has_explicit_g1:
-                        # New G1 command - look forward to next A value
-                        next_a = None
-                        for j in range(i + 1, len(parsed_lines)):
-                            if parsed_lines[j]['parsed'] and parsed_lines[j]['parsed']['A'] is not None:
-                                next_a = parsed_lines[j]['parsed']['A']
-                                break
-                        
-                        if next_a is not None:
-                            a_change = abs(current_a - next_a)
-                            compare_a = next_a
-                    else:
-                        # Modal G1 command - look backward to previous A value
-                        if previous_a_for_comparison is not None:
-                            a_change = abs(current_a - previous_a_for_comparison)
-                            compare_a = previous_a_for_comparison
-                    
-                    # Update previous A value for next iteration
-                    previous_a_for_comparison = current_a
-            
-            # Apply modification if needed
-            line_to_output = original_line
-            
-            # For lines with A-axis, always set explicit feedrate based on tiers
-            if parsed and parsed['A'] is not None and compare_a is not None:
-                # Determine which tier this falls into
-                if a_change <= threshold2:
-                    # Tier 2: Smallest changes, slowest feedrate
-                    line_to_output = re.sub(r'F[+-]?\d+\.?\d*', '', line_to_output, flags=re.IGNORECASE).strip()
-                    line_to_output = f"{line_to_output} F{feedrate2}"
-                    modifications_count += 1
-                    tier2_count += 1
-                    if modifications_count <= 10:
-                        modification_details.append({
-                            'line': i + 1,
-                            'a_change': a_change,
-                            'tier': 2,
-                            'feedrate': feedrate2,
-                            'original': original_line,
-                            'modified': line_to_output
-                        })
-                elif a_change <= threshold1:
-                    # Tier 1: Medium changes, medium feedrate
-                    line_to_output = re.sub(r'F[+-]?\d+\.?\d*', '', line_to_output, flags=re.IGNORECASE).strip()
-                    line_to_output = f"{line_to_output} F{feedrate1}"
-                    modifications_count += 1
-                    tier1_count += 1
-                    if modifications_count <= 10:
-                        modification_details.append({
-                            'line': i + 1,
-                            'a_change': a_change,
-                            'tier': 1,
-                            'feedrate': feedrate1,
-                            'original': original_line,
-                            'modified': line_to_output
-                        })
-                else:
-                    # Above threshold1: Large changes, default feedrate
-                    line_to_output = re.sub(r'F[+-]?\d+\.?\d*', '', line_to_output, flags=re.IGNORECASE).strip()
-                    line_to_output = f"{line_to_output} F{default_feedrate}"
-                    default_count += 1
-            
-            # Apply taper if needed (can be combined with feedrate modification)
-            if apply_taper and parsed and parsed['X'] is not None:
-                x_val = parsed['X']
-                # Calculate Z adjustment based on X position
-                # At X=length (large end): Z adjustment = 0 (no change)
-                # At X=0 (small end): Z adjustment = -radius_diff (deeper cut)
-                # Formula: as X decreases toward 0, Z goes more negative (deeper)
-                z_adjustment = -radius_diff * (1.0 - (x_val / length))
-                
-                # Calculate the actual Z position: modal Z + taper adjustment
-                actual_z = current_modal_z + z_adjustment
-                
-                # Modify the Z value if present, or add it if not
-                if parsed['Z'] is not None:
-                    # Line already has Z, add adjustment to it
-                    new_z = parsed['Z'] + z_adjustment
-                    line_to_output = re.sub(r'Z[+-]?\d+\.?\d*', f'Z{new_z:.4f}', line_to_output, flags=re.IGNORECASE)
-                else:
-                    # Add Z value after the X value (modal Z + taper adjustment)
-                    line_to_output = re.sub(r'(X[+-]?\d+\.?\d*)', rf'\1Z{actual_z:.4f}', line_to_output, flags=re.IGNORECASE)
-                
-                taper_count += 1
-            
-            modified_lines.append(line_to_output + '\n' if not line_to_output.endswith('\n') else line_to_output)
+        # Stream the file through the shared engine
+        settings = {
+            'tiers': table.tiers,
+            'default_feedrate': default_feedrate,
+            'large_diameter': large_diameter, 'small_diameter': small_diameter, 'length': length,
+            'decimate': decimate,
+            'taper_profile': taper_profile, 'taper_offset': taper_offset, 'taper_reverse': taper_reverse,
+            'fixed_point': fixed_point,
+        }
+        def run():
+            if workers and workers > 1:
+                return process_file_parallel(input_file, output_file, settings, workers, engine), None
+            processor = create_engine(engine, **settings)
+            if pipeline:
+                with open_input(input_file) as f_in, open_output(output_file) as f_out, \
+                        Pipeline(f_in, f_out, pipeline) as pipe:
+                    if not stats_mode:
+                        return processor.process_lines(pipe.lines, pipe.out), None
+                    # 'read' and 'write' are then the time spent waiting on the I/O threads
+                    with Instrumentation(processor, engine) as probe:
+                        stats = processor.process_lines(probe.lines(pipe.lines), probe.writer(pipe.out))
+                    return stats, probe
+            if not stats_mode:
+                return processor.process_file(input_file, output_file), None
+            if engine == 'mmap':
+                # The mapped engine reads and writes for itself, so that time is in 'loop'
+                with Instrumentation(processor, engine) as probe:
+                    stats = processor.process_file(input_file, output_file)
+                return stats, probe
+            with open_input(input_file) as f_in, open_output(output_file) as f_out:
+                with Instrumentation(processor, engine) as probe:
+                    stats = processor.process_lines(probe.lines(f_in), probe.writer(f_out))
+            return stats, probe
         
-        # Generate output filename - write to current directory
-        input_basename = os.path.basename(input_file)
-        base, ext = os.path.splitext(input_basename)
-        output_file = f"{base}_modified{ext}"
+        start = time.perf_counter()
+        if profile:
+            (stats, probe), profile_summary = profile_call(run, profile)
+        else:
+            stats, probe = run()
+        elapsed = time.perf_counter() - start
+        modifications_count = stats['modifications_count']
+        taper_count = stats['taper_count']
+        modification_details = stats['modification_details']
         
-        # Write output file
-        with open(output_file, 'w') as f:
-            f.writelines(modified_lines)
+        # Taken now, so the cycle time estimate below isn't in the timings or peak memory
+        report = None
+        if stats_mode:
+            if probe is not None:
+                report = probe.report(stats, input_file)
+            else:
+                # Parallel run: the stages happen in worker processes, so only the totals
+                report = run_report(stats, elapsed, f"{engine} x{workers}", input_file)
         
         # Print summary
         print(f"\nProcessing complete!")
-        print(f"Total lines: {len(lines)}")
+        print(f"Total lines: {stats['total_lines']}")
+        if 'decimation' in stats:
+            print(decimation_summary(stats['decimation']))
         print(f"\nFeedrate Modifications:")
-        print(f"  • Tier 2 (≤ {threshold2}°): {tier2_count} lines → F{feedrate2}")
-        print(f"  • Tier 1 (≤ {threshold1}°): {tier1_count} lines → F{feedrate1}")
-        print(f"  • Default (> {threshold1}°): {default_count} lines → F{default_feedrate}")
+        for line in table.summary(stats['tier_counts']):
+            print(f"  • {line}")
         print(f"  • Total: {modifications_count} feedrate changes")
         if apply_taper:
             print(f"\nTaper: {taper_count} X-axis moves adjusted")
-        print(f"\nOutput file: {output_file}")
+        print(f"\nOutput file: {'stdout' if output_file == '-' else output_file}")
+        
+        # Machine time before and after - both files are read again, so not for pipes
+        comparison = None
+        if cycle_time:
+            print(f"\nCycle time (estimated):")
+            if '-' in (input_file, output_file):
+                print("  • Needs the input and output as files, not stdin/stdout")
+            else:
+                comparison = compare_files(input_file, output_file, rapid_rate, block_rate)
+                for line in comparison_lines(comparison):
+                    print(f"  • {line}")
         
         if modification_details:
             print(f"\nFirst {len(modification_details)} modifications:")
@@ -256,13 +195,522 @@ class GCodeProcessorCLI:
                 print(f"  Before: {mod['original']}")
                 print(f"  After:  {mod['modified']}")
         
+        if stats_mode:
+            report['cycle_time'] = comparison
+            print(f"\nPerformance:")
+            for line in report_lines(report):
+                print(f"  • {line}")
+        
+        if profile:
+            print(f"\nProfile: {profile}.prof (pstats) and {profile}.folded (collapsed stacks for flamegraphs)")
+            if workers and workers > 1:
+                print("  Note: only the main process is profiled in a --parallel run")
+            print(profile_summary.rstrip())
+        
         print("=" * 80)
+        
+        if stats_mode == 'json':
+            # main() sends the summary to stderr, so stdout is just the JSON - unless the program is on it
+            write_report_json(report, sys.stderr if output_file == '-' else sys.__stdout__)
+        elif stats_mode and stats_mode.endswith('.json'):
+            write_report_json(report, stats_mode)
+            print(f"Stats written to {stats_mode}")
         return output_file
 
 
+# Batch options that override the default settings, and the setting each one sets
+BATCH_SETTING_OPTIONS = {
+    'threshold1': 'threshold1',
+    'feedrate1': 'feedrate1',
+    'threshold2': 'threshold2',
+    'feedrate2': 'feedrate2',
+    'default-feedrate': 'default_feedrate',
+    'large-dia': 'large_diameter',
+    'small-dia': 'small_diameter',
+    'length': 'length',
+    'decimate': 'decimate',
+    'taper-profile': 'taper_profile',
+    'taper-offset': 'taper_offset',
+    'taper-reverse': 'taper_reverse',
+    'fixed-point': 'fixed_point',
+}
+
+
+def setting_option(settings, name, value):
+    """settings with one --name=value from BATCH_SETTING_OPTIONS applied (ValueError if it's invalid)."""
+    if name in ('taper-reverse', 'fixed-point') and value == '':
+        value = 'yes'  # A bare flag
+    return clean_settings({BATCH_SETTING_OPTIONS[name]: value}, settings)
+
+
+def decimation_summary(decimation):
+    """'Blocks: 13,138 → 4,211 (68.0% merged away, tolerance 0.001)'; tolerance may be None."""
+    before = decimation['blocks_before']
+    after = decimation['blocks_after']
+    merged = (before - after) / before if before else 0.0
+    tolerance = '' if decimation['tolerance'] is None else f", tolerance {decimation['tolerance']:g}"
+    return f"Blocks: {before:,} → {after:,} ({merged:.1%} merged away{tolerance})"
+
+
+def parse_options(args):
+    """Split args into positionals and a dict of --name=value options."""
+    positional = []
+    options = {}
+    for arg in args:
+        if arg.startswith('--'):
+            name, _, value = arg[2:].partition('=')
+            options[name] = value
+        else:
+            positional.append(arg)
+    return positional, options
+
+
+def check_engine(engine):
+    if engine not in ('stream', 'numpy', 'mmap'):
+        print(f"Error: Unknown engine '{engine}' (expected 'stream', 'numpy' or 'mmap')")
+        sys.exit(1)
+    
+    if engine == 'numpy' and not numpy_available():
+        print("Error: --engine=numpy needs numpy (pip install numpy)")
+        sys.exit(1)
+
+
+def batch_usage():
+    print("Usage: python3 gcode_processor_cli.py batch <file|folder|glob|manifest.json|manifest.csv>... [options]")
+    print("  Folders are scanned for .tap/.gcode/.nc/.ngc files (skipping _modified outputs)")
+    print("  Manifests list one job per entry: a 'file' plus any of the settings below")
+    print("Options:")
+    print("  --workers=N: Number of worker processes (default: one per CPU)")
+    print("  --output-dir=DIR: Where to write _modified files (default: current directory)")
+    print("  --engine=stream|numpy|mmap: Processing engine (default: stream)")
+    print("  --cache[=DIR]: Reuse outputs of files already processed with the same settings")
+    print(f"  --cache-size=MB: Cache size limit, least recently used evicted first (default: {DEFAULT_CACHE_SIZE >> 20})")
+    print("  --threshold1= --feedrate1= --threshold2= --feedrate2= --default-feedrate=")
+    print("  --tiers=1.5:100,0.5:50,0.2:25: Any number of threshold:feedrate tiers (replaces the two above)")
+    print("  --large-dia= --small-dia= --length=: Default settings for jobs that don't set their own")
+    print("  --taper-profile=FILE.csv|x:dia,... --taper-offset=X --taper-reverse: Taper profile table instead")
+    print("  --fixed-point: Integer 0.0001-unit numbers: exact tiers and taper Z, F50 not F50.0 (FIXED_POINT.md)")
+    print("  --decimate=TOL: Merge runs of collinear G1 moves within TOL before tiering")
+    print("\nExample: python3 gcode_processor_cli.py batch posted/ --workers=4 --threshold1=2 --feedrate1=120")
+
+
+def batch_main(inputs, options):
+    """Process many files in parallel and print an aggregate summary."""
+    if not inputs:
+        batch_usage()
+        sys.exit(1)
+    
+    defaults = dict(SETTING_DEFAULTS)
+    workers = None
+    output_dir = '.'
+    engine = 'stream'
+    cache_dir = None
+    cache_size = DEFAULT_CACHE_SIZE
+    try:
+        for name, value in options.items():
+            if name in BATCH_SETTING_OPTIONS:
+                defaults = setting_option(defaults, name, value)
+            elif name == 'tiers':
+                defaults['tiers'] = parse_tiers(value)
+            elif name == 'workers':
+                workers = int(value)
+                if workers < 1:
+                    raise ValueError("--workers must be at least 1")
+            elif name == 'output-dir':
+                output_dir = value
+            elif name == 'engine':
+                engine = value
+            elif name == 'cache':
+                cache_dir = value
+            elif name == 'cache-size':
+                cache_size = int(float(value) * (1 << 20))
+                if cache_size <= 0:
+                    raise ValueError("--cache-size must be more than 0 MB")
+            else:
+                raise ValueError(f"Unknown option '--{name}'")
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    check_engine(engine)
+    cache = None
+    if cache_dir is not None or 'cache-size' in options:
+        try:
+            cache = ResultCache(cache_dir or None, cache_size)
+        except OSError as e:
+            print(f"Error: Can't use the cache: {e}")
+            sys.exit(1)
+    
+    # Manifests bring their own settings; everything else uses the defaults
+    jobs = []
+    try:
+        manifests = [path for path in inputs if path.lower().endswith(('.json', '.csv'))]
+        for manifest in manifests:
+            jobs.extend(load_manifest(manifest, defaults))
+        others = [path for path in inputs if path not in manifests]
+        if others:
+            jobs.extend((input_file, dict(defaults)) for input_file in expand_inputs(others))
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    
+    if not jobs:
+        print("Error: No input files found!")
+        sys.exit(1)
+    
+    os.makedirs(output_dir, exist_ok=True)
+    
+    print("=" * 80)
+    print("GCode A-Axis Feedrate Adjuster - Batch Mode")
+    print("=" * 80)
+    print(f"Jobs: {len(jobs)}")
+    print(f"Workers: {workers or os.cpu_count()}")
+    print(f"Engine: {engine}")
+    print(f"Output folder: {os.path.abspath(output_dir)}")
+    if cache:
+        print(f"Cache: {os.path.abspath(cache.directory)} ({cache.max_bytes / (1 << 20):,g} MB)")
+    print("=" * 80)
+    
+    def on_result(result):
+        name = os.path.basename(result['input_file'])
+        if result['error']:
+            print(f"✗ {name}: {result['error']}")
+        else:
+            cached = " (cached)" if result.get('cache') == 'hit' else ""
+            print(f"✓ {name}: {result['stats']['total_lines']} lines in {result['elapsed']:.2f} s{cached}")
+    
+    try:
+        results, wall_time = run_batch(jobs, output_dir, workers, engine, on_result, cache)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    
+    # Aggregate summary - one column per tier, tightest first, for the most tiers any job used
+    tier_count = max((len(result['stats']['tier_counts']) - 1 for result in results if not result['error']), default=2)
+    tier_columns = list(range(tier_count, -1, -1))
+    tier_header = ''.join(f" {f'Tier {tier}' if tier else 'Default':>8}" for tier in tier_columns)
+    print("\n" + "-" * 80)
+    print(f"{'File':<30} {'Lines':>9}{tier_header} {'Taper':>8} {'Time (s)':>9}")
+    print("-" * 80)
+    total_lines = 0
+    total_counts = dict.fromkeys(tier_columns, 0)
+    total_taper = 0
+    busy_time = 0.0
+    failed = 0
+    for result in results:
+        name = os.path.basename(result['input_file'])[:30]
+        busy_time += result['elapsed']
+        if result['error']:
+            failed += 1
+            print(f"{name:<30} {'FAILED':>9}")
+            continue
+        stats = result['stats']
+        counts = stats['tier_counts']
+        total_lines += stats['total_lines']
+        total_taper += stats['taper_count']
+        for tier in counts:
+            total_counts[tier] += counts[tier]
+        tier_cells = ''.join(f" {counts.get(tier, 0):>8}" for tier in tier_columns)
+        print(f"{name:<30} {stats['total_lines']:>9}{tier_cells} {stats['taper_count']:>8} {result['elapsed']:>9.2f}")
+    print("-" * 80)
+    tier_cells = ''.join(f" {total_counts[tier]:>8}" for tier in tier_columns)
+    print(f"{'Total':<30} {total_lines:>9}{tier_cells} {total_taper:>8} {busy_time:>9.2f}")
+    print(f"\nFiles: {len(results) - failed} processed, {failed} failed")
+    if cache:
+        hits = sum(1 for result in results if result.get('cache') == 'hit')
+        misses = sum(1 for result in results if result.get('cache') == 'miss')
+        print(f"Cache: {hits} hits, {misses} misses")
+    decimated = [result['stats']['decimation'] for result in results
+                 if not result['error'] and 'decimation' in result['stats']]
+    if decimated:
+        tolerances = {decimation['tolerance'] for decimation in decimated}
+        print(decimation_summary({
+            'tolerance': tolerances.pop() if len(tolerances) == 1 else None,
+            'blocks_before': sum(decimation['blocks_before'] for decimation in decimated),
+            'blocks_after': sum(decimation['blocks_after'] for decimation in decimated),
+        }))
+    print(f"Wall time: {wall_time:.2f} s")
+    if wall_time > 0:
+        print(f"Throughput: {total_lines / wall_time:,.0f} lines/sec")
+    print("=" * 80)
+    return 1 if failed else 0
+
+
+def serve_usage():
+    print("Usage: python3 gcode_processor_cli.py serve [options]")
+    print("  Runs a local daemon with a warm worker pool; POST a program to /process to have it modified")
+    print("Options:")
+    print(f"  --host=ADDRESS --port=N: Where to listen for HTTP (default: {DEFAULT_HOST}:{DEFAULT_PORT})")
+    print("  --socket=PATH: Listen on a Unix socket instead")
+    print("  --workers=N: Number of worker processes (default: one per CPU)")
+    print("  --queue=N: Jobs that may wait for a worker before new ones get 503 (default: 2 per worker)")
+    print("  --engine=stream|numpy|mmap: Processing engine (default: stream)")
+    print("  --threshold1= --feedrate1= --threshold2= --feedrate2= --default-feedrate=")
+    print("  --tiers=1.5:100,0.5:50,0.2:25 --large-dia= --small-dia= --length= --decimate=: Default settings")
+    print("  --taper-profile= --taper-offset= --taper-reverse: Default taper profile table")
+    print("  --fixed-point: Integer 0.0001-unit numbers by default (see FIXED_POINT.md)")
+    print("Requests:")
+    print("  POST /process?threshold1=2&feedrate1=120&large_diameter=1.25&...  (manifest column names)")
+    print("       body: the program (Content-Encoding: gzip accepted); reply: the modified program,")
+    print("       stats as JSON in the X-GCode-Stats header; 503 + Retry-After when busy")
+    print("       taper_profile=0:1.0,6:1.25 takes the points only - files named in a request aren't opened")
+    print("  GET /status: worker, queue and job counters as JSON")
+    print(f"\nExample: curl --data-binary @part.tap -o part_modified.tap 'http://{DEFAULT_HOST}:{DEFAULT_PORT}/process?threshold1=2'")
+
+
+def serve_main(args, options):
+    """Run the processing daemon until Ctrl+C."""
+    if args:
+        serve_usage()
+        sys.exit(1)
+    
+    defaults = dict(SETTING_DEFAULTS)
+    host = DEFAULT_HOST
+    port = DEFAULT_PORT
+    socket_path = None
+    workers = None
+    queue_size = None
+    engine = 'stream'
+    try:
+        for name, value in options.items():
+            if name in BATCH_SETTING_OPTIONS:
+                defaults = setting_option(defaults, name, value)
+            elif name == 'tiers':
+                defaults['tiers'] = parse_tiers(value)
+            elif name == 'host':
+                host = value
+            elif name == 'port':
+                port = int(value)
+            elif name == 'socket':
+                socket_path = value
+            elif name == 'workers':
+                workers = int(value)
+                if workers < 1:
+                    raise ValueError("--workers must be at least 1")
+            elif name == 'queue':
+                queue_size = int(value)
+                if queue_size < 0:
+                    raise ValueError("--queue can't be negative")
+            elif name == 'engine':
+                engine = value
+            else:
+                raise ValueError(f"Unknown option '--{name}'")
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    check_engine(engine)
+    if socket_path and not hasattr(socket, 'AF_UNIX'):
+        print("Error: Unix sockets aren't available on this system - use --port")
+        sys.exit(1)
+    
+    def on_ready(jobs):
+        print("=" * 80)
+        print("GCode A-Axis Feedrate Adjuster - Daemon")
+        print("=" * 80)
+        print(f"Listening on: {socket_path if socket_path else f'http://{host}:{port}'}")
+        print(f"Workers: {jobs.workers} (warm) • Queue: {jobs.capacity - jobs.workers}")
+        print(f"Engine: {engine}")
+        print("Press Ctrl+C to stop")
+        print("=" * 80, flush=True)
+    
+    try:
+        serve(host, port, socket_path, workers, queue_size, engine, defaults, on_ready)
+    except OSError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print("\nStopped")
+    return 0
+
+
+def watch_usage():
+    print("Usage: python3 gcode_processor_cli.py watch <folder>... [options]")
+    print("  Processes .tap/.gcode/.nc/.ngc files as they're dropped into the folders (skipping _modified outputs)")
+    print("  Files whose output is missing or older are processed at startup too")
+    print("Options:")
+    print("  --output-dir=DIR: Where to write _modified files (default: next to each program)")
+    print("  --workers=N: Number of worker processes (default: one per CPU)")
+    print("  --settle=SECONDS: How long a file must stay unchanged before it's processed (default: 2)")
+    print("  --poll[=SECONDS]: Scan the folders every SECONDS (default: 1) instead of using inotify")
+    print("                    (needed for network shares written by other machines)")
+    print("  --engine=stream|numpy|mmap: Processing engine (default: stream)")
+    print("  --threshold1= --feedrate1= --threshold2= --feedrate2= --default-feedrate=")
+    print("  --tiers=1.5:100,0.5:50,0.2:25 --large-dia= --small-dia= --length= --decimate=: Settings for every program")
+    print("  --taper-profile= --taper-offset= --taper-reverse: Taper profile table for every program")
+    print("  --fixed-point: Integer 0.0001-unit numbers for every program (see FIXED_POINT.md)")
+    print("\nExample: python3 gcode_processor_cli.py watch C:/CAM/posted --output-dir=C:/DNC/send --threshold1=2")
+
+
+def watch_main(folders, options):
+    """Process programs dropped into folders until Ctrl+C."""
+    if not folders:
+        watch_usage()
+        sys.exit(1)
+    
+    settings = dict(SETTING_DEFAULTS)
+    workers = None
+    output_dir = None
+    settle = 2.0
+    poll = None
+    engine = 'stream'
+    try:
+        for name, value in options.items():
+            if name in BATCH_SETTING_OPTIONS:
+                settings = setting_option(settings, name, value)
+            elif name == 'tiers':
+                settings['tiers'] = parse_tiers(value)
+            elif name == 'workers':
+                workers = int(value)
+                if workers < 1:
+                    raise ValueError("--workers must be at least 1")
+            elif name == 'output-dir':
+                output_dir = value
+            elif name == 'settle':
+                settle = float(value)
+                if settle < 0:
+                    raise ValueError("--settle can't be negative")
+            elif name == 'poll':
+                poll = float(value) if value else 1.0
+                if poll <= 0:
+                    raise ValueError("--poll must be more than 0 seconds")
+            elif name == 'engine':
+                engine = value
+            else:
+                raise ValueError(f"Unknown option '--{name}'")
+        tiers = settings['tiers'] or [(settings['threshold1'], settings['feedrate1']),
+                                      (settings['threshold2'], settings['feedrate2'])]
+        error = (taper_error(settings['large_diameter'], settings['small_diameter'], settings['length'],
+                             settings['taper_profile'])
+                 or tier_error(tiers) or decimate_error(settings['decimate']))
+        if error:
+            raise ValueError(error)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    check_engine(engine)
+    for folder in folders:
+        if not os.path.isdir(folder):
+            print(f"Error: '{folder}' is not a folder")
+            sys.exit(1)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    
+    def on_start(watcher):
+        print("=" * 80)
+        print("GCode A-Axis Feedrate Adjuster - Watch Mode")
+        print("=" * 80)
+        for folder in folders:
+            print(f"Watching: {os.path.abspath(folder)}")
+        print(f"Change detection: {'inotify' if watcher == 'InotifyWatcher' else f'polling every {poll or 1.0:g} s'}")
+        print(f"Workers: {workers or os.cpu_count()} • Settle time: {settle:g} s")
+        print(f"Engine: {engine}")
+        print(f"Output folder: {os.path.abspath(output_dir) if output_dir else 'next to each program'}")
+        print("Press Ctrl+C to stop")
+        print("=" * 80, flush=True)
+    
+    def on_result(result):
+        name = os.path.basename(result['input_file'])
+        if result['error']:
+            print(f"✗ {name}: {result['error']}", flush=True)
+        else:
+            output_name = os.path.basename(result['output_file'])
+            print(f"✓ {name} → {output_name}: {result['stats']['total_lines']} lines in {result['elapsed']:.2f} s", flush=True)
+    
+    try:
+        watch(folders, settings, output_dir, workers, engine, settle, poll, on_result, on_start)
+    except OSError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print("\nStopped")
+    return 0
+
+
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python3 gcode_processor_cli.py input_file.tap [threshold1] [feedrate1] [threshold2] [feedrate2] [default_feedrate] [large_dia] [small_dia] [length]")
+    argv, options = parse_options(sys.argv[1:])
+    argv = [sys.argv[0]] + argv
+    
+    if len(argv) > 1 and argv[1] == 'batch':
+        sys.exit(batch_main(argv[2:], options))
+    if len(argv) > 1 and argv[1] == 'serve':
+        sys.exit(serve_main(argv[2:], options))
+    if len(argv) > 1 and argv[1] == 'watch':
+        sys.exit(watch_main(argv[2:], options))
+    
+    engine = options.pop('engine', 'stream')
+    try:
+        workers = int(options.pop('parallel', 1))
+    except ValueError:
+        print("Error: --parallel must be a number of worker processes")
+        sys.exit(1)
+    try:
+        pipeline = options.pop('pipeline', None)
+        if pipeline is not None:
+            pipeline = int(pipeline) if pipeline else PIPELINE_DEPTH
+            if pipeline < 1:
+                raise ValueError
+    except ValueError:
+        print("Error: --pipeline takes a queue depth of at least 1")
+        sys.exit(1)
+    if pipeline and workers > 1:
+        print("Error: --pipeline and --parallel can't be used together")
+        sys.exit(1)
+    stats_mode = options.pop('stats', None)
+    if stats_mode == '':
+        stats_mode = 'text'
+    if stats_mode not in (None, 'text', 'json') and not stats_mode.endswith('.json'):
+        print("Error: --stats takes 'text', 'json' or a .json file to write")
+        sys.exit(1)
+    profile = options.pop('profile', None)
+    cycle_time = options.pop('cycle-time', None) is not None
+    try:
+        rapid_rate = float(options.pop('rapid-rate', DEFAULT_RAPID_RATE))
+        block_rate = float(options['block-rate']) if 'block-rate' in options else None
+        options.pop('block-rate', None)
+        if rapid_rate <= 0 or (block_rate is not None and block_rate <= 0):
+            raise ValueError
+    except ValueError:
+        print("Error: --rapid-rate and --block-rate must be positive numbers")
+        sys.exit(1)
+    decimate = None
+    if 'decimate' in options:
+        try:
+            decimate = float(options.pop('decimate'))
+        except ValueError:
+            print("Error: --decimate takes a tolerance, e.g. --decimate=0.001")
+            sys.exit(1)
+    output_file = options.pop('output', None)
+    if output_file == '':
+        print("Error: --output takes a file name, or - for stdout")
+        sys.exit(1)
+    try:
+        taper_profile = parse_taper_profile(options.pop('taper-profile')) if 'taper-profile' in options else None
+        taper_offset = float(options.pop('taper-offset')) if 'taper-offset' in options else None
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    taper_reverse = options.pop('taper-reverse', None) is not None
+    fixed_point = options.pop('fixed-point', None) is not None
+    if fixed_point and engine != 'stream':
+        print("Error: --fixed-point has its own streaming engine; leave out --engine")
+        sys.exit(1)
+    tiers = None
+    if 'tiers' in options:
+        try:
+            tiers = parse_tiers(options.pop('tiers'))
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    for name in options:
+        print(f"Error: Unknown option '--{name}'")
+        sys.exit(1)
+    check_engine(engine)
+    
+    if len(argv) < 2:
+        print("Usage: python3 gcode_processor_cli.py input_file.tap [threshold1] [feedrate1] [threshold2] [feedrate2] [default_feedrate] [large_dia] [small_dia] [length] [--tiers=T:F,...] [--engine=stream|numpy|mmap] [--parallel=N] [--pipeline[=DEPTH]] [--output=FILE|-] [--decimate=TOL] [--taper-profile=FILE.csv] [--taper-offset=X] [--taper-reverse] [--fixed-point] [--cycle-time] [--rapid-rate=N] [--block-rate=N] [--stats[=json|file.json]] [--profile[=prefix]]")
+        print("       python3 gcode_processor_cli.py batch <inputs>... [options]  (run 'batch' alone for details)")
+        print("       python3 gcode_processor_cli.py serve [options]  (daemon mode; run 'serve help' for details)")
+        print("       python3 gcode_processor_cli.py watch <folders>... [options]  (run 'watch' alone for details)")
+        print("  input_file: The program to process (.gz/.xz/.bz2 are decompressed as read), or - for stdin")
         print("  threshold1: Tier 1 A-axis threshold in degrees (default: 1.5)")
         print("  feedrate1: Tier 1 feedrate (default: 100)")
         print("  threshold2: Tier 2 A-axis threshold in degrees (default: 0.5)")
@@ -271,27 +719,65 @@ def main():
         print("  large_dia: Large end diameter for taper (optional)")
         print("  small_dia: Small end diameter for taper (optional)")
         print("  length: Length (X axis) for taper (optional)")
+        print("  --taper-profile: Taper to a diameter-vs-X table instead of a cone: a CSV file of x,diameter rows,")
+        print("                   or pairs like --taper-profile=0:0.85,4:1.0,4:1.1,12:1.25 (a repeated X is a step)")
+        print("  --taper-offset: Machine X of the profile's X 0 (default 0); --taper-reverse runs it towards -X")
+        print("  --tiers: Any number of threshold:feedrate tiers, Tier 1 first, e.g. --tiers=1.5:100,1.0:75,0.5:50,0.2:25")
+        print("           (replaces threshold1/feedrate1/threshold2/feedrate2)")
+        print("  --engine: 'stream' (default), 'numpy' for the vectorized NumPy engine, or 'mmap' to read")
+        print("            multi-gigabyte files through a memory map as bytes")
+        print("  --parallel: Split a big file at G0 rapids and process it on N cores (same output)")
+        print("  --pipeline: Read ahead and write behind on background threads, so a slow drive and the")
+        print(f"              processing overlap; DEPTH blocks of ~1 MB may wait each way (default: {PIPELINE_DEPTH})")
+        print("  --output: Where to write (default: <name>_modified<ext> in the current directory, or stdout")
+        print("            for stdin); - is stdout, .gz/.xz/.bz2 are compressed as written. The summary")
+        print("            goes to stderr whenever the program goes to stdout")
+        print("  --fixed-point: Read coordinates as whole 0.0001 units and do tiers and taper in integers:")
+        print("                 exact threshold compares and Z rounding, feedrates written as F50 not F50.0")
+        print("  --decimate: Merge runs of short G1 moves that lie within TOL of one straight line before")
+        print("             tiering (X/Y/Z and A degrees alike), and report the block counts before and after")
+        print("  --cycle-time: Estimate machine time for the original and modified program (moves over")
+        print(f"                feedrate, X/Z/A combined); --rapid-rate=N for G0 moves (default: {DEFAULT_RAPID_RATE:g}/min),")
+        print("                --block-rate=N to count at least 1/N s per block")
+        print("  --stats: Time each stage (read/parse/tier/taper/write), count regex calls and peak memory;")
+        print("           --stats=json prints only the report as JSON (the summary goes to stderr),")
+        print("           --stats=report.json writes it to a file")
+        print("  --profile: Write cProfile stats (.prof) and collapsed stacks (.folded) for flamegraphs")
         print("\nExample: python3 gcode_processor_cli.py file.tap 1.5 100 0.5 50 380")
+        print("         xzcat part.tap.xz | python3 gcode_processor_cli.py - 2 120 --output=part_modified.tap.gz")
         sys.exit(1)
     
-    input_file = sys.argv[1]
-    threshold1 = float(sys.argv[2]) if len(sys.argv) > 2 else 1.5
-    feedrate1 = float(sys.argv[3]) if len(sys.argv) > 3 else 100
-    threshold2 = float(sys.argv[4]) if len(sys.argv) > 4 else 0.5
-    feedrate2 = float(sys.argv[5]) if len(sys.argv) > 5 else 50
-    default_feedrate = float(sys.argv[6]) if len(sys.argv) > 6 else 380
+    input_file = argv[1]
+    if output_file is None and input_file == '-':
+        output_file = '-'
+    if profile == '':
+        profile = ('stdin' if input_file == '-' else os.path.splitext(os.path.basename(input_file))[0]) + '_profile'
+    threshold1 = float(argv[2]) if len(argv) > 2 else 1.5
+    feedrate1 = float(argv[3]) if len(argv) > 3 else 100
+    threshold2 = float(argv[4]) if len(argv) > 4 else 0.5
+    feedrate2 = float(argv[5]) if len(argv) > 5 else 50
+    default_feedrate = float(argv[6]) if len(argv) > 6 else 380
     
     # Taper parameters (all three must be provided together)
-    large_dia = float(sys.argv[7]) if len(sys.argv) > 7 else None
-    small_dia = float(sys.argv[8]) if len(sys.argv) > 8 else None
-    length = float(sys.argv[9]) if len(sys.argv) > 9 else None
+    large_dia = float(argv[7]) if len(argv) > 7 else None
+    small_dia = float(argv[8]) if len(argv) > 8 else None
+    length = float(argv[9]) if len(argv) > 9 else None
     
-    if not os.path.exists(input_file):
-        print(f"Error: File '{input_file}' not found!")
+    # With the program itself going to stdout the summary goes to stderr, and with
+    # --stats=json too, so stdout can be parsed as JSON
+    summary = redirect_stdout(sys.stderr) if output_file == '-' or stats_mode == 'json' else nullcontext()
+    try:
+        with summary:
+            if input_file != '-' and not os.path.exists(input_file):
+                print(f"Error: File '{input_file}' not found!")
+                sys.exit(1)
+            
+            processor = GCodeProcessorCLI()
+            processor.process_file(input_file, threshold1, feedrate1, threshold2, feedrate2, default_feedrate, large_dia, small_dia, length, engine, workers, tiers, stats_mode, profile, output_file, decimate, cycle_time, rapid_rate, block_rate, taper_profile, taper_offset, taper_reverse, pipeline, fixed_point)
+    except BrokenPipeError:
+        # Whatever was reading stdout stopped early (e.g. head) - drop the rest quietly
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
         sys.exit(1)
-    
-    processor = GCodeProcessorCLI()
-    processor.process_file(input_file, threshold1, feedrate1, threshold2, feedrate2, default_feedrate, large_dia, small_dia, length)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,326 @@
+"""
+Run statistics: per-stage timing, regex call counts, peak memory and profiling.
+
+Instrumentation wraps one engine run without changing the engine itself. It
+times the engine's stage methods on the instance, times reads and writes
+through wrappers around the input and output, and for the length of the run
+swaps the engine's precompiled regexes and formatting helpers for counting /
+timing stand-ins. Without it the engine runs exactly as fast as before.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+import gcode_columnar
+import gcode_engine
+import gcode_fixed
+import gcode_mmap
+
+
+# Stages in pipeline order. 'loop' is whatever is left: the lookahead window,
+# modal state and (in the NumPy engine) the vectorized block work.
+STAGES = ('read', 'parse', 'tier', 'taper', 'rewrite', 'write', 'loop')
+
+STAGE_LABELS = {
+    'read': 'Read',
+    'parse': 'Parse',
+    'tier': 'Tier',
+    'taper': 'Taper Z',
+    'rewrite': 'F/Z rewrite',
+    'write': 'Write',
+    'loop': 'Main loop',
+}
+
+# Engine methods timed on the instance, and the stage each belongs to
+TIMED_METHODS = {
+    'parse_words': 'parse',
+    'parse_bytes': 'parse',
+    'classify': 'tier',
+    'tiers': 'tier',
+    'taper_adjustment': 'taper',
+}
+
+# Module-level helpers timed during a run (looked up as globals by the engines)
+TIMED_FUNCTIONS = {
+    'splice_line': 'rewrite',
+}
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None if it can't be read."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize / (1024 * 1024)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class CountingPattern:
+    """Stand-in for a compiled regex that counts every match/search/sub call."""
+
+    METHODS = ('match', 'fullmatch', 'search', 'sub', 'subn', 'split', 'findall', 'finditer')
+
+    def __init__(self, pattern, name, counts):
+        self.pattern = pattern
+        for method in self.METHODS:
+            setattr(self, method, self.counted(getattr(pattern, method), name, counts))
+
+    @staticmethod
+    def counted(function, name, counts):
+        def call(*args, **kwargs):
+            counts[name] += 1
+            return function(*args, **kwargs)
+        return call
+
+    def __getattr__(self, name):
+        return getattr(self.pattern, name)
+
+
+class TimedWriter:
+    """Output wrapper that adds the time spent writing to a stage clock."""
+
+    def __init__(self, out, times):
+        self.out = out
+        self.times = times
+
+    def write(self, text):
+        start = time.perf_counter()
+        self.out.write(text)
+        self.times['write'] += time.perf_counter() - start
+
+    def writelines(self, lines):
+        start = time.perf_counter()
+        self.out.writelines(lines)
+        self.times['write'] += time.perf_counter() - start
+
+
+def timed(function, stage, times):
+    """Wrap function so its run time is added to times[stage]."""
+    perf_counter = time.perf_counter
+
+    def call(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            times[stage] += perf_counter() - start
+    return call
+
+
+class Instrumentation:
+    """Stage timing and regex counting for one engine run.
+
+    with Instrumentation(engine) as probe:
+        stats = engine.process_lines(probe.lines(f_in), probe.writer(f_out))
+    report = probe.report(stats)
+
+    Only one instrumented run should be active at a time, since the regex and
+    helper stand-ins are swapped in module-wide.
+    """
+
+    def __init__(self, engine, engine_name=None):
+        self.engine = engine
+        self.engine_name = engine_name or type(engine).__name__
+        self.times = dict.fromkeys(STAGES, 0.0)
+        self.regex_counts = Counter()
+        self.swapped = []
+        self.elapsed = 0.0
+        self.start = None
+
+        for method, stage in TIMED_METHODS.items():
+            if hasattr(engine, method):
+                setattr(engine, method, timed(getattr(engine, method), stage, self.times))
+
+    def lines(self, lines):
+        """Pass lines through, adding the time spent reading them to the 'read' stage."""
+        iterator = iter(lines)
+        perf_counter = time.perf_counter
+        times = self.times
+        while True:
+            start = perf_counter()
+            try:
+                line = next(iterator)
+            except StopIteration:
+                times['read'] += perf_counter() - start
+                return
+            times['read'] += perf_counter() - start
+            yield line
+
+    def writer(self, out):
+        return TimedWriter(out, self.times)
+
+    def swap(self, module, name, replacement):
+        self.swapped.append((module, name, getattr(module, name)))
+        setattr(module, name, replacement)
+
+    def __enter__(self):
+        for module in (gcode_engine, gcode_mmap):
+            for name, value in list(vars(module).items()):
+                if isinstance(value, re.Pattern):
+                    self.swap(module, name, CountingPattern(value, name, self.regex_counts))
+        for name, stage in TIMED_FUNCTIONS.items():
+            for module in (gcode_engine, gcode_columnar, gcode_fixed):
+                self.swap(module, name, timed(getattr(module, name), stage, self.times))
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.perf_counter() - self.start
+        for module, name, original in reversed(self.swapped):
+            setattr(module, name, original)
+        self.swapped = []
+        return False
+
+    def report(self, stats, input_file=None):
+        """Report dict (see run_report) with the stage breakdown and regex counts."""
+        stages = dict(self.times)
+        stages['loop'] = max(self.elapsed - sum(stages[name] for name in STAGES if name != 'loop'), 0.0)
+        report = run_report(stats, self.elapsed, self.engine_name, input_file)
+        report['stages'] = stages
+        report['counters']['regex_calls'] = sum(self.regex_counts.values())
+        report['counters']['regex_calls_by_pattern'] = dict(self.regex_counts.most_common())
+        if stats['total_lines']:
+            report['counters']['regex_calls_per_line'] = report['counters']['regex_calls'] / stats['total_lines']
+        return report
+
+
+def run_report(stats, elapsed, engine_name, input_file=None):
+    """Report dict for a run: time, lines/sec, counters and peak memory.
+
+    'stages' is None unless the run was instrumented (see Instrumentation).
+    """
+    lines = stats['total_lines']
+    return {
+        'input_file': input_file,
+        'input_bytes': os.path.getsize(input_file) if input_file and os.path.exists(input_file) else None,
+        'engine': engine_name,
+        'lines': lines,
+        'elapsed_seconds': elapsed,
+        'lines_per_sec': lines / elapsed if elapsed > 0 else None,
+        'stages': None,
+        'counters': {
+            'tier_counts': {str(tier): count for tier, count in stats['tier_counts'].items()},
+            'feedrate_changes': stats['modifications_count'],
+            'taper_moves': stats['taper_count'],
+        },
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def report_lines(report):
+    """Human-readable lines for a report, for the CLI summary and the GUI log."""
+    elapsed = report['elapsed_seconds']
+    rate = f" ({report['lines_per_sec']:,.0f} lines/sec)" if report['lines_per_sec'] else ""
+    lines = [f"Total: {elapsed:.3f} s for {report['lines']:,} lines{rate}"]
+    if report['stages']:
+        for stage in STAGES:
+            seconds = report['stages'][stage]
+            share = 100.0 * seconds / elapsed if elapsed > 0 else 0.0
+            lines.append(f"{STAGE_LABELS[stage]}: {seconds:.3f} s ({share:.0f}%)")
+    counters = report['counters']
+    if 'regex_calls' in counters:
+        per_line = counters.get('regex_calls_per_line', 0.0)
+        lines.append(f"Regex calls: {counters['regex_calls']:,} ({per_line:.2f} per line)")
+    if report['peak_rss_mb'] is not None:
+        lines.append(f"Peak memory: {report['peak_rss_mb']:.1f} MB")
+    return lines
+
+
+def write_report_json(report, destination):
+    """Write the report as JSON to a file path, an open text stream, or stdout for '-'."""
+    text = json.dumps(report, indent=2)
+    if destination == '-':
+        destination = sys.stdout
+    if hasattr(destination, 'write'):
+        destination.write(text + "\n")
+        destination.flush()
+    else:
+        with open(destination, 'w') as f:
+            f.write(text + "\n")
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a timer, for flamegraphs.
+
+    Stacks are kept in collapsed form ("outer;inner;leaf count" per line), the
+    input format of flamegraph.pl, speedscope and inferno.
+    """
+
+    def __init__(self, thread_id=None, interval=0.001):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.samples = Counter()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if names:
+                self.samples[';'.join(reversed(names))] += 1
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop_event.set()
+        self.thread.join()
+        return False
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def profile_call(function, prefix, top=15):
+    """Run function() under cProfile and the stack sampler.
+
+    Writes prefix.prof (pstats) and prefix.folded (collapsed stacks) and returns
+    (result, summary text with the top functions by cumulative time).
+    """
+    profiler = cProfile.Profile()
+    sampler = StackSampler()
+    with sampler:
+        profiler.enable()
+        try:
+            result = function()
+        finally:
+            profiler.disable()
+    profiler.dump_stats(prefix + '.prof')
+    sampler.write(prefix + '.folded')
+
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(top)
+    return result, summary.getvalue()
@@ -0,0 +1,231 @@
+"""
+Watch-folder mode: process programs as CAM drops them into a folder.
+
+New or re-posted .tap/.gcode/.nc/.ngc files in the watched folders are
+processed on a pool of worker processes, skipping our own _modified outputs.
+A file is only picked up once it has settled - closed by its writer (with
+inotify) and its size and modification time unchanged for a moment - so a
+program still being written is never processed half-way. Each output is
+written to a hidden temporary file next to it and renamed into place, so a
+DNC sender watching the output folder never sees a half-written program.
+
+On Linux the folders are watched with inotify (through libc, no extra
+packages). Elsewhere, or with --poll (network shares don't deliver inotify
+events for changes made by other machines), they are scanned every second.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from gcode_batch import PROGRAM_EXTENSIONS, is_program_output, output_path_for, run_job
+
+
+# inotify event masks (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+
+# struct inotify_event header: wd, mask, cookie, name length (the name follows)
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+def is_watched_program(path):
+    """True for a program file we should process (not our outputs or temporary files)."""
+    name = os.path.basename(path)
+    return (name.lower().endswith(PROGRAM_EXTENSIONS) and not name.startswith('.')
+            and not is_program_output(path))
+
+
+def file_signature(path):
+    """(size, mtime) of a file, or None if it has gone."""
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    return info.st_size, info.st_mtime_ns
+
+
+def stale_programs(folders, output_dir=None):
+    """Programs in folders whose output is missing or older than the program."""
+    stale = []
+    for folder in folders:
+        for entry in os.scandir(folder):
+            if not entry.is_file() or not is_watched_program(entry.path):
+                continue
+            output = output_path_for(entry.path, output_dir or folder)
+            output_signature = file_signature(output)
+            if output_signature is None or output_signature[1] < entry.stat().st_mtime_ns:
+                stale.append(entry.path)
+    return stale
+
+
+def inotify_available():
+    return sys.platform.startswith('linux') and ctypes.util.find_library('c') is not None
+
+
+class InotifyWatcher:
+    """Files closed after writing, or moved in, in a set of folders (Linux inotify)."""
+
+    def __init__(self, folders):
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.folders = {}
+        for folder in folders:
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), IN_CLOSE_WRITE | IN_MOVED_TO)
+            if wd < 0:
+                error = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(error, f"Can't watch {folder}: {os.strerror(error)}")
+            self.folders[wd] = folder
+        self.overflowed = False
+
+    def changes(self, timeout):
+        """Paths with events in the next timeout seconds (sets overflowed if events were lost)."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        data = os.read(self.fd, 1 << 16)
+        paths = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = INOTIFY_EVENT.unpack_from(data, offset)
+            name = data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length].rstrip(b'\0')
+            offset += INOTIFY_EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+            elif name and wd in self.folders:
+                paths.append(os.path.join(self.folders[wd], os.fsdecode(name)))
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """New or changed files in a set of folders, found by scanning them every interval."""
+
+    def __init__(self, folders, interval=1.0):
+        self.folders = list(folders)
+        self.interval = interval
+        self.overflowed = False
+        self.seen = self.scan()
+
+    def scan(self):
+        signatures = {}
+        for folder in self.folders:
+            for entry in os.scandir(folder):
+                if entry.is_file():
+                    info = entry.stat()
+                    signatures[entry.path] = (info.st_size, info.st_mtime_ns)
+        return signatures
+
+    def changes(self, timeout):
+        time.sleep(max(timeout, self.interval))
+        current = self.scan()
+        changed = [path for path, signature in current.items() if self.seen.get(path) != signature]
+        self.seen = current
+        return changed
+
+    def close(self):
+        pass
+
+
+def failed_result(input_file, output_file, error):
+    """A run_job()-style result for a job that failed outside run_job()."""
+    return {'input_file': input_file, 'output_file': output_file, 'error': str(error), 'elapsed': 0.0}
+
+
+def run_watch_job(input_file, output_file, settings, engine='stream'):
+    """run_job() into a hidden temporary file next to output_file, then rename it into place.
+
+    Never raises: like run_job(), a failure (the output folder gone, or the
+    output held open by a DNC sender on Windows) comes back in result['error'].
+    """
+    folder, name = os.path.split(output_file)
+    # A unique name rather than mkstemp(), whose files are 0600 - outputs get the umask like any other
+    temporary = os.path.join(folder, f'.{name}.{uuid.uuid4().hex}.part')
+    try:
+        result = run_job(input_file, temporary, settings, engine)
+        result['output_file'] = output_file
+        if not result['error']:
+            os.replace(temporary, output_file)
+    except Exception as e:
+        result = failed_result(input_file, output_file, e)
+    finally:
+        if os.path.exists(temporary):
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+    return result
+
+
+def watch(folders, settings, output_dir=None, workers=None, engine='stream', settle=2.0,
+          poll=None, on_result=None, on_start=None, tick=0.25):
+    """Process programs dropped into folders until interrupted.
+
+    settings are the job settings (see gcode_batch.SETTING_DEFAULTS). Outputs
+    go next to their program unless output_dir is given. A program is picked
+    up once its size and modification time have held still for settle
+    seconds. poll is a polling interval in seconds, or None to use inotify
+    where it's available. Programs whose output is missing or older are
+    processed at startup too. on_start(watcher_name) is called once
+    watching; on_result(result) for each finished job.
+    """
+    if poll is None and inotify_available():
+        watcher = InotifyWatcher(folders)
+    else:
+        watcher = PollingWatcher(folders, poll or 1.0)
+    pending = {}  # path -> [signature, time it last changed]
+    running = {}  # path -> (output file, future)
+
+    def track(paths):
+        now = time.monotonic()
+        for path in paths:
+            if is_watched_program(path):
+                pending[path] = [file_signature(path), now]
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            track(stale_programs(folders, output_dir))
+            if on_start:
+                on_start(type(watcher).__name__)
+            while True:
+                track(watcher.changes(tick))
+                if watcher.overflowed:
+                    # Events were dropped - fall back to comparing programs with their outputs
+                    watcher.overflowed = False
+                    track(stale_programs(folders, output_dir))
+
+                now = time.monotonic()
+                for path, entry in list(pending.items()):
+                    signature = file_signature(path)
+                    if signature is None:
+                        del pending[path]  # Deleted or renamed away before it settled
+                    elif signature != entry[0]:
+                        entry[0], entry[1] = signature, now
+                    elif now - entry[1] >= settle and path not in running:
+                        del pending[path]
+                        output_file = output_path_for(path, output_dir or os.path.dirname(path))
+                        running[path] = output_file, pool.submit(run_watch_job, path, output_file, settings, engine)
+
+                for path, (output_file, future) in list(running.items()):
+                    if future.done():
+                        del running[path]
+                        try:
+                            result = future.result()
+                        except Exception as e:  # The worker process itself died
+                            result = failed_result(path, output_file, e)
+                        if on_result:
+                            on_result(result)
+    finally:
+        watcher.close()